@@ -0,0 +1,159 @@
+import os
+
+# Query embedding cache
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 2048))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", 3600))
+QUERY_CACHE_NEAR_DUPLICATES = os.getenv("QUERY_CACHE_NEAR_DUPLICATES", "1") != "0"
+
+# CPU-bound request stages (encode, vector search, ranking)
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", min(4, os.cpu_count() or 1)))
+CPU_QUEUE_DEPTH = int(os.getenv("CPU_QUEUE_DEPTH", 16))
+
+# Micro-batching of concurrent query encodes
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", 32))
+ENCODE_BATCH_WAIT_MS = float(os.getenv("ENCODE_BATCH_WAIT_MS", 2))
+
+# Query/document encoder: torch (reference), torch-int8 (dynamically quantized linear
+# layers), onnx or onnx-int8 (ONNX Runtime, exported once into ENCODER_ONNX_DIR).
+# ENCODER_THREADS=0 keeps the runtime's default intra-op threads; ENCODER_MAX_SEQ_LENGTH=0
+# keeps the model's own limit
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", 0))
+ENCODER_MAX_SEQ_LENGTH = int(os.getenv("ENCODER_MAX_SEQ_LENGTH", 0))
+ENCODER_ONNX_DIR = os.getenv("ENCODER_ONNX_DIR", "data/onnx")
+
+# Shared encoder service (multi-worker serving, see backend/serve.py): comma-separated
+# Unix socket paths or host:port addresses of encoder processes; empty loads the model
+# in-process. ENCODER_PROCESSES is the pool size serve.py starts. Requests are pickled,
+# so TCP addresses require ENCODER_SERVICE_AUTHKEY (serve.py generates one per run when unset)
+ENCODER_SERVICE = os.getenv("ENCODER_SERVICE", "")
+ENCODER_SERVICE_AUTHKEY = os.getenv("ENCODER_SERVICE_AUTHKEY", "")
+ENCODER_SERVICE_TIMEOUT = float(os.getenv("ENCODER_SERVICE_TIMEOUT", 30))
+ENCODER_PROCESSES = int(os.getenv("ENCODER_PROCESSES", 1))
+
+# Hybrid ranking: weighted similarity, sales velocity and affordability (1 / price)
+RANK_SIMILARITY_WEIGHT = float(os.getenv("RANK_SIMILARITY_WEIGHT", 0.7))
+RANK_SALES_WEIGHT = float(os.getenv("RANK_SALES_WEIGHT", 0.3))
+RANK_PRICE_WEIGHT = float(os.getenv("RANK_PRICE_WEIGHT", 0.0))
+RANK_NORMALIZATION = os.getenv("RANK_NORMALIZATION", "max")
+RANK_CANDIDATE_MULTIPLIER = int(os.getenv("RANK_CANDIDATE_MULTIPLIER", 2))
+
+# Filtered recommendations: filters matching at most FILTER_PREFILTER_MAX_ROWS products
+# or FILTER_PREFILTER_SELECTIVITY of the catalog score only their matches; broader
+# filters post-filter an oversampled vector search
+FILTER_PREFILTER_MAX_ROWS = int(os.getenv("FILTER_PREFILTER_MAX_ROWS", 20000))
+FILTER_PREFILTER_SELECTIVITY = float(os.getenv("FILTER_PREFILTER_SELECTIVITY", 0.05))
+
+# Lexical fast path: keyword queries are answered from an in-process BM25 index
+# (also while the model is still loading); other queries fuse BM25 and dense hits
+# by reciprocal rank fusion with constant LEXICAL_RRF_K
+LEXICAL_SEARCH = os.getenv("LEXICAL_SEARCH", "1") != "0"
+LEXICAL_RRF_K = int(os.getenv("LEXICAL_RRF_K", 60))
+
+# Materialized results: retrieval candidates for the popular keywords, MATERIALIZED_QUERIES
+# (comma-separated) and, with MATERIALIZE_VOCABULARY, every catalog type and effect.
+# Rebuilt after each re-index; reranked with the live sales signals on every lookup
+MATERIALIZED_RESULTS = os.getenv("MATERIALIZED_RESULTS", "1") != "0"
+MATERIALIZED_QUERIES = os.getenv("MATERIALIZED_QUERIES", "")
+MATERIALIZE_VOCABULARY = os.getenv("MATERIALIZE_VOCABULARY", "1") != "0"
+
+# Recommendation payloads: each product's JSON is pre-serialized at index time;
+# `snippet=true` swaps the description for its first DESCRIPTION_SNIPPET_LENGTH characters
+DESCRIPTION_SNIPPET_LENGTH = int(os.getenv("DESCRIPTION_SNIPPET_LENGTH", 160))
+
+# Similar products: each product's NEIGHBORS_K nearest neighbours, precomputed into NEIGHBORS_DIR by
+# `python -m backend.recommendation_engine.neighbors`; SIMILAR_SALES_WEIGHT blends in sales velocity
+NEIGHBORS_DIR = os.getenv("NEIGHBORS_DIR", "rag/knowledge_base/neighbors")
+NEIGHBORS_K = int(os.getenv("NEIGHBORS_K", 50))
+SIMILAR_SALES_WEIGHT = float(os.getenv("SIMILAR_SALES_WEIGHT", 0.0))
+
+# Batch recommendations: queries accepted per POST /recommendations/batch and the largest per-query top_n
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", 1000))
+MAX_BATCH_TOP_N = int(os.getenv("MAX_BATCH_TOP_N", 100))
+
+# Vector retrieval: "chroma" queries the collection, "mmap" searches an exported
+# embedding matrix in-process (exact matmul, or FAISS beyond ANN_EXACT_MAX rows)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma")
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "rag/knowledge_base/vector_index")
+ANN_INDEX = os.getenv("ANN_INDEX", "auto")
+ANN_EXACT_MAX = int(os.getenv("ANN_EXACT_MAX", 50000))
+ANN_N_PROBE = int(os.getenv("ANN_N_PROBE", 16))
+ANN_EF_SEARCH = int(os.getenv("ANN_EF_SEARCH", 64))
+# Compressed first-pass vectors for the mmap backend ("float32" with 0 dims disables),
+# optionally reduced to COMPRESSED_DIMS by "prefix" truncation or "pca"; the top
+# RESCORE_MULTIPLIER * k candidates are rescored against the full-precision matrix
+COMPRESSED_DTYPE = os.getenv("COMPRESSED_DTYPE", "float32")
+COMPRESSED_DIMS = int(os.getenv("COMPRESSED_DIMS", 0))
+COMPRESSED_PROJECTION = os.getenv("COMPRESSED_PROJECTION", "prefix")
+RESCORE_MULTIPLIER = int(os.getenv("RESCORE_MULTIPLIER", 4))
+
+# Sales velocity used for ranking = baseline + live rate. The baseline is the columnar
+# sales store's units/day over the last SALES_VELOCITY_WINDOW days (the indexed
+# `sales_velocity` metadata for products the store lacks); the live rate is the decayed
+# units/day of sales events posted to /sales/events, 0 for products without events
+SALES_STORE_DIR = os.getenv("SALES_STORE_DIR", "data/sales_store")
+SALES_VELOCITY_WINDOW = int(os.getenv("SALES_VELOCITY_WINDOW", 30))
+
+# Live sales events: decayed per-product counters (half-life SALES_HALF_LIFE_DAYS), snapshotted to disk periodically
+SALES_HALF_LIFE_DAYS = float(os.getenv("SALES_HALF_LIFE_DAYS", 7))
+SALES_COUNTERS_SNAPSHOT = os.getenv("SALES_COUNTERS_SNAPSHOT", "data/sales_counters.npz")
+SALES_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SALES_SNAPSHOT_INTERVAL_SECONDS", 60))
+MAX_SALES_EVENTS_PER_REQUEST = int(os.getenv("MAX_SALES_EVENTS_PER_REQUEST", 10000))
+# Event timestamps may lead the server clock by SALES_EVENT_MAX_SKEW_SECONDS and lag it by
+# SALES_EVENT_MAX_AGE_DAYS; requests with events outside that range are rejected
+SALES_EVENT_MAX_SKEW_SECONDS = float(os.getenv("SALES_EVENT_MAX_SKEW_SECONDS", 300))
+SALES_EVENT_MAX_AGE_DAYS = float(os.getenv("SALES_EVENT_MAX_AGE_DAYS", 30))
+# With SHARED_DATA_DIR set the counters are shared by all workers through a memory-mapped
+# hash table of SALES_COUNTERS_CAPACITY slots (fixed when first created; at most 70% usable)
+SALES_COUNTERS_CAPACITY = int(os.getenv("SALES_COUNTERS_CAPACITY", 1 << 21))
+
+# Multi-process serving: datasets are converted once into memory-mapped row stores in
+# SHARED_DATA_DIR (empty parses the JSON in every process), and each process exports
+# metric snapshots to METRICS_DIR every METRICS_EXPORT_SECONDS for a merged /metrics
+SHARED_DATA_DIR = os.getenv("SHARED_DATA_DIR", "")
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_EXPORT_SECONDS = float(os.getenv("METRICS_EXPORT_SECONDS", 5))
+
+# Observability: per-request X-Timing debug header (sent when the client asks for it),
+# the /debug/profiler routes (off by default: they are unauthenticated and let any
+# caller start a sampler) and the default sampling interval of the profiler
+TIMING_HEADER_ENABLED = os.getenv("TIMING_HEADER_ENABLED", "1") != "0"
+PROFILER_ENDPOINT_ENABLED = os.getenv("PROFILER_ENDPOINT_ENABLED", "0") == "1"
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 10))
+
+
+def retrieval_options():
+    """Constructor options for the configured retrieval backend."""
+    if RETRIEVAL_BACKEND != "mmap":
+        return {}
+    return {
+        "index_dir": VECTOR_INDEX_DIR,
+        "ann": ANN_INDEX,
+        "exact_max": ANN_EXACT_MAX,
+        "n_probe": ANN_N_PROBE,
+        "ef_search": ANN_EF_SEARCH,
+        "compressed_dtype": COMPRESSED_DTYPE,
+        "compressed_dims": COMPRESSED_DIMS,
+        "projection": COMPRESSED_PROJECTION,
+        "rescore_multiplier": RESCORE_MULTIPLIER,
+    }
+
+def encoder_options():
+    """Options for `load_encoder` from the ENCODER_* settings."""
+    return {
+        "backend": ENCODER_BACKEND,
+        "threads": ENCODER_THREADS,
+        "max_seq_length": ENCODER_MAX_SEQ_LENGTH or None,
+        "onnx_dir": ENCODER_ONNX_DIR,
+    }
+
+def encoder_service_options():
+    """Options for `RemoteEncoder` from the ENCODER_SERVICE_* settings; empty when encoding in-process."""
+    addresses = [address.strip() for address in ENCODER_SERVICE.split(",") if address.strip()]
+    if not addresses:
+        return {}
+    return {
+        "addresses": addresses,
+        "authkey": ENCODER_SERVICE_AUTHKEY.encode() or None,
+        "timeout": ENCODER_SERVICE_TIMEOUT,
+    }
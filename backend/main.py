@@ -1,14 +1,34 @@
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, HTTPException, Query
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 import sys
 import os
-import pandas as pd
 import logging
-import chromadb
+import threading
+import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.data_loader import DataLoader
+from utils.sales_store import SalesStore
+from backend import config
+from backend.executor import BoundedExecutor, ExecutorSaturated
+from backend.observability import SamplingProfiler, TimingMiddleware
+from backend.startup import StartupTracker
+from backend.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ndjson_response, paginate, parse_csv, parse_cursor, parse_ids, project
+)
+from backend.recommendation_engine.filter_index import ProductFilters
+from backend.recommendation_engine.fragments import dumps
+from backend.recommendation_engine.materialized import MaterializedResults
+from backend.recommendation_engine.encoder_service import RemoteEncoder
+from backend.recommendation_engine.metrics import REGISTRY, SIZE_BUCKETS, MetricsExporter, render_snapshot
+from backend.recommendation_engine.ranking import RankingConfig
 from backend.recommendation_engine.recommender import RecommendationEngine
+from backend.recommendation_engine.sales_signals import DecayedSalesCounters, SharedSalesCounters, SnapshotThread
+from backend.recommendation_engine.suggestion_index import SuggestionIndex
+from backend.recommendation_engine.tracing import count, span
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,8 +36,70 @@ logger = logging.getLogger(__name__)
 app = FastAPI()
 
 # Initialize components
-data_loader = DataLoader()
-recommendation_engine = RecommendationEngine()
+data_loader = DataLoader(config.SHARED_DATA_DIR or None)
+recommendation_engine = RecommendationEngine(
+    query_cache_size=config.QUERY_CACHE_SIZE,
+    query_cache_ttl=config.QUERY_CACHE_TTL_SECONDS,
+    near_duplicate_queries=config.QUERY_CACHE_NEAR_DUPLICATES,
+    encode_batch_size=config.ENCODE_BATCH_SIZE,
+    encode_batch_wait_ms=config.ENCODE_BATCH_WAIT_MS,
+    ranking=RankingConfig(
+        similarity_weight=config.RANK_SIMILARITY_WEIGHT,
+        sales_weight=config.RANK_SALES_WEIGHT,
+        price_weight=config.RANK_PRICE_WEIGHT,
+        normalization=config.RANK_NORMALIZATION,
+        candidate_multiplier=config.RANK_CANDIDATE_MULTIPLIER,
+    ),
+    retrieval_backend=config.RETRIEVAL_BACKEND,
+    retrieval_options=config.retrieval_options(),
+    prefilter_max_rows=config.FILTER_PREFILTER_MAX_ROWS,
+    prefilter_selectivity=config.FILTER_PREFILTER_SELECTIVITY,
+    lexical_search=config.LEXICAL_SEARCH,
+    rrf_k=config.LEXICAL_RRF_K,
+    encoder_options=config.encoder_options(),
+    snippet_length=config.DESCRIPTION_SNIPPET_LENGTH,
+    encoder_service=config.encoder_service_options(),
+    neighbors_dir=config.NEIGHBORS_DIR,
+)
+
+RECOMMENDATIONS_TOP_N = 10
+
+startup = StartupTracker()
+materialized = MaterializedResults(recommendation_engine, top_n=RECOMMENDATIONS_TOP_N)
+sales_store = None
+sales_counters = None
+sales_snapshots = None
+metrics_exporter = None
+cpu_executor = BoundedExecutor(config.CPU_WORKERS, config.CPU_QUEUE_DEPTH)
+profiler = SamplingProfiler()
+suggestion_counts = REGISTRY.histogram("suggestion_results", "Suggestions returned per query.", SIZE_BUCKETS)
+batch_sizes = REGISTRY.histogram("recommendation_batch_queries", "Queries per batch recommendation request.", SIZE_BUCKETS)
+
+def load_sales_store():
+    """Open the persisted sales store, or build one in memory from the loaded sales."""
+    if os.path.exists(os.path.join(config.SALES_STORE_DIR, "meta.json")):
+        return SalesStore.load(config.SALES_STORE_DIR)
+    return SalesStore.from_records(data_loader.get_sales())
+
+def load_sales_counters():
+    """Resume live counters from their last snapshot, or start them empty.
+
+    They only count sales events; ranking adds them to the sales store's
+    windowed velocity (see `RecommendationEngine._sales_velocity`).
+
+    With SHARED_DATA_DIR the counters live in memory-mapped files that every
+    worker updates and reads, and are only resumed when first created.
+    """
+    def initialize(counters):
+        if os.path.exists(config.SALES_COUNTERS_SNAPSHOT):
+            counters.restore(config.SALES_COUNTERS_SNAPSHOT)
+
+    if config.SHARED_DATA_DIR:
+        return SharedSalesCounters.open(os.path.join(config.SHARED_DATA_DIR, "sales_counters"),
+                                        config.SALES_HALF_LIFE_DAYS, config.SALES_COUNTERS_CAPACITY, initialize)
+    counters = DecayedSalesCounters(config.SALES_HALF_LIFE_DAYS)
+    initialize(counters)
+    return counters
 
 # Allow CORS
 app.add_middleware(
@@ -26,77 +108,426 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Timing"],
 )
-
-client = chromadb.PersistentClient(path="rag/knowledge_base/chroma_db")
-collection = client.get_collection("products")
+app.add_middleware(TimingMiddleware, allow_timing_header=config.TIMING_HEADER_ENABLED)
 
 POPULAR_KEYWORDS = ["relaxation", "stress relief", "energy boost", "sleep aid", "focus", "hydration"]
 
+# Keyword-only until the catalog index is built during warm-up.
+suggestion_index = SuggestionIndex.from_metadatas([], POPULAR_KEYWORDS)
+
+def refresh_suggestion_index():
+    """Rebuild the suggestion index from the current collection and swap it in."""
+    global suggestion_index
+    suggestion_index = SuggestionIndex.from_metadatas(
+        recommendation_engine.get_catalog_metadata(), POPULAR_KEYWORDS
+    )
+    logger.info(f"Suggestion index built with {len(suggestion_index)} terms")
+
+recommendation_engine.on_reindex(refresh_suggestion_index)
+
+def materialized_queries():
+    """Head queries worth precomputing: popular keywords, configured extras and the catalog vocabulary."""
+    queries = POPULAR_KEYWORDS + (parse_csv(config.MATERIALIZED_QUERIES) or [])
+    if config.MATERIALIZE_VOCABULARY:
+        facets = recommendation_engine.filter_index.facets()
+        queries += facets["type"] + facets["effects"]
+    return queries
+
+def refresh_materialized():
+    """Recompute the materialized candidates against the current index."""
+    if config.MATERIALIZED_RESULTS:
+        materialized.refresh(materialized_queries())
+
+recommendation_engine.on_reindex(refresh_materialized)
+
+def warm_up():
+    """Load data, indexes and the model in the background while the port is already serving."""
+    global sales_store, sales_counters, sales_snapshots
+    try:
+        with startup.stage("sales_store"):
+            sales_store = load_sales_store()
+            recommendation_engine.set_sales_store(sales_store, config.SALES_VELOCITY_WINDOW)
+        with startup.stage("sales_counters"):
+            sales_counters = load_sales_counters()
+            recommendation_engine.set_sales_counters(sales_counters)
+            sales_snapshots = SnapshotThread(sales_counters, config.SALES_COUNTERS_SNAPSHOT,
+                                             config.SALES_SNAPSHOT_INTERVAL_SECONDS)
+            sales_snapshots.start()
+        with startup.stage("suggestion_index"):
+            refresh_suggestion_index()
+        with startup.stage("filter_index"):
+            recommendation_engine.filter_index
+        if config.LEXICAL_SEARCH:
+            with startup.stage("lexical_index"):
+                recommendation_engine.lexical_index
+        with startup.stage("fragments"):
+            recommendation_engine.fragments
+        with startup.stage("neighbors"):
+            try:
+                recommendation_engine.neighbors
+            except FileNotFoundError:
+                logger.info(f"No neighbour table in {config.NEIGHBORS_DIR}; /products/{{id}}/similar is unavailable")
+        with startup.stage("engine"):
+            for component, seconds in recommendation_engine.warm_up().items():
+                startup.timings[f"engine.{component}"] = seconds
+        register_encoder_metrics(recommendation_engine.query_encoder)
+        if config.MATERIALIZED_RESULTS:
+            with startup.stage("materialized"):
+                refresh_materialized()
+        startup.mark_ready()
+    except Exception as e:
+        startup.mark_failed(e)
+
+def register_encoder_metrics(encoder):
+    REGISTRY.register_histogram("encode_batch_size", encoder.batch_sizes, "Queries per model.encode call.")
+    REGISTRY.register_histogram("encode_queue_wait_seconds", encoder.wait_times, "Time queries waited for a batch.")
+    REGISTRY.register_histogram("encode_batch_seconds", encoder.encode_times, "model.encode time per batch.")
+    if isinstance(encoder.model, RemoteEncoder):
+        REGISTRY.register_histogram("encoder_rpc_seconds", encoder.model.rpc_times,
+                                    "Round trip per call to the shared encoder service.")
+
+REGISTRY.gauge("query_cache", lambda: {
+    (("stat", name),): value for name, value in recommendation_engine.query_cache.stats().items()
+}, "Query embedding cache counters.")
+REGISTRY.gauge("cpu_executor", lambda: {
+    (("stat", name),): value for name, value in cpu_executor.stats().items()
+}, "CPU executor occupancy and rejections.")
+REGISTRY.gauge("materialized_results", lambda: {
+    (("stat", name),): value for name, value in materialized.stats().items()
+}, "Materialized head-query results.")
+REGISTRY.gauge("service_ready", lambda: {(): int(startup.ready)}, "1 once warm-up has finished.")
+
+@app.on_event("startup")
+def start_warm_up():
+    global metrics_exporter
+    if config.METRICS_DIR:
+        # One of several server processes: publish this worker's metrics for the merged /metrics.
+        metrics_exporter = MetricsExporter(REGISTRY, config.METRICS_DIR, f"worker-{os.getpid()}",
+                                           config.METRICS_EXPORT_SECONDS)
+        metrics_exporter.start()
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    cpu_executor.shutdown()
+    profiler.stop()
+    if sales_snapshots is not None:
+        sales_snapshots.stop()
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+
+def require_ready():
+    if not startup.ready:
+        raise HTTPException(status_code=503, detail="Service is warming up.", headers={"Retry-After": "5"})
+
+def require_searchable():
+    """Recommendations are served keyword-only from the lexical index until warm-up completes."""
+    if not recommendation_engine.lexical_ready:
+        require_ready()
+
+async def run_cpu_bound(fn, *args):
+    """Run a blocking stage off the event loop, rejecting with 503 when overloaded."""
+    try:
+        return await cpu_executor.run(fn, *args)
+    except ExecutorSaturated:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly.", headers={"Retry-After": "1"})
+
 @app.get("/health")
 def health_check():
+    """Liveness: the process is up and serving, even while still warming up."""
     return {"status": "ok"}
 
+@app.get("/ready")
+def readiness_check():
+    """Readiness: data, indexes and the model are loaded, with a per-component timing breakdown."""
+    status = startup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Returns query embedding cache counters."""
+    return recommendation_engine.query_cache.stats()
+
+@app.get("/encoder/stats")
+def get_encoder_stats():
+    """Returns micro-batch size and queue wait histograms for query encoding (and the encoder service's)."""
+    require_ready()
+    stats = recommendation_engine.query_encoder.stats()
+    if isinstance(recommendation_engine.model, RemoteEncoder):
+        stats["service"] = recommendation_engine.model.stats()
+    return stats
+
+@app.get("/executor/stats")
+def get_executor_stats():
+    """Returns CPU executor occupancy and rejection counters."""
+    return cpu_executor.stats()
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of stage histograms, counters and gauges.
+
+    Behind several workers, every series is reported per `worker` (encoder
+    processes included) and counters and histograms also as totals.
+    """
+    text = render_snapshot(metrics_exporter.collect()) if metrics_exporter is not None else REGISTRY.render()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+if config.PROFILER_ENDPOINT_ENABLED:
+    @app.get("/debug/profiler")
+    def get_profiler_report(limit: int = Query(50, ge=1, le=1000)):
+        """Most frequently sampled stacks (folded, root first) since the profiler was started."""
+        return profiler.report(limit)
+
+    @app.post("/debug/profiler")
+    def toggle_profiler(enabled: bool, interval_ms: float = Query(config.PROFILER_INTERVAL_MS, ge=1),
+                        reset: bool = True):
+        """Starts or stops the sampling profiler at runtime."""
+        if enabled:
+            profiler.start(interval_ms, reset)
+        else:
+            profiler.stop()
+        return profiler.report(limit=0)
+
 @app.get("/products")
-def get_products():
-    return data_loader.get_products()
+def get_products(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """Returns products in id order: the full list, or streamed as NDJSON.
+
+    Passing `limit` or `cursor` opts into cursor pages, returned as `{"items", "next_cursor"}`.
+    """
+    rows = data_loader.iter_products(after_id=parse_cursor(cursor), product_ids=parse_ids(ids))
+    if format == "ndjson":
+        return ndjson_response(rows, parse_csv(fields), limit)
+    if limit is None and cursor is None:
+        return list(project(rows, parse_csv(fields)))
+    return paginate(rows, limit or DEFAULT_PAGE_SIZE, "id", parse_csv(fields))
 
 @app.get("/ingredients")
 def get_ingredients():
     return data_loader.get_ingredients()
 
 @app.get("/sales")
-def get_sales():
-    return data_loader.get_sales()
+def get_sales(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    product_ids: Optional[str] = None,
+    start_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    end_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """Returns per-product daily sales, filtered by product and date range, as a list or streamed.
+
+    Passing `limit` or `cursor` opts into cursor pages, as for /products.
+    """
+    rows = data_loader.iter_sales(
+        after_id=parse_cursor(cursor),
+        product_ids=parse_ids(product_ids),
+        start_date=start_date,
+        end_date=end_date,
+    )
+    if format == "ndjson":
+        return ndjson_response(rows, parse_csv(fields), limit)
+    if limit is None and cursor is None:
+        return list(project(rows, parse_csv(fields)))
+    return paginate(rows, limit or DEFAULT_PAGE_SIZE, "product_id", parse_csv(fields))
+
+class SalesEvent(BaseModel):
+    product_id: int
+    units: float = Field(1, ge=0)
+    timestamp: Optional[float] = None  # Unix seconds; defaults to time of receipt
+
+@app.post("/sales/events")
+def ingest_sales_events(events: Union[SalesEvent, List[SalesEvent]]):
+    """Applies one or many sales events to the live popularity counters used for ranking.
+
+    Events for products outside the catalog are skipped and their ids returned as `rejected`.
+    """
+    require_ready()
+    if isinstance(events, SalesEvent):
+        events = [events]
+    if len(events) > config.MAX_SALES_EVENTS_PER_REQUEST:
+        raise HTTPException(status_code=413, detail=f"At most {config.MAX_SALES_EVENTS_PER_REQUEST} events per request.")
+    now = time.time()
+    oldest = now - config.SALES_EVENT_MAX_AGE_DAYS * 86400
+    newest = now + config.SALES_EVENT_MAX_SKEW_SECONDS
+    out_of_range = [position for position, e in enumerate(events)
+                    if e.timestamp is not None and not oldest <= e.timestamp <= newest]
+    if out_of_range:
+        raise HTTPException(status_code=422, detail={
+            "message": f"Event timestamps must be within {config.SALES_EVENT_MAX_AGE_DAYS:g} days before "
+                       f"and {config.SALES_EVENT_MAX_SKEW_SECONDS:g}s after the server time.",
+            "events": out_of_range[:100]})
+    # Only catalog products get counters, so unknown ids cannot grow them without bound.
+    catalog = recommendation_engine.filter_index
+    rejected = list(dict.fromkeys(e.product_id for e in events if e.product_id not in catalog))
+    try:
+        accepted = sales_counters.record_many((e.product_id, e.units, e.timestamp) for e in events
+                                              if e.product_id in catalog)
+    except RuntimeError as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    return {"accepted": accepted, "rejected": rejected, **sales_counters.stats()}
 
 @app.get("/suggestions")
 async def get_suggestions(query: str = Query(..., min_length=1)):
     """Returns suggested search keywords based on user input."""
-    query_lower = query.lower()
+    with span("suggest"):
+        suggestions = suggestion_index.suggest(query, limit=5)
+    suggestion_counts.observe(len(suggestions))
+    return suggestions
 
-    results = collection.get(include=["metadatas"])
 
-    all_names = [meta["name"].lower() for meta in results["metadatas"] if "name" in meta]
+@app.post("/index/reload")
+@app.post("/suggestions/refresh")
+def reload_index():
+    """Picks up an out-of-process re-index: reopens the retrieval index and rebuilds every derived index.
 
-    filtered_suggestions = [name.title() for name in all_names if query_lower in name]
+    Bumps the index generation, so materialized results are recomputed and
+    suggestions rebuilt by the reindex listeners before this returns.
+    """
+    require_ready()
+    recommendation_engine.reload_index()
+    return {"index_generation": recommendation_engine.index_generation, "terms": len(suggestion_index)}
 
-    suggestions = list(set(POPULAR_KEYWORDS + filtered_suggestions))[:5]
 
-    return suggestions
+@app.get("/recommendations/filters")
+def get_filter_values():
+    """Filterable types, effects and ingredients as spelled in the catalog."""
+    require_ready()
+    return recommendation_engine.filter_index.facets()
 
 
 @app.get("/recommendations")
-async def get_recommendations(query: str = Query(..., min_length=1)):
-    recommendations = recommendation_engine.get_recommendations(query)
+async def get_recommendations(
+    query: str = Query(..., min_length=1),
+    product_type: Optional[str] = Query(None, alias="type", description="Comma-separated; any may match"),
+    effects: Optional[str] = Query(None, description="Comma-separated; all must match"),
+    ingredients: Optional[str] = Query(None, description="Comma-separated; all must match"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, in order"),
+    snippet: bool = Query(False, description="Shorten descriptions to a snippet"),
+):
+    require_searchable()
+    filters = ProductFilters(
+        types=tuple(parse_csv(product_type) or ()),
+        effects=tuple(parse_csv(effects) or ()),
+        ingredients=tuple(parse_csv(ingredients) or ()),
+        min_price=min_price,
+        max_price=max_price,
+    )
+    # Head queries are a dictionary lookup; no need to leave the event loop.
+    products = materialized.get(query, RECOMMENDATIONS_TOP_N, filters)
+    if products is not None:
+        count("materialized_hits_total", help_text="Recommendations served from materialized results.")
+        return render_recommendations(products, parse_csv(fields), snippet)
+    return await run_cpu_bound(rank_recommendations, query, filters, parse_csv(fields), snippet)
 
-    if not recommendations:
+
+def render_recommendations(products, fields: Optional[List[str]] = None, snippet: bool = False) -> Response:
+    """JSON array of ranked products, spliced from their pre-serialized fragments."""
+    with span("serialize"):
+        return Response(recommendation_engine.fragments.render(products, fields, snippet),
+                        media_type="application/json")
+
+
+def rank_recommendations(query: str, filters: Optional[ProductFilters] = None,
+                         fields: Optional[List[str]] = None, snippet: bool = False):
+    """Blocking encode, vector search, ranking and serialization for a single query."""
+    products = recommendation_engine.rank_products_batch([query], RECOMMENDATIONS_TOP_N, [filters])[0]
+    if not products:
+        count("recommendation_empty_total", help_text="Queries that returned no recommendations.")
         logger.warning("No recommendations found.")
-        return []
+    return render_recommendations(products, fields, snippet)
 
-    df = pd.DataFrame(recommendations)
 
-    logger.info(f"DataFrame Columns: {df.columns.tolist()}")
+@app.get("/products/{product_id}/similar")
+async def get_similar_products(
+    product_id: str,
+    top_n: int = Query(10, ge=1, le=config.NEIGHBORS_K),
+    sales_weight: float = Query(config.SIMILAR_SALES_WEIGHT, ge=0, le=1,
+                                description="Blend of sales velocity into the similarity ranking"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, in order"),
+    snippet: bool = Query(False, description="Shorten descriptions to a snippet"),
+):
+    """Nearest products from the precomputed neighbour table: a lookup, no model call or vector search."""
+    require_ready()
+    try:
+        products = recommendation_engine.similar_products(product_id, top_n, sales_weight)
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Similar products have not been computed.")
+    if products is None:
+        raise HTTPException(status_code=404, detail="Product not found.")
+    return render_recommendations(products, parse_csv(fields), snippet)
 
-    for col in ["description", "effects", "ingredients", "type", "price"]:
-        if col not in df.columns:
-            logger.warning(f"Warning: '{col}' column is missing. Filling with default values.")
-            df[col] = "Unknown" if col != "price" else 1.0  # Default price to 1.0
 
-    df["price"] = pd.to_numeric(df["price"], errors="coerce").fillna(1.0)
-    
-    df["effects"] = df["effects"].apply(lambda x: x if isinstance(x, list) else [])
-    df["ingredients"] = df["ingredients"].apply(lambda x: x if isinstance(x, list) else [])
+class BatchQuery(BaseModel):
+    query: str = Field(..., min_length=1)
+    top_n: int = Field(10, ge=1, le=config.MAX_BATCH_TOP_N)
+    type: List[str] = []  # any may match
+    effects: List[str] = []  # all must match
+    ingredients: List[str] = []  # all must match
+    min_price: Optional[float] = Field(None, ge=0)
+    max_price: Optional[float] = Field(None, ge=0)
 
-    df["weighted_score"] = (
-        df["similarity_score"] * 0.8 +  # 80% similarity
-        (1 / df["price"].replace(0, 1)) * 0.2  # 20% price influence
-    )
+    def filters(self) -> ProductFilters:
+        return ProductFilters(
+            types=tuple(self.type),
+            effects=tuple(self.effects),
+            ingredients=tuple(self.ingredients),
+            min_price=self.min_price,
+            max_price=self.max_price,
+        )
+
+class BatchRecommendationRequest(BaseModel):
+    queries: List[BatchQuery]
+    fields: Optional[List[str]] = None  # per product, in order; all when unset
+    snippet: bool = False  # shorten descriptions to a snippet
+
+@app.post("/recommendations/batch")
+async def get_recommendations_batch(request: BatchRecommendationRequest):
+    """Recommendations for many queries, encoded together and searched in one pass.
 
-    df = df.sort_values(by="weighted_score", ascending=False)
+    Responds with `{"results": [...]}`: one `{"query": ..., "recommendations": [...]}` per query,
+    in request order.
+    """
+    require_searchable()
+    if len(request.queries) > config.MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {config.MAX_BATCH_QUERIES} queries per request.")
+    return await run_cpu_bound(rank_recommendations_batch, request.queries, request.fields, request.snippet)
 
-    logger.info(f"Top Recommendations:\n{df[['name', 'weighted_score']].head(5)}")
 
-    return df.head(10).to_dict(orient="records")
+def rank_recommendations_batch(queries: List[BatchQuery], fields: Optional[List[str]] = None,
+                               snippet: bool = False):
+    """Blocking batch encode, search, ranking and serialization."""
+    batch_sizes.observe(len(queries))
+    filters = [q.filters() for q in queries]
+    results = [materialized.get(q.query, q.top_n, f) for q, f in zip(queries, filters)]
+    pending = [i for i, recommendations in enumerate(results) if recommendations is None]
+    if len(pending) < len(queries):
+        count("materialized_hits_total", len(queries) - len(pending),
+              help_text="Recommendations served from materialized results.")
+    if pending:
+        computed = recommendation_engine.rank_products_batch(
+            [queries[i].query for i in pending], [queries[i].top_n for i in pending], [filters[i] for i in pending])
+        for i, recommendations in zip(pending, computed):
+            results[i] = recommendations
+    empty = sum(not recommendations for recommendations in results)
+    if empty:
+        count("recommendation_empty_total", empty, help_text="Queries that returned no recommendations.")
+    with span("serialize"):
+        fragments = recommendation_engine.fragments
+        body = b",".join(b'{"query":' + dumps(q.query) + b',"recommendations":'
+                         + fragments.render(products, fields, snippet) + b"}"
+                         for q, products in zip(queries, results))
+        return Response(b'{"results":[' + body + b"]}", media_type="application/json")
 
 
 if __name__ == "__main__":
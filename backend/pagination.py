@@ -0,0 +1,66 @@
+import json
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def parse_csv(value: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated query parameter, ignoring blanks."""
+    if value is None:
+        return None
+    items = [item.strip() for item in value.split(",") if item.strip()]
+    return items or None
+
+
+def parse_ids(value: Optional[str]) -> Optional[List[int]]:
+    items = parse_csv(value)
+    if items is None:
+        return None
+    try:
+        return [int(item) for item in items]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Product ids must be integers.")
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[int]:
+    if cursor is None or cursor == "":
+        return None
+    try:
+        return int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor.")
+
+
+def project(rows: Iterable[Dict[str, Any]], fields: Optional[List[str]]) -> Iterator[Dict[str, Any]]:
+    """Keep only the requested fields of each row."""
+    if not fields:
+        return iter(rows)
+    return ({field: row[field] for field in fields if field in row} for row in rows)
+
+
+def paginate(rows: Iterator[Dict[str, Any]], limit: int, cursor_field: str,
+             fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Take one page of rows; `next_cursor` is the last row's id, or None on the final page."""
+    page = list(islice(rows, limit + 1))
+    has_more = len(page) > limit
+    page = page[:limit]
+    next_cursor = str(page[-1][cursor_field]) if has_more and page else None
+    return {"items": list(project(page, fields)), "next_cursor": next_cursor}
+
+
+def ndjson_response(rows: Iterator[Dict[str, Any]], fields: Optional[List[str]] = None,
+                    limit: Optional[int] = None) -> StreamingResponse:
+    """Stream rows as newline-delimited JSON without materializing the full body."""
+    if limit is not None:
+        rows = islice(rows, limit)
+
+    def lines():
+        for row in project(rows, fields):
+            yield json.dumps(row) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
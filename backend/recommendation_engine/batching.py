@@ -0,0 +1,103 @@
+# batching.py
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+import queue
+import threading
+import time
+
+import numpy as np
+
+from backend.recommendation_engine.metrics import Histogram, SIZE_BUCKETS
+
+
+class MicroBatchEncoder:
+    """Coalesces concurrent encode calls into batched `model.encode` calls.
+
+    A single worker thread owns the model. Requests that queue up while a batch
+    is encoding are picked up together; when the encoder is under load it also
+    waits up to `max_wait_ms` for more work. An idle encoder dispatches a lone
+    request immediately, so single-request latency is unchanged.
+    """
+
+    def __init__(self, model: Any, max_batch_size: int = 32, max_wait_ms: float = 2.0,
+                 normalize_embeddings: bool = True):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.normalize_embeddings = normalize_embeddings
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self.wait_times = Histogram()
+        self.encode_times = Histogram()
+        self._queue: "queue.Queue[Optional[Tuple[List[str], Future, float]]]" = queue.Queue()
+        self._last_batch_size = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batch-encoder", daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts through the shared batch and block until their embeddings are ready."""
+        future: Future = Future()
+        self._queue.put((list(texts), future, time.perf_counter()))
+        return future.result()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _collect(self, first: Tuple[List[str], Future, float]) -> Tuple[list, bool]:
+        batch, size = [first], len(first[0])
+        under_load = self._last_batch_size > 1
+        deadline = first[2] + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                under_load = under_load or len(batch) > 1
+                remaining = deadline - time.perf_counter()
+                if not under_load or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            size += len(item[0])
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stop = self._collect(first)
+            texts = [text for item_texts, _, _ in batch for text in item_texts]
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.wait_times.observe(started - enqueued)
+            self.batch_sizes.observe(len(texts))
+            self._last_batch_size = len(texts)
+            try:
+                embeddings = self.model.encode(texts, normalize_embeddings=self.normalize_embeddings)
+                embeddings = np.asarray(embeddings, dtype=np.float32)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                offset = 0
+                for item_texts, future, _ in batch:
+                    future.set_result(embeddings[offset:offset + len(item_texts)])
+                    offset += len(item_texts)
+            self.encode_times.observe(time.perf_counter() - started)
+            if stop:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queued": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_seconds": self.wait_times.snapshot(),
+            "encode_seconds": self.encode_times.snapshot(),
+        }
@@ -0,0 +1,238 @@
+# compression.py
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+DTYPES = ("float32", "float16", "int8")
+PROJECTIONS = ("prefix", "pca")
+BLOCK_ROWS = 65536
+PCA_SAMPLE = 50000
+
+
+class EmbeddingCodec:
+    """Compact search vectors: optional dimension reduction followed by float16 or int8 storage.
+
+    Reduction keeps either the first `dims` coordinates ("prefix") or projects
+    onto the top `dims` principal components ("pca"). int8 codes use a
+    symmetric per-dimension scale; folding that scale into the query lets one
+    matmul against the raw codes produce the approximate inner products. The
+    scores only need to rank candidates, which are then rescored at full
+    precision.
+    """
+
+    def __init__(self, dtype: str = "float16", dims: int = 0, projection: str = "prefix",
+                 mean: Optional[np.ndarray] = None, components: Optional[np.ndarray] = None,
+                 scale: Optional[np.ndarray] = None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown compressed dtype '{dtype}'")
+        if projection not in PROJECTIONS:
+            raise ValueError(f"Unknown projection '{projection}'")
+        self.dtype = dtype
+        self.dims = dims
+        self.projection = projection
+        self.mean = mean
+        self.components = components
+        self.scale = scale
+
+    @property
+    def key(self) -> str:
+        return f"{self.dtype}-{self.projection}{self.dims}"
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.dims * np.dtype(self.dtype).itemsize
+
+    @classmethod
+    def fit(cls, embeddings: np.ndarray, dtype: str = "float16", dims: int = 0,
+            projection: str = "prefix", seed: int = 0) -> "EmbeddingCodec":
+        full_dims = embeddings.shape[1]
+        dims = full_dims if not dims or dims >= full_dims else dims
+        codec = cls(dtype, dims, projection if dims < full_dims else "prefix")
+        if codec.projection == "pca":
+            rows = np.arange(len(embeddings))
+            if len(rows) > PCA_SAMPLE:
+                rows = np.sort(np.random.default_rng(seed).choice(rows, PCA_SAMPLE, replace=False))
+            sample = np.asarray(embeddings[rows], dtype=np.float32)
+            codec.mean = sample.mean(axis=0)
+            _, _, vt = np.linalg.svd(sample - codec.mean, full_matrices=False)
+            # A catalog with fewer rows than `dims` only has that many components.
+            dims = codec.dims = min(dims, vt.shape[0])
+            codec.components = np.ascontiguousarray(vt[:dims].T, dtype=np.float32)
+        if dtype == "int8":
+            max_abs = np.zeros(dims, dtype=np.float32)
+            for start in range(0, len(embeddings), BLOCK_ROWS):
+                block = np.abs(codec.project(embeddings[start:start + BLOCK_ROWS]))
+                max_abs = np.maximum(max_abs, block.max(axis=0))
+            codec.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        return codec
+
+    def project(self, matrix: np.ndarray) -> np.ndarray:
+        """Reduce document vectors to the codec's dimensions (float32)."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if self.projection == "pca" and self.components is not None:
+            return (matrix - self.mean) @ self.components
+        return matrix[:, :self.dims]
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        reduced = self.project(matrix)
+        if self.dtype == "int8":
+            return np.clip(np.rint(reduced / self.scale), -127, 127).astype(np.int8)
+        return reduced.astype(self.dtype)
+
+    def encode_all(self, embeddings: np.ndarray) -> np.ndarray:
+        """Encode a (possibly memory-mapped) matrix block by block."""
+        codes = np.empty((len(embeddings), self.dims), dtype=self.dtype)
+        for start in range(0, len(embeddings), BLOCK_ROWS):
+            codes[start:start + BLOCK_ROWS] = self.encode(embeddings[start:start + BLOCK_ROWS])
+        return codes
+
+    def project_queries(self, queries: np.ndarray) -> np.ndarray:
+        """Reduce query vectors to the codec's dimensions.
+
+        PCA codes are centered but queries are not; the dropped q . mean term is
+        the same for every document, so it does not change the ranking.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.projection == "pca" and self.components is not None:
+            return np.ascontiguousarray(queries @ self.components)
+        return np.ascontiguousarray(queries[:, :self.dims])
+
+    def query_weights(self, queries: np.ndarray) -> np.ndarray:
+        """Project queries so that `weights @ codes.T` ranks documents by approximate similarity."""
+        weights = self.project_queries(queries)
+        if self.dtype == "int8":
+            weights = weights * self.scale
+        return weights
+
+    def save(self, path: str) -> None:
+        arrays = {name: value for name, value in
+                  (("mean", self.mean), ("components", self.components), ("scale", self.scale)) if value is not None}
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, config=np.array(json.dumps(
+                {"dtype": self.dtype, "dims": self.dims, "projection": self.projection})), **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingCodec":
+        with np.load(path) as data:
+            config = json.loads(str(data["config"]))
+            return cls(config["dtype"], config["dims"], config["projection"],
+                       **{name: data[name] for name in ("mean", "components", "scale") if name in data})
+
+
+def compact_top_k(codes: np.ndarray, weights: np.ndarray, k: int,
+                  block_rows: int = BLOCK_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k rows of `weights @ codes.T` per query, scanning codes in blocks.
+
+    Only one block is widened to float32 at a time, so the scan never holds a
+    full-precision copy of the catalog. Returns unsorted (scores, rows).
+    """
+    n = len(codes)
+    k = min(k, n)
+    best_scores = np.full((len(weights), 0), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(weights), 0), dtype=np.int64)
+    for start in range(0, n, block_rows):
+        block = np.asarray(codes[start:start + block_rows], dtype=np.float32)
+        scores = np.concatenate([best_scores, weights @ block.T], axis=1)
+        rows = np.concatenate([best_rows, np.broadcast_to(
+            np.arange(start, start + len(block), dtype=np.int64), (len(weights), len(block)))], axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores, rows = np.take_along_axis(scores, keep, axis=1), np.take_along_axis(rows, keep, axis=1)
+        best_scores, best_rows = scores, rows
+    return best_scores, best_rows
+
+
+def rescore(embeddings: np.ndarray, queries: np.ndarray, candidates: np.ndarray,
+            k: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Rescore candidate rows against full-precision embeddings and keep the top k.
+
+    Candidate rows are read in ascending order so a memory-mapped matrix is
+    touched page by page; returns (scores, rows) sorted by descending score.
+    """
+    out_scores, out_rows = [], []
+    for query, rows in zip(queries, candidates):
+        rows = np.unique(rows[rows >= 0])
+        scores = np.asarray(embeddings[rows], dtype=np.float32) @ query
+        order = np.argsort(-scores, kind="stable")[:k]
+        out_scores.append(scores[order])
+        out_rows.append(rows[order])
+    return out_scores, out_rows
+
+
+def exact_top_k(embeddings: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Ground-truth top-k rows by full-precision inner product, scanning in blocks."""
+    _, rows = compact_top_k(embeddings, np.atleast_2d(np.asarray(queries, dtype=np.float32)), k)
+    return rows
+
+
+def recall_at_k(expected: np.ndarray, found: List[np.ndarray], k: int = 10) -> float:
+    """Mean fraction of the exact top-k rows that the approximate search returned."""
+    hits = [len(np.intersect1d(truth[:k], rows[:k])) / float(min(k, len(truth)))
+            for truth, rows in zip(expected, found) if len(truth)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def evaluate(embeddings: np.ndarray, configs: List[Dict[str, Any]], num_queries: int = 500,
+             k: int = 10, rescore_multiplier: int = 4, seed: int = 0) -> List[Dict[str, Any]]:
+    """Compare compressed search (with and without rescoring) against exact search.
+
+    Queries are catalog vectors with a little noise added, which keeps their
+    neighbourhoods realistic without needing the encoder.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(embeddings), min(num_queries, len(embeddings)), replace=False)
+    queries = np.asarray(embeddings[np.sort(rows)], dtype=np.float32)
+    queries = queries + rng.normal(0, 0.02, queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_top_k(embeddings, queries, k)
+    truth = [row[np.argsort(-(np.asarray(embeddings[row], dtype=np.float32) @ query))]
+             for query, row in zip(queries, truth)]
+
+    report = []
+    for config in configs:
+        codec = EmbeddingCodec.fit(embeddings, **config)
+        codes = codec.encode_all(embeddings)
+        started = time.perf_counter()
+        scores, candidates = compact_top_k(codes, codec.query_weights(queries), k * rescore_multiplier)
+        compact_seconds = time.perf_counter() - started
+        order = np.argsort(-scores, axis=1, kind="stable")
+        compact_rows = list(np.take_along_axis(candidates, order, axis=1)[:, :k])
+        started = time.perf_counter()
+        _, rescored_rows = rescore(embeddings, queries, candidates, k)
+        rescore_seconds = time.perf_counter() - started
+        report.append({
+            "codec": codec.key,
+            "bytes_per_vector": codec.bytes_per_vector,
+            "index_mb": codes.nbytes / 1e6,
+            f"recall@{k}": recall_at_k(truth, compact_rows, k),
+            f"recall@{k}_rescored": recall_at_k(truth, rescored_rows, k),
+            "ms_per_query": 1000 * (compact_seconds + rescore_seconds) / len(queries),
+        })
+    return report
+
+
+if __name__ == '__main__':
+    from backend.recommendation_engine.retrieval import DEFAULT_INDEX_DIR, EMBEDDINGS_FILE
+
+    parser = argparse.ArgumentParser(description="Report recall@k of compressed embeddings against exact search.")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-multiplier", type=int, default=4)
+    parser.add_argument("--dims", type=int, nargs="+", default=[0, 384, 256])
+    args = parser.parse_args()
+
+    matrix = np.load(os.path.join(args.index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+    configs = [{"dtype": dtype, "dims": dims, "projection": projection}
+               for dtype in ("float16", "int8") for dims in args.dims
+               for projection in (("prefix",) if not dims else PROJECTIONS)]
+    print(f"{len(matrix)} vectors x {matrix.shape[1]} dims, "
+          f"{matrix.shape[1] * 4} bytes/vector at float32")
+    for row in evaluate(matrix, configs, args.queries, args.k, args.rescore_multiplier):
+        print(json.dumps({name: round(value, 4) if isinstance(value, float) else value
+                          for name, value in row.items()}))
@@ -0,0 +1,282 @@
+# encoder_service.py
+from multiprocessing.connection import AuthenticationError, Client, Connection, Listener
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import argparse
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+
+from backend.recommendation_engine.batching import MicroBatchEncoder
+from backend.recommendation_engine.encoders import load_encoder
+from backend.recommendation_engine.metrics import REGISTRY, Histogram, MetricsExporter
+
+# Texts per request when encoding documents, so long ingest jobs interleave with queries.
+DOCUMENT_CHUNK = 256
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """`host:port` is a TCP address; anything else is a Unix socket path."""
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def check_authkey(address: str, authkey: Optional[bytes]) -> None:
+    """Refuse TCP without an authkey: requests are unpickled, so an open port would run anyone's code."""
+    if not authkey and not isinstance(parse_address(address), str):
+        raise ValueError(f"Encoder service address {address} is TCP; set ENCODER_SERVICE_AUTHKEY to use it")
+
+
+class EncoderServer:
+    """Owns one encoder and serves encode requests from HTTP workers over local IPC.
+
+    Every client connection gets a thread, and all of them feed one
+    MicroBatchEncoder, so concurrent queries from different workers share
+    model calls. Requests are tuples: `("encode", texts)` returns raw float32
+    embeddings (clients normalize), `("info",)` the encoder's name and
+    dimension, `("stats",)` the micro-batch histograms. Replies are
+    `("ok", value)` or `("error", message)`.
+    """
+
+    def __init__(self, model: Any, address: str, authkey: Optional[bytes] = None,
+                 max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        self.model = model
+        self.address = address
+        self.authkey = authkey
+        self.encoder = MicroBatchEncoder(model, max_batch_size, max_wait_ms, normalize_embeddings=False)
+        self.connections = 0
+        self._listener: Optional[Listener] = None
+        self._closed = threading.Event()
+
+    def serve_forever(self) -> None:
+        check_authkey(self.address, self.authkey)
+        address = parse_address(self.address)
+        if isinstance(address, str) and os.path.exists(address):
+            os.remove(address)  # left over from a previous run
+        self._listener = Listener(address, authkey=self.authkey)
+        print(f"Encoder service {self.model.name} listening on {self.address}")
+        while not self._closed.is_set():
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError as e:
+                print(f"Encoder service rejected a client: {e}")
+                continue
+            except OSError:
+                if self._closed.is_set():
+                    return
+                raise
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(connection,), name="encoder-client", daemon=True).start()
+
+    def _handle(self, connection: Connection) -> None:
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ("ok", self._dispatch(request))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                try:
+                    connection.send(reply)
+                except OSError:
+                    return
+
+    def _dispatch(self, request: Tuple[Any, ...]) -> Any:
+        kind = request[0]
+        if kind == "encode":
+            return self.encoder.encode(request[1])
+        if kind == "info":
+            return {"name": self.model.name, "dim": self.model.get_sentence_embedding_dimension(),
+                    "pid": os.getpid()}
+        if kind == "stats":
+            return dict(self.encoder.stats(), connections=self.connections, pid=os.getpid())
+        raise ValueError(f"Unknown request '{kind}'")
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._listener is not None:
+            self._listener.close()
+        self.encoder.close()
+
+
+class RemoteEncoder:
+    """TextEncoder-compatible client of one or more EncoderServers.
+
+    Connections are pooled per server and reused across calls; calls rotate
+    over the servers, and one that fails on a broken connection is retried
+    once on the next server.
+    """
+
+    def __init__(self, addresses: Sequence[str], authkey: Optional[bytes] = None, timeout: float = 30.0):
+        if not addresses:
+            raise ValueError("RemoteEncoder needs at least one server address")
+        for address in addresses:
+            check_authkey(address, authkey)
+        self.addresses = list(addresses)
+        self.authkey = authkey
+        self.timeout = timeout
+        self.rpc_times = Histogram()
+        self.errors = 0
+        self._idle: Dict[str, List[Connection]] = {address: [] for address in self.addresses}
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+        self._info: Optional[Dict[str, Any]] = None
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        if self._info is None:
+            self._info = self._call(("info",))
+        return self._info
+
+    @property
+    def name(self) -> str:
+        return self.info["name"]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.info["dim"]
+
+    def _acquire(self, address: str) -> Connection:
+        with self._lock:
+            if self._idle[address]:
+                return self._idle[address].pop()
+        return Client(parse_address(address), authkey=self.authkey)
+
+    def _release(self, address: str, connection: Connection) -> None:
+        with self._lock:
+            self._idle[address].append(connection)
+
+    def _call(self, request: Tuple[Any, ...], address: Optional[str] = None) -> Any:
+        first = next(self._next)
+        targets = [address] if address else [self.addresses[(first + offset) % len(self.addresses)]
+                                             for offset in range(min(2, len(self.addresses) + 1))]
+        error: Optional[Exception] = None
+        for target in targets:
+            started = time.perf_counter()
+            try:
+                connection = self._acquire(target)
+            except OSError as e:
+                error = e
+                continue
+            try:
+                connection.send(request)
+                if not connection.poll(self.timeout):
+                    raise TimeoutError(f"no reply within {self.timeout}s")
+                status, value = connection.recv()
+            except (EOFError, OSError) as e:
+                # TimeoutError is an OSError; a late reply would desynchronize the connection, so drop it.
+                connection.close()
+                error = e
+                continue
+            self._release(target, connection)
+            self.rpc_times.observe(time.perf_counter() - started)
+            if status == "error":
+                raise RuntimeError(f"Encoder service: {value}")
+            return value
+        self.errors += 1
+        raise ConnectionError(f"Encoder service unavailable: {error}")
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False,
+               **kwargs) -> np.ndarray:
+        """Embed one text or a list of texts on the service; same contract as TextEncoder.encode."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        chunks = [np.asarray(self._call(("encode", texts[start:start + DOCUMENT_CHUNK])), dtype=np.float32)
+                  for start in range(0, len(texts), DOCUMENT_CHUNK)]
+        embeddings = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms > 0, norms, 1.0)
+        return embeddings[0] if single else embeddings
+
+    def stats(self) -> Dict[str, Any]:
+        servers = {}
+        for address in self.addresses:
+            try:
+                servers[address] = self._call(("stats",), address)
+            except Exception as e:
+                servers[address] = {"error": str(e)}
+        return {"rpc_seconds": self.rpc_times.snapshot(), "errors": self.errors, "servers": servers}
+
+    def close(self) -> None:
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+                connections.clear()
+
+
+def run_server(address: str, model_name: str, encoder_options: Dict[str, Any], authkey: Optional[bytes] = None,
+               max_batch_size: int = 32, max_wait_ms: float = 2.0, metrics_dir: Optional[str] = None,
+               worker: str = "encoder") -> None:
+    """Process entry point: load the encoder, warm it up and serve until terminated."""
+    model = load_encoder(model_name, **encoder_options)
+    server = EncoderServer(model, address, authkey, max_batch_size, max_wait_ms)
+    server.encoder.encode(["warm up"])
+    REGISTRY.register_histogram("encoder_service_batch_size", server.encoder.batch_sizes,
+                                "Texts per model.encode call in the encoder service.")
+    REGISTRY.register_histogram("encoder_service_queue_wait_seconds", server.encoder.wait_times,
+                                "Time requests waited for an encoder service batch.")
+    REGISTRY.register_histogram("encoder_service_batch_seconds", server.encoder.encode_times,
+                                "model.encode time per encoder service batch.")
+    if metrics_dir:
+        MetricsExporter(REGISTRY, metrics_dir, worker).start()
+    server.serve_forever()
+
+
+def wait_until_serving(address: str, authkey: Optional[bytes] = None, timeout: float = 600.0,
+                       process: Optional[multiprocessing.Process] = None) -> None:
+    """Block until a server answers at `address` (the model may take minutes to load)."""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with Client(parse_address(address), authkey=authkey) as connection:
+                connection.send(("info",))
+                connection.recv()
+                return
+        except (OSError, EOFError):
+            if process is not None and not process.is_alive():
+                raise RuntimeError(f"Encoder service at {address} exited with code {process.exitcode}")
+            if time.time() > deadline:
+                raise TimeoutError(f"Encoder service at {address} did not start within {timeout}s")
+            time.sleep(0.2)
+
+
+def start_servers(addresses: Sequence[str], model_name: str, encoder_options: Dict[str, Any],
+                  authkey: Optional[bytes] = None, max_batch_size: int = 32, max_wait_ms: float = 2.0,
+                  metrics_dir: Optional[str] = None, timeout: float = 600.0) -> List[multiprocessing.Process]:
+    """Start one encoder process per address and wait until all of them serve."""
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for index, address in enumerate(addresses):
+        process = context.Process(
+            target=run_server, name=f"encoder-{index}", daemon=True,
+            args=(address, model_name, encoder_options, authkey, max_batch_size, max_wait_ms, metrics_dir,
+                  f"encoder-{index}"))
+        process.start()
+        processes.append(process)
+    for address, process in zip(addresses, processes):
+        wait_until_serving(address, authkey, timeout, process)
+    return processes
+
+
+if __name__ == '__main__':
+    from backend import config
+    from backend.recommendation_engine.recommender import MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Serve query/document encoding to HTTP workers over IPC.")
+    parser.add_argument("--address", default=(config.encoder_service_options().get("addresses") or
+                                              ["/tmp/recommendation-encoder.sock"])[0],
+                        help="Unix socket path or host:port")
+    args = parser.parse_args()
+    run_server(args.address, MODEL_NAME, config.encoder_options(), config.ENCODER_SERVICE_AUTHKEY.encode() or None,
+               config.ENCODE_BATCH_SIZE, config.ENCODE_BATCH_WAIT_MS, config.METRICS_DIR or None)
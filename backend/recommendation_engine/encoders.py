@@ -0,0 +1,364 @@
+# encoders.py
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+QUANTIZED_BACKENDS = ("torch-int8", "onnx-int8")
+REFERENCE_BACKEND = "torch"
+POOLING_MODES = ("cls", "mean")
+DEFAULT_ONNX_DIR = "data/onnx"
+ONNX_OPSET = 18
+
+
+def encoder_name(model_name: str, backend: str = REFERENCE_BACKEND) -> str:
+    """Identity of the embeddings a backend produces; lossless backends share the model's name.
+
+    Use it wherever embeddings are cached or compared (embedding store,
+    content hashes), so int8 vectors never mix with full-precision ones.
+    """
+    return f"{model_name}+int8" if backend in QUANTIZED_BACKENDS else model_name
+
+
+def _model_file(model_name: str, filename: str) -> Optional[str]:
+    """Path of a file in a local model directory or the Hugging Face cache, if it exists."""
+    if os.path.isdir(model_name):
+        path = os.path.join(model_name, filename)
+        return path if os.path.exists(path) else None
+    try:
+        from huggingface_hub import hf_hub_download
+        return hf_hub_download(model_name, filename)
+    except Exception:
+        return None
+
+
+def sentence_transformers_settings(model_name: str) -> Dict[str, Any]:
+    """Pooling, normalization and max length from a sentence-transformers model's config files, if present."""
+    settings: Dict[str, Any] = {}
+    modules_path = _model_file(model_name, "modules.json")
+    if modules_path is None:
+        return settings
+    with open(modules_path, encoding="utf-8") as f:
+        modules = json.load(f)
+    settings["normalize"] = any(module.get("type", "").endswith("Normalize") for module in modules)
+    for module in modules:
+        if module.get("type", "").endswith("Pooling"):
+            pooling_path = _model_file(model_name, f"{module['path']}/config.json")
+            if pooling_path is not None:
+                with open(pooling_path, encoding="utf-8") as f:
+                    pooling = json.load(f)
+                settings["pooling"] = "cls" if pooling.get("pooling_mode_cls_token") else "mean"
+    config_path = _model_file(model_name, "sentence_bert_config.json")
+    if config_path is not None:
+        with open(config_path, encoding="utf-8") as f:
+            settings["max_seq_length"] = json.load(f).get("max_seq_length")
+    return settings
+
+
+def _hidden_states_module(model, input_names: Sequence[str]):
+    """Wrap a transformer so ONNX export sees positional tensor inputs and a single output."""
+    import torch
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    return HiddenStates().eval()
+
+
+def export_onnx(model_name: str, onnx_dir: str = DEFAULT_ONNX_DIR, quantize: bool = False) -> str:
+    """Export the transformer to ONNX (and optionally int8-quantize it) once; returns the model path."""
+    target_dir = os.path.join(onnx_dir, model_name.strip("/").replace("/", "--"))
+    fp32_path = os.path.join(target_dir, "model.onnx")
+    int8_path = os.path.join(target_dir, "model-int8.onnx")
+    path = int8_path if quantize else fp32_path
+    if os.path.exists(path):
+        return path
+    os.makedirs(target_dir, exist_ok=True)
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export sample", "a longer export sample text"], padding=True, return_tensors="pt")
+        input_names = list(sample.keys())
+        batch, sequence = torch.export.Dim("batch"), torch.export.Dim("sequence")
+        dynamic_shapes = (tuple({0: batch, 1: sequence} for _ in input_names),)
+        tmp_path = fp32_path + ".tmp"
+        # Weights stay inside the .onnx file (no external data), so the atomic rename covers them.
+        with torch.inference_mode():
+            torch.onnx.export(_hidden_states_module(model, input_names), tuple(sample[name] for name in input_names),
+                              tmp_path, input_names=input_names, output_names=["last_hidden_state"],
+                              dynamic_shapes=dynamic_shapes, opset_version=ONNX_OPSET, dynamo=True,
+                              external_data=False, verbose=False)
+        os.replace(tmp_path, fp32_path)
+        print(f"Exported {model_name} to {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp_path = int8_path + ".tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+        print(f"Quantized {fp32_path} to {int8_path}")
+    return path
+
+
+class TextEncoder:
+    """Sentence encoder over a Hugging Face transformer with selectable CPU backends.
+
+    Backends: `torch` (the reference), `torch-int8` (dynamic int8 quantization
+    of the linear layers), `onnx` and `onnx-int8` (ONNX Runtime on an exported
+    graph, exported once into `onnx_dir`). `encode` matches
+    SentenceTransformer.encode, so it plugs into MicroBatchEncoder and
+    EmbeddingStore. Texts are tokenized once, truncated to `max_seq_length`
+    and batched in order of token length, so a batch pads only to its own
+    longest text. `threads` > 0 sets the intra-op thread count (for torch,
+    process-wide).
+    """
+
+    def __init__(self, model_name: str, backend: str = REFERENCE_BACKEND, threads: int = 0,
+                 max_seq_length: Optional[int] = None, pooling: Optional[str] = None,
+                 normalize: Optional[bool] = None, onnx_dir: str = DEFAULT_ONNX_DIR):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown encoder backend '{backend}', expected one of {BACKENDS}")
+        from transformers import AutoConfig, AutoTokenizer
+
+        settings = sentence_transformers_settings(model_name)
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = max(0, int(threads))
+        self.pooling = pooling or settings.get("pooling") or "cls"
+        if self.pooling not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling '{self.pooling}', expected one of {POOLING_MODES}")
+        # sentence-transformers models ending in a Normalize module always emit unit vectors.
+        self.normalize = settings.get("normalize", False) if normalize is None else normalize
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_seq_length = min(max_seq_length or settings.get("max_seq_length") or 512,
+                                  self.tokenizer.model_max_length)
+        self.dim = AutoConfig.from_pretrained(model_name).hidden_size
+
+        if backend.startswith("torch"):
+            self._forward = self._load_torch(backend == "torch-int8")
+        else:
+            self._forward = self._load_onnx(export_onnx(model_name, onnx_dir, quantize=backend == "onnx-int8"))
+
+    @property
+    def name(self) -> str:
+        return encoder_name(self.model_name, self.backend)
+
+    def _load_torch(self, quantize: bool):
+        import torch
+        from transformers import AutoModel
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        model = AutoModel.from_pretrained(self.model_name).eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        def forward(batch: Dict[str, np.ndarray]) -> np.ndarray:
+            with torch.inference_mode():
+                inputs = {name: torch.from_numpy(values) for name, values in batch.items()}
+                return model(**inputs).last_hidden_state.float().numpy()
+
+        return forward
+
+    def _load_onnx(self, path: str):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+        session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        input_names = [model_input.name for model_input in session.get_inputs()]
+
+        def forward(batch: Dict[str, np.ndarray]) -> np.ndarray:
+            return session.run(None, {name: batch[name] for name in input_names})[0]
+
+        return forward
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[:, :, np.newaxis].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False,
+               **kwargs) -> np.ndarray:
+        """Embed one text or a list of texts as float32 rows, in input order."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        if texts:
+            features = self.tokenizer(texts, truncation=True, max_length=self.max_seq_length)
+            lengths = np.fromiter((len(ids) for ids in features["input_ids"]), np.int64, len(texts))
+            # Longest first, so padding waste stays within each length bucket.
+            order = np.argsort(-lengths, kind="stable")
+            for start in range(0, len(texts), max(1, int(batch_size))):
+                rows = order[start:start + batch_size]
+                batch = self.tokenizer.pad({name: [values[i] for i in rows] for name, values in features.items()},
+                                           return_tensors="np")
+                batch = {name: np.asarray(values, dtype=np.int64) for name, values in batch.items()}
+                embeddings[rows] = self._pool(self._forward(batch), batch["attention_mask"])
+        if (normalize_embeddings or self.normalize) and len(embeddings):
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms > 0, norms, 1.0)
+        return embeddings[0] if single else embeddings
+
+
+_encoders: Dict[Tuple[Any, ...], TextEncoder] = {}
+
+
+def load_encoder(model_name: str, backend: str = REFERENCE_BACKEND, threads: int = 0,
+                 max_seq_length: Optional[int] = None, onnx_dir: str = DEFAULT_ONNX_DIR) -> TextEncoder:
+    """The process-wide encoder for these settings, loading it on first use."""
+    key = (model_name, backend, threads, max_seq_length, onnx_dir)
+    encoder = _encoders.get(key)
+    if encoder is None:
+        encoder = _encoders[key] = TextEncoder(model_name, backend, threads, max_seq_length, onnx_dir=onnx_dir)
+    return encoder
+
+
+def build_tiny_model(path: str, words: Sequence[str], hidden_size: int = 128, layers: int = 2,
+                     seed: int = 0) -> str:
+    """Save a small randomly initialized BERT and word-level tokenizer for offline tests.
+
+    The sentence-transformers config files (mean pooling, normalization) are
+    written too, so settings detection is exercised as for a real model.
+    """
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    os.makedirs(path, exist_ok=True)
+    vocabulary = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    vocabulary += sorted({token for word in words for token in word.lower().split()} - set(vocabulary))
+    vocab_file = os.path.join(path, "vocab.txt")
+    with open(vocab_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(vocabulary) + "\n")
+    BertTokenizerFast(vocab_file=vocab_file, model_max_length=512).save_pretrained(path)
+    torch.manual_seed(seed)
+    config = BertConfig(vocab_size=len(vocabulary), hidden_size=hidden_size, num_hidden_layers=layers,
+                        num_attention_heads=max(1, hidden_size // 64), intermediate_size=hidden_size * 4)
+    BertModel(config).eval().save_pretrained(path)
+    modules = [{"idx": 0, "name": "0", "path": "", "type": "sentence_transformers.models.Transformer"},
+               {"idx": 1, "name": "1", "path": "1_Pooling", "type": "sentence_transformers.models.Pooling"},
+               {"idx": 2, "name": "2", "path": "2_Normalize", "type": "sentence_transformers.models.Normalize"}]
+    os.makedirs(os.path.join(path, "1_Pooling"), exist_ok=True)
+    with open(os.path.join(path, "modules.json"), "w", encoding="utf-8") as f:
+        json.dump(modules, f)
+    with open(os.path.join(path, "1_Pooling", "config.json"), "w", encoding="utf-8") as f:
+        json.dump({"word_embedding_dimension": hidden_size, "pooling_mode_mean_tokens": True}, f)
+    with open(os.path.join(path, "sentence_bert_config.json"), "w", encoding="utf-8") as f:
+        json.dump({"max_seq_length": 128}, f)
+    return path
+
+
+def neighbor_recall(expected: np.ndarray, actual: np.ndarray, k: int = 10) -> float:
+    """Mean overlap of each row's k nearest neighbours (within the set) under both embeddings."""
+    k = min(k, len(expected) - 1)
+    if k <= 0:
+        return 1.0
+
+    def neighbors(embeddings: np.ndarray) -> np.ndarray:
+        similarity = embeddings @ embeddings.T
+        np.fill_diagonal(similarity, -np.inf)
+        return np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+
+    expected_neighbors, actual_neighbors = neighbors(expected), neighbors(actual)
+    overlap = [len(np.intersect1d(a, b)) for a, b in zip(expected_neighbors, actual_neighbors)]
+    return float(np.mean(overlap)) / k
+
+
+def compare_backends(model_name: str, texts: Sequence[str], backends: Sequence[str] = BACKENDS,
+                     reference: str = REFERENCE_BACKEND, threads: int = 0, max_seq_length: Optional[int] = None,
+                     batch_size: int = 32, onnx_dir: str = DEFAULT_ONNX_DIR) -> List[Dict[str, Any]]:
+    """Encode `texts` with each backend; report throughput and agreement with `reference`.
+
+    Agreement is the cosine between each text's two embeddings and the
+    overlap of its 10 nearest neighbours within `texts`, which stays
+    informative even when all embeddings point roughly the same way.
+    """
+    expected = None
+    reference_seconds = None
+    report = []
+    for backend in [reference] + [b for b in backends if b != reference]:
+        encoder = TextEncoder(model_name, backend, threads, max_seq_length, onnx_dir=onnx_dir)
+        encoder.encode(texts[:batch_size], batch_size=batch_size)  # warm up
+        started = time.perf_counter()
+        embeddings = encoder.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+        seconds = time.perf_counter() - started
+        if expected is None:
+            expected, reference_seconds = embeddings, seconds
+        cosine = np.sum(embeddings * expected, axis=1)
+        report.append({
+            "backend": backend,
+            "texts": len(texts),
+            "seconds": seconds,
+            "texts_per_second": len(texts) / seconds if seconds else float("inf"),
+            "speedup": reference_seconds / seconds if seconds else float("inf"),
+            "cosine_mean": float(cosine.mean()),
+            "cosine_min": float(cosine.min()),
+            "cosine_p1": float(np.percentile(cosine, 1)),
+            "neighbor_recall_at_10": neighbor_recall(expected, embeddings),
+        })
+    return report
+
+
+def sample_texts(count: int, seed: int = 0) -> List[str]:
+    """Catalog-like texts of varied length built from the synthetic generator's vocabulary."""
+    from utils.synthetic_generator import BASE_INGREDIENTS, EFFECTS
+
+    rng = np.random.default_rng(seed)
+    words = EFFECTS + BASE_INGREDIENTS
+    return [" ".join(rng.choice(words, int(rng.integers(1, 24)))) for _ in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare encoder backends for speed and cosine agreement.")
+    parser.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    parser.add_argument("--tiny", metavar="DIR", help="build and use a small random model in DIR (offline)")
+    parser.add_argument("--tiny-hidden-size", type=int, default=384)
+    parser.add_argument("--tiny-layers", type=int, default=6)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--max-seq-length", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--texts", help="file with one text per line (default: synthetic catalog texts)")
+    parser.add_argument("--count", type=int, default=512)
+    parser.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR)
+    args = parser.parse_args()
+
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()][:args.count]
+    else:
+        texts = sample_texts(args.count)
+    model = args.model
+    if args.tiny:
+        from utils.synthetic_generator import BASE_INGREDIENTS, EFFECTS
+        model = build_tiny_model(args.tiny, EFFECTS + BASE_INGREDIENTS, args.tiny_hidden_size, args.tiny_layers)
+
+    results = compare_backends(model, texts, args.backends.split(","), threads=args.threads,
+                               max_seq_length=args.max_seq_length, batch_size=args.batch_size,
+                               onnx_dir=args.onnx_dir)
+    for row in results:
+        print(f"{row['backend']:<11} {row['texts_per_second']:9.1f} texts/s  speedup={row['speedup']:.2f}x  "
+              f"cosine mean={row['cosine_mean']:.4f} min={row['cosine_min']:.4f} p1={row['cosine_p1']:.4f}  "
+              f"neighbors@10={row['neighbor_recall_at_10']:.3f}")
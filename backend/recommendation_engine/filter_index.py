@@ -0,0 +1,150 @@
+# filter_index.py
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.recommendation_engine.metadata import split_multi_value
+
+# Set bits per byte value, for counting matches without unpacking.
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+
+
+@dataclass(frozen=True)
+class ProductFilters:
+    """Metadata constraints: any of `types`, all of `effects` and `ingredients`, price within bounds."""
+    types: Tuple[str, ...] = ()
+    effects: Tuple[str, ...] = ()
+    ingredients: Tuple[str, ...] = ()
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+    @property
+    def empty(self) -> bool:
+        return not (self.types or self.effects or self.ingredients
+                    or self.min_price is not None or self.max_price is not None)
+
+    def scalar_where(self) -> Optional[Dict[str, Any]]:
+        """Chroma `where` clause for the single-valued constraints (type and price), if any."""
+        clauses: List[Dict[str, Any]] = []
+        if self.types:
+            clauses.append({"type": {"$in": list(self.types)}})
+        if self.min_price is not None:
+            clauses.append({"price": {"$gte": self.min_price}})
+        if self.max_price is not None:
+            clauses.append({"price": {"$lte": self.max_price}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class FilterIndex:
+    """Bitmap index over catalog positions for type, effects, ingredients and price.
+
+    Position i is the i-th entry of the retrieval backend's `all_metadata()`.
+    Each distinct (lowercased) type, effect and ingredient maps to a packed
+    bitmap of the products carrying it; prices are kept sorted so a range
+    resolves with two binary searches. A filter costs a handful of vectorized
+    AND/OR passes over n/8 bytes, whatever the catalog size.
+    """
+
+    def __init__(self, metadatas: Sequence[Dict[str, Any]]):
+        self.size = len(metadatas)
+        ids = []
+        prices = np.full(self.size, np.nan)
+        postings: Dict[str, Dict[str, List[int]]] = {"type": {}, "effects": {}, "ingredients": {}}
+        self.labels: Dict[str, Dict[str, str]] = {field: {} for field in postings}
+        for position, meta in enumerate(metadatas):
+            ids.append(meta.get("id", -1))
+            try:
+                prices[position] = float(meta.get("price"))
+            except (TypeError, ValueError):
+                pass
+            values = {
+                "type": [meta["type"]] if meta.get("type") else [],
+                "effects": split_multi_value(meta.get("effects")),
+                "ingredients": split_multi_value(meta.get("ingredients")),
+            }
+            for field, field_values in values.items():
+                for value in field_values:
+                    key = str(value).strip().lower()
+                    postings[field].setdefault(key, []).append(position)
+                    self.labels[field].setdefault(key, str(value))
+
+        self.ids = ids
+        self.positions = {self._id_key(product_id): position for position, product_id in enumerate(ids)}
+        self._bitmaps = {field: {value: self._pack(rows) for value, rows in values.items()}
+                         for field, values in postings.items()}
+        self._all = self._pack(range(self.size))
+        self._price_order = np.argsort(prices, kind="stable")
+        self._sorted_prices = prices[self._price_order]
+
+    @staticmethod
+    def _id_key(product_id: Any) -> str:
+        return str(product_id)
+
+    def __contains__(self, product_id: Any) -> bool:
+        return self._id_key(product_id) in self.positions
+
+    def _pack(self, rows: Iterable[int]) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[np.fromiter(rows, dtype=np.int64)] = True
+        return np.packbits(mask)
+
+    def _empty(self) -> np.ndarray:
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _field(self, field: str, values: Sequence[str], require_all: bool) -> np.ndarray:
+        bitmaps = self._bitmaps[field]
+        result = None
+        for value in values:
+            bitmap = bitmaps.get(value.strip().lower())
+            if bitmap is None:
+                if require_all:
+                    return self._empty()
+                continue
+            if result is None:
+                result = bitmap.copy()
+            elif require_all:
+                result &= bitmap
+            else:
+                result |= bitmap
+        return result if result is not None else self._empty()
+
+    def _price_range(self, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        start = 0 if low is None else np.searchsorted(self._sorted_prices, low, side="left")
+        stop = np.searchsorted(self._sorted_prices, np.inf if high is None else high, side="right")
+        return self._pack(self._price_order[start:stop])
+
+    def match(self, filters: ProductFilters) -> np.ndarray:
+        """Packed bitmap of the positions satisfying every constraint."""
+        result = self._all.copy()
+        if filters.types:
+            result &= self._field("type", filters.types, require_all=False)
+        if filters.effects and result.any():
+            result &= self._field("effects", filters.effects, require_all=True)
+        if filters.ingredients and result.any():
+            result &= self._field("ingredients", filters.ingredients, require_all=True)
+        if (filters.min_price is not None or filters.max_price is not None) and result.any():
+            result &= self._price_range(filters.min_price, filters.max_price)
+        return result
+
+    def stored_types(self, types: Sequence[str]) -> Tuple[str, ...]:
+        """Map requested types to their spelling in the collection, for `where` pushdown."""
+        labels = self.labels["type"]
+        return tuple(labels[key] for key in (t.strip().lower() for t in types) if key in labels)
+
+    @staticmethod
+    def count(bitmap: np.ndarray) -> int:
+        return int(_POPCOUNT[bitmap].sum())
+
+    def rows(self, bitmap: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.size))
+
+    def contains(self, bitmap: np.ndarray, product_id: Any) -> bool:
+        position = self.positions.get(self._id_key(product_id))
+        return position is not None and bool(bitmap[position >> 3] & (0x80 >> (position & 7)))
+
+    def facets(self) -> Dict[str, List[str]]:
+        """Original spelling of every filterable value, per field."""
+        return {field: sorted(labels.values()) for field, labels in self.labels.items()}
@@ -0,0 +1,86 @@
+# fragments.py
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import json
+
+from backend.recommendation_engine.ranking import ScoredProduct
+
+# Response fields in their default order: stored product fields, then per-request scores.
+PRODUCT_FIELDS = ("id", "name", "effects", "ingredients", "price", "description", "type")
+SCORE_FIELDS = ("sales_velocity", "similarity_score", "weighted_score", "fused_score")
+FIELDS = PRODUCT_FIELDS + SCORE_FIELDS
+_SNIPPET = len(PRODUCT_FIELDS)  # slot of the description snippet in a product's members
+
+
+def dumps(value: Any) -> bytes:
+    """JSON the way JSONResponse renders it, so fragments splice into identical bodies."""
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _number(value: Optional[float]) -> bytes:
+    # json.dumps writes finite floats as repr(); scores are always finite when present.
+    return b"null" if value is None else repr(float(value)).encode()
+
+
+def snippet(text: str, length: int) -> str:
+    """`text` cut to at most `length` characters at a word boundary, with an ellipsis if shortened."""
+    text = " ".join(str(text).split())
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(" ", 1)[0] or text[:length]
+    return cut.rstrip(" ,;:.") + "…"
+
+
+class ProductFragments:
+    """Pre-serialized JSON members (`"name":"..."`) for every product in the index.
+
+    Responses are assembled by joining a product's stored members with its
+    per-request scores, so serializing a result list is byte concatenation
+    rather than dict building and encoding. Each product also keeps a
+    description snippet of `snippet_length` characters.
+    """
+
+    def __init__(self, metadatas: Sequence[Dict[str, Any]], parse: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 snippet_length: int = 160):
+        self.parse = parse
+        self.snippet_length = snippet_length
+        self._members: Dict[str, Tuple[bytes, ...]] = {}
+        for meta in metadatas:
+            self._members[self._key(meta.get("id", -1))] = self._encode(meta)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    @staticmethod
+    def _key(product_id: Any) -> str:
+        return str(product_id)
+
+    def _encode(self, meta: Dict[str, Any]) -> Tuple[bytes, ...]:
+        product = self.parse(meta)
+        members = [b'"' + field.encode() + b'":' + dumps(product[field]) for field in PRODUCT_FIELDS]
+        members.append(b'"description":' + dumps(snippet(product["description"], self.snippet_length)))
+        return tuple(members)
+
+    def members(self, meta: Dict[str, Any]) -> Tuple[bytes, ...]:
+        """Stored members for a product, encoding on the spot if it is not in the index."""
+        members = self._members.get(self._key(meta.get("id", -1)))
+        return members if members is not None else self._encode(meta)
+
+    def render(self, products: Sequence[ScoredProduct], fields: Optional[Sequence[str]] = None,
+               use_snippet: bool = False) -> bytes:
+        """JSON array of products; `fields` selects and orders fields as /products does (unknown ones are skipped)."""
+        # (slot in the stored members, or score name with its member prefix)
+        layout: List[Tuple[int, str, bytes]] = []
+        for field in dict.fromkeys(fields or FIELDS):
+            if field in SCORE_FIELDS:
+                layout.append((-1, field, b'"' + field.encode() + b'":'))
+            elif field in PRODUCT_FIELDS:
+                slot = _SNIPPET if field == "description" and use_snippet else PRODUCT_FIELDS.index(field)
+                layout.append((slot, field, b""))
+
+        objects = []
+        for product in products:
+            members = self.members(product.metadata)
+            parts = [members[slot] if slot >= 0 else prefix + _number(getattr(product, field))
+                     for slot, field, prefix in layout]
+            objects.append(b"{" + b",".join(parts) + b"}")
+        return b"[" + b",".join(objects) + b"]"
@@ -0,0 +1,167 @@
+# lexical_index.py
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import re
+
+import numpy as np
+
+from backend.recommendation_engine.metadata import split_multi_value
+from backend.recommendation_engine.ranking import top_k
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and any are as at be best by for from get good help helps i in is it me my need of on or some "
+    "something that the to want what with".split()
+)
+# Term frequency multiplier per field (a light BM25F): names and attributes outweigh prose.
+FIELD_WEIGHTS = (("name", 3.0), ("type", 2.0), ("effects", 2.0), ("ingredients", 2.0), ("description", 1.0))
+MULTI_VALUE_FIELDS = ("effects", "ingredients")
+# Attribute values that count as the catalog's vocabulary.
+PHRASE_FIELDS = ("type", "effects", "ingredients")
+# Longer queries read as natural language, where BM25 alone misses intent.
+MAX_KEYWORD_TERMS = 2
+
+
+def tokenize(text: Any) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(str(text or "").lower()) if token not in STOPWORDS]
+
+
+def phrase_key(text: Any) -> str:
+    return " ".join(tokenize(text))
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over name, type, effects, ingredients and description.
+
+    Position i is the i-th entry of the metadata list it was built from (the
+    retrieval backend's `all_metadata()`, as for FilterIndex). Postings are
+    stored per term in descending weight order, so a one-word query is a
+    slice. Exact vocabulary phrases (a type, effect or ingredient) have their
+    ranking precomputed, with products carrying the attribute first.
+    """
+
+    def __init__(self, metadatas: Sequence[Dict[str, Any]], k1: float = 1.2, b: float = 0.75):
+        self.metadatas = metadatas
+        self.size = len(metadatas)
+        self.terms: Dict[str, int] = {}
+        term_column: List[int] = []
+        doc_column: List[int] = []
+        tf_column: List[float] = []
+        lengths = np.zeros(self.size, dtype=np.float32)
+        phrases: Dict[str, List[int]] = {}
+
+        for position, meta in enumerate(metadatas):
+            frequencies: Counter = Counter()
+            for field, weight in FIELD_WEIGHTS:
+                values = split_multi_value(meta.get(field)) if field in MULTI_VALUE_FIELDS else [meta.get(field)]
+                for value in values:
+                    tokens = tokenize(value)
+                    for token in tokens:
+                        frequencies[token] += weight
+                    if field in PHRASE_FIELDS and tokens:
+                        phrases.setdefault(" ".join(tokens), []).append(position)
+            lengths[position] = sum(frequencies.values())
+            for term, frequency in frequencies.items():
+                term_column.append(self.terms.setdefault(term, len(self.terms)))
+                doc_column.append(position)
+                tf_column.append(frequency)
+
+        terms = np.asarray(term_column, dtype=np.int64)
+        docs = np.asarray(doc_column, dtype=np.int32)
+        tf = np.asarray(tf_column, dtype=np.float32)
+        df = np.bincount(terms, minlength=len(self.terms))
+        idf = np.log1p((self.size - df + 0.5) / (df + 0.5)).astype(np.float32)
+        average_length = float(lengths.mean()) if self.size else 1.0
+        norm = k1 * (1.0 - b + b * lengths[docs] / max(average_length, 1e-9))
+        weights = idf[terms] * tf * (k1 + 1.0) / (tf + norm)
+
+        # Group postings by term, best first; lexsort is stable, so ties keep catalog order.
+        order = np.lexsort((-weights, terms))
+        self._docs = docs[order]
+        self._weights = weights[order].astype(np.float32)
+        self._offsets = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+        self._phrases = {key: self._rank_phrase(key, np.unique(np.asarray(rows, dtype=np.int32)))
+                         for key, rows in phrases.items()}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, stop = self._offsets[term_id], self._offsets[term_id + 1]
+        return self._docs[start:stop], self._weights[start:stop]
+
+    def _term_ids(self, query: str) -> Optional[List[int]]:
+        """Ids of the query's distinct terms, or None when any term is unknown."""
+        ids = [self.terms.get(token) for token in dict.fromkeys(tokenize(query))]
+        return None if None in ids else ids
+
+    def _score(self, term_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 over the union of the terms' postings, as (positions, scores) in position order."""
+        if len(term_ids) == 1:
+            docs, weights = self._postings(term_ids[0])
+            order = np.argsort(docs, kind="stable")
+            return docs[order], weights[order]
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term_id in term_ids:
+            docs, weights = self._postings(term_id)
+            scores[docs] += weights  # a term lists each product once
+        # BM25 weights are strictly positive, so the nonzero entries are exactly the matches.
+        docs = np.flatnonzero(scores)
+        return docs, scores[docs]
+
+    def _rank_phrase(self, key: str, carriers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        term_ids = [self.terms[token] for token in key.split()]
+        docs, scores = self._score(term_ids)
+        # Lift every product carrying the attribute above any that merely mention its words.
+        scores = scores + np.isin(docs, carriers).astype(np.float32) * (scores.max() if len(scores) else 0.0)
+        order = top_k(scores, len(scores))
+        return docs[order], scores[order]
+
+    def is_vocabulary(self, query: str) -> bool:
+        """Whether the query is exactly a type, effect or ingredient in the catalog."""
+        return phrase_key(query) in self._phrases
+
+    def is_keyword_query(self, query: str, min_matches: int) -> bool:
+        """Whether BM25 alone can answer the query: vocabulary, or a few known terms all matching `min_matches` products."""
+        return self.is_vocabulary(query) or self.match_count(query, MAX_KEYWORD_TERMS) >= min_matches
+
+    def match_count(self, query: str, max_terms: Optional[int] = None) -> int:
+        """Number of products containing every query term (0 if any term is unknown or there are too many)."""
+        term_ids = self._term_ids(query)
+        if not term_ids or (max_terms is not None and len(term_ids) > max_terms):
+            return 0
+        docs = self._postings(term_ids[0])[0]
+        for term_id in term_ids[1:]:
+            docs = np.intersect1d(docs, self._postings(term_id)[0], assume_unique=True)
+        return len(docs)
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, positions) by BM25, optionally restricted to positions where `allowed` is set."""
+        ranked = self._phrases.get(phrase_key(query))
+        if ranked is None:
+            term_ids = [self.terms[token] for token in dict.fromkeys(tokenize(query)) if token in self.terms]
+            if not term_ids:
+                return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int32)
+            if len(term_ids) == 1:
+                ranked = self._postings(term_ids[0])
+            else:
+                docs, scores = self._score(term_ids)
+                if allowed is not None:
+                    keep = allowed[docs]
+                    docs, scores = docs[keep], scores[keep]
+                order = top_k(scores, k)
+                return scores[order], docs[order]
+        docs, scores = ranked
+        if allowed is not None:
+            keep = allowed[docs]
+            docs, scores = docs[keep], scores[keep]
+        return scores[:k], docs[:k]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Any]], k: int = 60) -> List[Tuple[Any, float]]:
+    """Fuse ranked key lists by summing 1 / (k + rank); returns (key, score) best first."""
+    fused: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
@@ -0,0 +1,86 @@
+# materialized.py
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+
+from backend.recommendation_engine.filter_index import ProductFilters
+from backend.recommendation_engine.query_cache import normalize_query
+from backend.recommendation_engine.ranking import Candidates, ScoredProduct
+
+
+class MaterializedResults:
+    """Precomputed retrieval for a fixed set of head queries.
+
+    `refresh` retrieves candidates for the whole query set in one batch and
+    swaps in a new table tagged with the engine's index generation. Lookups
+    only return entries of the current generation, so a re-index invalidates
+    the table at once, before the recomputed one is ready; readers never see a
+    partial table. Only unfiltered queries at the materialized `top_n` are
+    served. Entries hold candidates, not rankings: each lookup reranks them
+    with the current sales signals, so live sales count as soon as they
+    arrive while encoding and search are still skipped.
+    """
+
+    def __init__(self, engine: Any, top_n: int = 10):
+        self.engine = engine
+        self.top_n = top_n
+        # (generation, normalized query -> candidates), replaced as a whole.
+        self._table: Tuple[int, Dict[str, Candidates]] = (-1, {})
+        self._refresh_lock = threading.Lock()
+        self.refreshed_at: Optional[float] = None
+        self.refresh_seconds = 0.0
+
+    def __len__(self) -> int:
+        generation, table = self._table
+        return len(table) if generation == self.engine.index_generation else 0
+
+    def get(self, query: str, top_n: int,
+            filters: Optional[ProductFilters] = None) -> Optional[List[ScoredProduct]]:
+        if top_n != self.top_n or (filters is not None and not filters.empty):
+            return None
+        generation, table = self._table
+        if generation != self.engine.index_generation:
+            return None
+        candidates = table.get(normalize_query(query))
+        if candidates is None:
+            return None
+        try:
+            return self.engine.rerank_batch([candidates], [top_n])[0]
+        except Exception as e:
+            print(f"Materialized rerank failed: {e}")
+            return None
+
+    def refresh(self, queries: Iterable[str]) -> int:
+        """Retrieve every query's candidates against the current index; returns the entries stored."""
+        with self._refresh_lock:
+            started = time.perf_counter()
+            generation = self.engine.index_generation
+            keys = list(dict.fromkeys(normalize_query(query) for query in queries if query and query.strip()))
+            try:
+                results = self.engine.retrieve_batch(keys, [self.top_n] * len(keys), [None] * len(keys))
+            except Exception as e:
+                print(f"Materialized retrieval failed: {e}")
+                return 0
+            # Keyword hits from before the model loaded are not worth keeping; nor are empty results.
+            table = {key: candidates for key, candidates in zip(keys, results)
+                     if candidates.metadatas and candidates.cosine}
+            if self.engine.index_generation != generation:
+                # Re-indexed while computing; the reindex listener will refresh again.
+                return 0
+            self._table = (generation, table)
+            self.refreshed_at = time.time()
+            self.refresh_seconds = time.perf_counter() - started
+            print(f"Materialized {len(table)} queries for index generation {generation} "
+                  f"in {self.refresh_seconds:.2f}s")
+            return len(table)
+
+    def stats(self) -> Dict[str, float]:
+        generation, table = self._table
+        return {
+            "entries": len(self),
+            "generation": generation,
+            "stale": int(generation != self.engine.index_generation),
+            "age_seconds": time.time() - self.refreshed_at if self.refreshed_at else -1.0,
+            "refresh_seconds": self.refresh_seconds,
+        }
+
@@ -0,0 +1,14 @@
+# metadata.py
+from typing import Any, List
+
+# Chroma metadata values must be scalars, so list fields are stored joined.
+MULTI_VALUE_SEPARATOR = "|||"
+
+
+def split_multi_value(value: Any) -> List[str]:
+    """Return a list field from metadata stored either as a list or a joined string."""
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    if isinstance(value, str) and value:
+        return [item for item in value.split(MULTI_VALUE_SEPARATOR) if item]
+    return []
@@ -0,0 +1,282 @@
+# metrics.py
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import glob
+import json
+import os
+import threading
+import time
+
+# Default bucket bounds, in seconds for latencies.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram with cumulative (Prometheus-style) snapshots."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = count
+        return {"buckets": cumulative, "count": count, "sum": total,
+                "mean": total / count if count else 0.0}
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _label_text(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    """Named histograms, counters and gauge callbacks rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, Counter]] = {}
+        self._gauges: Dict[str, Callable[[], Dict[Labels, float]]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str = "", buckets: Sequence[float] = LATENCY_BUCKETS,
+                  **labels: str) -> Histogram:
+        key = tuple(sorted(labels.items()))
+        series = self._histograms.get(name)
+        histogram = series.get(key) if series is not None else None
+        if histogram is None:
+            with self._lock:
+                series = self._histograms.setdefault(name, {})
+                histogram = series.get(key)
+                if histogram is None:
+                    histogram = series[key] = Histogram(buckets)
+                    self._help.setdefault(name, help_text)
+        return histogram
+
+    def register_histogram(self, name: str, histogram: Histogram, help_text: str = "", **labels: str) -> None:
+        """Expose a histogram owned by another component (e.g. the micro-batch encoder)."""
+        with self._lock:
+            self._histograms.setdefault(name, {})[tuple(sorted(labels.items()))] = histogram
+            self._help.setdefault(name, help_text)
+
+    def counter(self, name: str, help_text: str = "", **labels: str) -> Counter:
+        key = tuple(sorted(labels.items()))
+        series = self._counters.get(name)
+        counter = series.get(key) if series is not None else None
+        if counter is None:
+            with self._lock:
+                series = self._counters.setdefault(name, {})
+                counter = series.get(key)
+                if counter is None:
+                    counter = series[key] = Counter()
+                    self._help.setdefault(name, help_text)
+        return counter
+
+    def gauge(self, name: str, collect: Callable[[], Dict[Labels, float]], help_text: str = "") -> None:
+        """Register a callback returning current gauge values keyed by label tuples."""
+        with self._lock:
+            self._gauges[name] = collect
+            self._help.setdefault(name, help_text)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values of every series as plain data: {kind: {name: {labels: value}}} plus help texts.
+
+        Histogram values are their `Histogram.snapshot()`; gauge callbacks that fail are skipped.
+        """
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = dict(self._gauges)
+            help_texts = dict(self._help)
+        values: Dict[str, Any] = {
+            "histogram": {name: {labels: histogram.snapshot() for labels, histogram in series.items()}
+                          for name, series in histograms.items()},
+            "counter": {name: {labels: counter.value for labels, counter in series.items()}
+                        for name, series in counters.items()},
+            "gauge": {},
+            "help": help_texts,
+        }
+        for name, collect in gauges.items():
+            try:
+                values["gauge"][name] = dict(collect())
+            except Exception:
+                continue
+        return values
+
+    def render(self) -> str:
+        return render_snapshot(self.snapshot())
+
+
+def render_snapshot(snapshot: Dict[str, Any]) -> str:
+    """Prometheus text exposition of a `MetricsRegistry.snapshot()`."""
+    lines: List[str] = []
+    help_texts = snapshot["help"]
+
+    def header(name: str, kind: str) -> None:
+        if help_texts.get(name):
+            lines.append(f"# HELP {name} {help_texts[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for name, series in sorted(snapshot["histogram"].items()):
+        header(name, "histogram")
+        for labels, histogram in sorted(series.items()):
+            for bound, count in histogram["buckets"].items():
+                le = 'le="' + bound + '"'
+                lines.append(f"{name}_bucket{_label_text(labels, le)} {count}")
+            lines.append(f"{name}_sum{_label_text(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_label_text(labels)} {histogram['count']}")
+    for name, series in sorted(snapshot["counter"].items()):
+        header(name, "counter")
+        for labels, value in sorted(series.items()):
+            lines.append(f"{name}{_label_text(labels)} {value}")
+    for name, series in sorted(snapshot["gauge"].items()):
+        header(name, "gauge")
+        for labels, value in sorted(series.items()):
+            lines.append(f"{name}{_label_text(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _add_histograms(total: Optional[Dict[str, Any]], histogram: Dict[str, Any]) -> Dict[str, Any]:
+    if total is None:
+        return dict(histogram, buckets=dict(histogram["buckets"]))
+    if list(total["buckets"]) != list(histogram["buckets"]):
+        return total  # bucket bounds differ (mixed versions); keep the first layout
+    count = total["count"] + histogram["count"]
+    total_sum = total["sum"] + histogram["sum"]
+    return {"buckets": {bound: total["buckets"][bound] + value for bound, value in histogram["buckets"].items()},
+            "count": count, "sum": total_sum, "mean": total_sum / count if count else 0.0}
+
+
+def merge_snapshots(snapshots: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine per-process snapshots into one: every series labelled with its `worker`, plus
+    unlabelled totals for counters and histograms (gauges have no meaningful sum)."""
+    merged: Dict[str, Any] = {"histogram": {}, "counter": {}, "gauge": {}, "help": {}}
+    for worker, snapshot in sorted(snapshots.items()):
+        for name, text in snapshot["help"].items():
+            merged["help"].setdefault(name, text)
+        for kind in ("histogram", "counter", "gauge"):
+            for name, series in snapshot[kind].items():
+                target = merged[kind].setdefault(name, {})
+                for labels, value in series.items():
+                    target[tuple(sorted(labels + (("worker", worker),)))] = value
+                    if kind == "histogram":
+                        target[labels] = _add_histograms(target.get(labels), value)
+                    elif kind == "counter":
+                        target[labels] = target.get(labels, 0.0) + value
+    return merged
+
+
+class MetricsExporter(threading.Thread):
+    """Periodically writes a registry snapshot to `<directory>/<worker>.json` for cross-process `/metrics`.
+
+    Each server process (HTTP worker or encoder) runs one; `collect` merges the
+    files of live processes, so any worker can answer for all of them.
+    """
+
+    def __init__(self, registry: "MetricsRegistry", directory: str, worker: str, interval: float = 5.0):
+        super().__init__(name="metrics-exporter", daemon=True)
+        self.registry = registry
+        self.directory = directory
+        self.worker = worker
+        self.interval = interval
+        self.path = os.path.join(directory, f"{worker}.json")
+        self._stop_event = threading.Event()
+        # /metrics requests export too; writes to the shared temp file must not interleave.
+        self._export_lock = threading.Lock()
+
+    def export(self) -> None:
+        snapshot = self.registry.snapshot()
+        # JSON keys must be strings; label tuples travel as lists of pairs.
+        payload = {kind: {name: [[list(labels), value] for labels, value in series.items()]
+                          for name, series in snapshot[kind].items()}
+                   for kind in ("histogram", "counter", "gauge")}
+        payload["help"] = snapshot["help"]
+        os.makedirs(self.directory, exist_ok=True)
+        with self._export_lock:
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(self.path + ".tmp", self.path)
+
+    def run(self) -> None:
+        while True:
+            try:
+                self.export()
+            except Exception as e:
+                print(f"Metrics export failed: {e}")
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        with self._export_lock:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def collect(self) -> Dict[str, Any]:
+        """Fresh snapshot of this process merged with the last ones exported by the others."""
+        self.export()
+        return merge_snapshots(read_snapshots(self.directory, max_age=3 * self.interval))
+
+
+def read_snapshots(directory: str, max_age: float = 15.0) -> Dict[str, Dict[str, Any]]:
+    """Snapshots exported to `directory` within `max_age` seconds, keyed by worker name.
+
+    Files of processes that stopped exporting (crashed or killed) age out.
+    """
+    snapshots = {}
+    now = time.time()
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                continue
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            continue
+        snapshot = {kind: {name: {tuple(tuple(pair) for pair in labels): value for labels, value in series}
+                           for name, series in payload[kind].items()}
+                    for kind in ("histogram", "counter", "gauge")}
+        snapshot["help"] = payload["help"]
+        snapshots[os.path.basename(path)[:-len(".json")]] = snapshot
+    return snapshots
+
+
+# Process-wide registry served on /metrics.
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,213 @@
+# neighbors.py
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Dict, Optional, Sequence, Tuple
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from backend.recommendation_engine.compression import compact_top_k
+
+DEFAULT_NEIGHBORS_DIR = "rag/knowledge_base/neighbors"
+NEIGHBORS_FILE = "neighbors.npy"
+SCORES_FILE = "neighbor_scores.npy"
+IDS_FILE = "neighbor_ids.npy"
+META_FILE = "neighbors.json"
+NORMALIZED_FILE = "normalized.npy.tmp"
+
+
+def _unit_rows(embeddings: np.ndarray, directory: str, block_rows: int = 65536) -> np.ndarray:
+    """`embeddings` if its rows are already unit length, else a normalized copy written block by block."""
+    sample = np.asarray(embeddings[:1000], dtype=np.float32)
+    if not len(sample) or np.allclose(np.linalg.norm(sample, axis=1), 1.0, atol=1e-3):
+        return embeddings
+    normalized = np.lib.format.open_memmap(os.path.join(directory, NORMALIZED_FILE), mode="w+",
+                                           dtype=np.float32, shape=embeddings.shape)
+    for start in range(0, len(embeddings), block_rows):
+        block = np.asarray(embeddings[start:start + block_rows], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        normalized[start:start + block_rows] = block / np.where(norms > 0, norms, 1.0)
+    return normalized
+
+
+def _block_neighbors(matrix: np.ndarray, start: int, stop: int, k: int,
+                     column_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k neighbours of rows [start, stop), excluding each row itself, best first."""
+    queries = np.asarray(matrix[start:stop], dtype=np.float32)
+    scores, rows = compact_top_k(matrix, queries, k + 1, column_rows)
+    scores = np.where(rows == np.arange(start, stop)[:, np.newaxis], -np.inf, scores)
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    scores, rows = np.take_along_axis(scores, order, axis=1), np.take_along_axis(rows, order, axis=1)
+    rows = np.where(np.isfinite(scores), rows, -1)
+    if rows.shape[1] < k:
+        # Fewer than k other products in the catalog.
+        pad = k - rows.shape[1]
+        rows = np.pad(rows, ((0, 0), (0, pad)), constant_values=-1)
+        scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+    return rows.astype(np.int32), scores.astype(np.float16)
+
+
+def build_neighbor_table(embeddings: np.ndarray, product_ids: Sequence[Any], directory: str = DEFAULT_NEIGHBORS_DIR,
+                         k: int = 50, block_rows: int = 1024, column_rows: int = 16384,
+                         workers: Optional[int] = None, source: str = "") -> Dict[str, Any]:
+    """Compute every product's top-k cosine neighbours and write them as a NeighborTable.
+
+    Rows are processed `block_rows` at a time against the catalog
+    `column_rows` at a time, keeping a running top-k per row, so peak memory
+    is about `workers * block_rows * column_rows` floats whatever the catalog
+    size; no N x N matrix exists at any point. Blocks run on a thread pool
+    (BLAS releases the GIL), with BLAS itself single-threaded when
+    threadpoolctl is installed. The output is int32 neighbour positions and
+    float16 scores, written through memory maps and swapped in atomically.
+    """
+    if len(embeddings) != len(product_ids):
+        raise ValueError(f"{len(embeddings)} embeddings but {len(product_ids)} product ids")
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    n = len(embeddings)
+    workers = max(1, workers or os.cpu_count() or 1)
+    matrix = _unit_rows(embeddings, directory)
+    paths = {name: os.path.join(directory, name) for name in (NEIGHBORS_FILE, SCORES_FILE, IDS_FILE, META_FILE)}
+    neighbors = np.lib.format.open_memmap(paths[NEIGHBORS_FILE] + ".tmp", mode="w+", dtype=np.int32, shape=(n, k))
+    scores = np.lib.format.open_memmap(paths[SCORES_FILE] + ".tmp", mode="w+", dtype=np.float16, shape=(n, k))
+
+    def run(start: int) -> None:
+        stop = min(start + block_rows, n)
+        neighbors[start:stop], scores[start:stop] = _block_neighbors(matrix, start, stop, k, column_rows)
+
+    try:
+        from threadpoolctl import threadpool_limits
+        limits = threadpool_limits(1) if workers > 1 else nullcontext()
+    except ImportError:
+        limits = nullcontext()
+    with limits, ThreadPoolExecutor(max_workers=workers, thread_name_prefix="neighbors") as pool:
+        list(pool.map(run, range(0, n, block_rows)))
+    neighbors.flush()
+    scores.flush()
+    del neighbors, scores
+
+    ids = np.asarray([str(product_id) for product_id in product_ids])
+    with open(paths[IDS_FILE] + ".tmp", "wb") as f:
+        np.save(f, ids)
+    meta = {"count": n, "k": k, "dim": int(embeddings.shape[1]) if n else 0, "source": source,
+            "built_at": time.time(), "build_seconds": time.perf_counter() - started}
+    with open(paths[META_FILE] + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    for path in paths.values():
+        os.replace(path + ".tmp", path)
+    if matrix is not embeddings:
+        del matrix
+        os.remove(os.path.join(directory, NORMALIZED_FILE))
+    return meta
+
+
+class NeighborTable:
+    """Precomputed top-k neighbours per product, memory-mapped.
+
+    The table is stored by its own row order and carries its product ids;
+    `align` maps it onto the serving catalog's positions (all_metadata()
+    order), so it stays usable when the catalog is re-exported in another
+    order. Products absent from either side simply have no neighbours.
+    A lookup is two array reads.
+    """
+
+    def __init__(self, neighbors: np.ndarray, scores: np.ndarray, product_ids: np.ndarray, meta: Dict[str, Any]):
+        self.neighbors = neighbors
+        self.scores = scores
+        self.product_ids = product_ids
+        self.meta = meta
+        self._table_row: Optional[np.ndarray] = None  # catalog position -> table row
+        self._catalog_position: Optional[np.ndarray] = None  # table row -> catalog position
+        self.positions: Dict[str, int] = {}
+        self.catalog: Sequence[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.neighbors)
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_NEIGHBORS_DIR) -> "NeighborTable":
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(np.load(os.path.join(directory, NEIGHBORS_FILE), mmap_mode="r"),
+                   np.load(os.path.join(directory, SCORES_FILE), mmap_mode="r"),
+                   np.load(os.path.join(directory, IDS_FILE), mmap_mode="r"), meta)
+
+    def align(self, metadatas: Sequence[Dict[str, Any]]) -> "NeighborTable":
+        """Bind the table to the serving catalog (retrieval `all_metadata()` order)."""
+        positions = {str(meta.get("id", -1)): position for position, meta in enumerate(metadatas)}
+        catalog_position = np.fromiter((positions.get(product_id, -1) for product_id in self.product_ids.tolist()),
+                                       dtype=np.int64, count=len(self.product_ids))
+        table_row = np.full(len(metadatas), -1, dtype=np.int64)
+        known = catalog_position >= 0
+        table_row[catalog_position[known]] = np.flatnonzero(known)
+        self._catalog_position = np.append(catalog_position, -1)  # index -1 (padding) maps to -1
+        self._table_row = table_row
+        self.positions = positions
+        self.catalog = metadatas
+        return self
+
+    @property
+    def coverage(self) -> float:
+        """Fraction of catalog products that have a row in the table."""
+        if self._table_row is None or not len(self._table_row):
+            return 0.0
+        return float(np.mean(self._table_row >= 0))
+
+    def lookup(self, product_id: Any) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(catalog positions, cosine scores) of a product's neighbours, best first; None for unknown products."""
+        if self._table_row is None:
+            raise RuntimeError("NeighborTable.align must be called before lookup")
+        position = self.positions.get(str(product_id))
+        if position is None:
+            return None
+        row = self._table_row[position]
+        if row < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        mapped = self._catalog_position[self.neighbors[row]]
+        keep = mapped >= 0
+        return mapped[keep], np.asarray(self.scores[row], dtype=np.float32)[keep]
+
+
+if __name__ == '__main__':
+    from backend import config
+    from backend.recommendation_engine.retrieval import EMBEDDINGS_FILE, METADATA_ROWS
+    from utils.row_store import RowStore
+
+    parser = argparse.ArgumentParser(description="Precompute each product's nearest neighbours for /products/{id}/similar.")
+    parser.add_argument("--source", choices=("index", "embeddings"), default="index",
+                        help="the active mmap retrieval index (exported from Chroma if missing), "
+                             "or rag/embeddings.py output")
+    parser.add_argument("--index-dir", default=config.VECTOR_INDEX_DIR)
+    parser.add_argument("--embeddings", default="rag/knowledge_base/product_embeddings.npy")
+    parser.add_argument("--metadata", default="rag/knowledge_base/product_metadata.json")
+    parser.add_argument("--out", default=config.NEIGHBORS_DIR)
+    parser.add_argument("--k", type=int, default=config.NEIGHBORS_K)
+    parser.add_argument("--block-rows", type=int, default=1024)
+    parser.add_argument("--column-rows", type=int, default=16384)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if args.source == "index":
+        embeddings_path = os.path.join(args.index_dir, EMBEDDINGS_FILE)
+        if not os.path.exists(embeddings_path):
+            from backend.recommendation_engine.recommender import get_chroma_client
+            from backend.recommendation_engine.retrieval import export_collection
+
+            export_collection(get_chroma_client().get_collection("products"), args.index_dir)
+        metadatas = RowStore.open(os.path.join(args.index_dir, METADATA_ROWS))
+    else:
+        embeddings_path = args.embeddings
+        with open(args.metadata, encoding="utf-8") as f:
+            metadatas = json.load(f)
+    matrix = np.load(embeddings_path, mmap_mode="r")
+    meta = build_neighbor_table(matrix, [meta.get("id", -1) for meta in metadatas], args.out, args.k,
+                                args.block_rows, args.column_rows, args.workers, source=embeddings_path)
+    print(f"Neighbour table: {meta['count']} products x {meta['k']} neighbours "
+          f"in {meta['build_seconds']:.1f}s, saved to {args.out}")
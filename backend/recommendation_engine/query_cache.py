@@ -0,0 +1,136 @@
+# query_cache.py
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for exact cache lookups (unicode form, case and whitespace)."""
+    query = unicodedata.normalize("NFKC", query)
+    return _WHITESPACE.sub(" ", query).strip().lower()
+
+
+def _singularize(token: str) -> str:
+    """Strip common English plural endings from a single token."""
+    if len(token) <= 3:
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("sses", "shes", "ches", "xes")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def near_duplicate_key(query: str) -> str:
+    """Collapse punctuation and plural differences so near-identical queries share a key."""
+    text = _NON_WORD.sub(" ", normalize_query(query))
+    return " ".join(_singularize(token) for token in text.split())
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU+TTL cache of normalized query text to query embedding."""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600.0,
+                 near_duplicates: bool = True):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.near_duplicates = near_duplicates
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._aliases: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self.near_duplicates:
+            alias = near_duplicate_key(key)
+            if self._aliases.get(alias) == key:
+                del self._aliases[alias]
+
+    def _lookup(self, key: str, now: float) -> Optional[np.ndarray]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        embedding, expires_at = entry
+        if expires_at <= now:
+            self._drop(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return embedding
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a query, or None on a miss."""
+        if not self.max_entries:
+            return None
+        key = normalize_query(query)
+        now = time.monotonic()
+        with self._lock:
+            embedding = self._lookup(key, now)
+            if embedding is not None:
+                self.hits += 1
+                return embedding
+            if self.near_duplicates:
+                alias = self._aliases.get(near_duplicate_key(key))
+                if alias is not None:
+                    embedding = self._lookup(alias, now)
+                    if embedding is not None:
+                        self.near_hits += 1
+                        return embedding
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding: np.ndarray) -> None:
+        """Store an embedding, evicting the least recently used entries past capacity."""
+        if not self.max_entries:
+            return
+        key = normalize_query(query)
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (embedding, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            if self.near_duplicates:
+                self._aliases.setdefault(near_duplicate_key(key), key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached embedding; counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss/eviction counters and the current hit rate."""
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
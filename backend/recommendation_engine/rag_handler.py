@@ -1,26 +1,29 @@
 import os
 import json
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
-from tqdm import tqdm
+from backend import config
+from backend.recommendation_engine.encoders import load_encoder
+from backend.recommendation_engine.recommender import get_chroma_client
 
 # ChromaDB and embedding model setup
 MODEL_NAME = "BAAI/bge-large-en-v1.5"
 CHROMA_DB_DIR = "rag/knowledge_base/chroma_db"
 COLLECTION_NAME = "products"
 
-# Initialize embedding model
-print(f"Loading model '{MODEL_NAME}'...")
-model = SentenceTransformer(MODEL_NAME)
+_model = None
 
-# Load ChromaDB collection
+# Load the embedding model on first use rather than at import time
+def get_model():
+    global _model
+    if _model is None:
+        print(f"Loading model '{MODEL_NAME}'...")
+        _model = load_encoder(MODEL_NAME, **config.encoder_options())
+    return _model
+
+# Load ChromaDB collection through the process-wide client
 def get_chroma_collection():
     print("Connecting to ChromaDB collection...")
-    client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
-    collection = client.get_collection(name=COLLECTION_NAME)
-    return collection
+    return get_chroma_client(CHROMA_DB_DIR).get_collection(name=COLLECTION_NAME)
 
 # Perform a query on the ChromaDB collection
 def query_chroma_db(query: str, top_n: int = 5) -> list:
@@ -28,7 +31,7 @@ def query_chroma_db(query: str, top_n: int = 5) -> list:
 
     # Generate embedding for the query
     print("Generating embedding for the query...")
-    query_embedding = model.encode([query])
+    query_embedding = get_model().encode([query])
 
     print(f"Querying ChromaDB for the top {top_n} results...")
     results = collection.query(
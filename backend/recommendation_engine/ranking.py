@@ -0,0 +1,131 @@
+# ranking.py
+from dataclasses import dataclass
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+NORMALIZATIONS = ("max", "minmax", "none")
+
+
+@dataclass(frozen=True)
+class RankingConfig:
+    """Weights and normalization for the hybrid similarity/sales/price score."""
+    similarity_weight: float = 0.7
+    sales_weight: float = 0.3
+    price_weight: float = 0.0
+    normalization: str = "max"
+    candidate_multiplier: int = 2
+
+    def __post_init__(self):
+        if self.normalization not in NORMALIZATIONS:
+            raise ValueError(f"Unknown normalization '{self.normalization}', expected one of {NORMALIZATIONS}")
+
+
+class ScoredProduct(NamedTuple):
+    """A ranked candidate: its raw index metadata and the scores it was ranked by.
+
+    `similarity_score` is always the query/product cosine, or None for keyword
+    hits served while the model is still loading. `fused_score` is the
+    reciprocal rank fusion score that selected a hybrid-retrieval candidate.
+    """
+    metadata: Dict[str, Any]
+    sales_velocity: float
+    similarity_score: Optional[float]
+    weighted_score: float
+    fused_score: Optional[float] = None
+
+
+class Candidates(NamedTuple):
+    """One query's retrieved candidates, best first, before they are ranked.
+
+    `cosine` says whether `similarity` is the query/product cosine (False for
+    keyword hits served while the model loads); `fused` holds the reciprocal
+    rank fusion scores of hybrid candidates.
+    """
+    similarity: np.ndarray
+    metadatas: List[Dict[str, Any]]
+    fused: Optional[np.ndarray] = None
+    cosine: bool = True
+
+
+def normalize(values: np.ndarray, method: str = "max", axis: int = -1) -> np.ndarray:
+    """Scale scores into a comparable range along `axis` (per query row for 2-D input)."""
+    values = np.asarray(values, dtype=np.float32)
+    if method == "none" or values.size == 0:
+        return values
+    if method == "minmax":
+        low = values.min(axis=axis, keepdims=True)
+        span = values.max(axis=axis, keepdims=True) - low
+        return (values - low) / np.where(span > 0, span, 1.0)
+    peak = values.max(axis=axis, keepdims=True)
+    return values / np.where(peak > 0, peak, 1.0)
+
+
+def affordability(price: np.ndarray) -> np.ndarray:
+    """Inverse price, treating missing or non-positive prices as 1."""
+    price = np.asarray(price, dtype=np.float32)
+    return 1.0 / np.where(price > 0, price, 1.0)
+
+
+def score(similarity: np.ndarray, sales_velocity: np.ndarray, price: np.ndarray,
+          config: RankingConfig = RankingConfig()) -> np.ndarray:
+    """Weighted score over candidate arrays; 2-D inputs are scored per query row."""
+    method = config.normalization
+    total = config.similarity_weight * normalize(similarity, method)
+    if config.sales_weight:
+        total = total + config.sales_weight * normalize(sales_velocity, method)
+    if config.price_weight:
+        total = total + config.price_weight * normalize(affordability(price), method)
+    return total
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, ties broken by original position."""
+    scores = np.asarray(scores)
+    n = scores.shape[0]
+    k = min(max(int(k), 0), n)
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))[:k]
+    return candidates[order]
+
+
+def rank(similarity: np.ndarray, sales_velocity: np.ndarray, price: np.ndarray, k: int,
+         config: RankingConfig = RankingConfig()) -> Tuple[np.ndarray, np.ndarray]:
+    """Score candidates and return (top-k indices, their weighted scores)."""
+    weighted = score(similarity, sales_velocity, price, config)
+    indices = top_k(weighted, k)
+    return indices, weighted[indices]
+
+
+def rank_batch(similarity: np.ndarray, sales_velocity: np.ndarray, price: np.ndarray, valid: np.ndarray,
+               k: int, config: RankingConfig = RankingConfig()) -> Tuple[np.ndarray, np.ndarray]:
+    """Rank a (queries x candidates) matrix in one pass.
+
+    `valid` marks real candidates; padding cells should repeat a real value of
+    the same row so they do not shift normalization. Returns per-row top-k
+    (indices, weighted scores), ties broken by position as in `top_k`; padding
+    never ranks above a real candidate and scores -inf where a row runs short.
+    """
+    weighted = np.where(valid, score(similarity, sales_velocity, price, config), -np.inf)
+    rows, width = weighted.shape
+    k = min(max(int(k), 0), width)
+    if 0 < k < width:
+        # O(n) selection as in `top_k`: find each row's k-th score, keep everything above
+        # it plus the lowest-positioned ties, then sort only those k columns.
+        kth = np.take_along_axis(weighted, np.argpartition(-weighted, k - 1, axis=1)[:, k - 1:k], axis=1)
+        above = weighted > kth
+        ties = weighted == kth
+        needed = k - above.sum(axis=1, keepdims=True)
+        selected = above | (ties & (np.cumsum(ties, axis=1) <= needed))
+        candidates = np.nonzero(selected)[1].reshape(rows, k)
+    else:
+        candidates = np.broadcast_to(np.arange(k), (rows, k))
+    order = np.take_along_axis(candidates, np.argsort(
+        -np.take_along_axis(weighted, candidates, axis=1), axis=1, kind="stable"), axis=1)
+    return order, np.take_along_axis(weighted, order, axis=1)
@@ -1,17 +1,204 @@
 # recommender.py
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional, Sequence, Union
+from dataclasses import replace
 import chromadb
 from chromadb.api.models.Collection import Collection
-from sentence_transformers import SentenceTransformer
-import json
+import numpy as np
+import hashlib
+import logging
+import math
 import os
+import threading
+import time
+
+from backend.recommendation_engine.batching import MicroBatchEncoder
+from backend.recommendation_engine.encoder_service import RemoteEncoder
+from backend.recommendation_engine.encoders import TextEncoder, encoder_name, load_encoder
+from backend.recommendation_engine.filter_index import FilterIndex, ProductFilters
+from backend.recommendation_engine.fragments import ProductFragments
+from backend.recommendation_engine.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from backend.recommendation_engine.metadata import MULTI_VALUE_SEPARATOR, split_multi_value
+from backend.recommendation_engine.metrics import REGISTRY, SIZE_BUCKETS
+from backend.recommendation_engine.neighbors import DEFAULT_NEIGHBORS_DIR, NeighborTable
+from backend.recommendation_engine.query_cache import QueryEmbeddingCache
+from backend.recommendation_engine.ranking import Candidates, RankingConfig, ScoredProduct, rank, rank_batch
+from backend.recommendation_engine.retrieval import Hits, create_backend
+from backend.recommendation_engine.sales_signals import DecayedSalesCounters
+from backend.recommendation_engine.tracing import count, span
+from rag.embedding_store import EmbeddingStore
+from rag.ingest import iter_products
+from utils.sales_store import SalesStore
+
+
+def _to_float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+logger = logging.getLogger(__name__)
+
+RESULT_COUNTS = REGISTRY.histogram("recommendation_results", "Recommendations returned per query.", SIZE_BUCKETS)
+
+CHROMA_DB_DIR = "rag/knowledge_base/chroma_db"
+MODEL_NAME = 'BAAI/bge-large-en-v1.5'
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_chroma_client(path: str = CHROMA_DB_DIR):
+    """Return the process-wide Chroma client for `path`, opening it on first use."""
+    with _clients_lock:
+        client = _clients.get(path)
+        if client is None:
+            client = _clients[path] = chromadb.PersistentClient(path=path)
+        return client
+
 
 class RecommendationEngine:
-    def __init__(self, collection_name: str = "products"):
-        """Initialize the recommendation engine with a persistent ChromaDB client and SentenceTransformer model."""
-        self.client = chromadb.PersistentClient(path="rag/knowledge_base/chroma_db")
-        self.collection = self._get_or_create_collection(collection_name)
-        self.model = SentenceTransformer('BAAI/bge-large-en-v1.5')
+    def __init__(self, collection_name: str = "products", query_cache_size: int = 2048,
+                 query_cache_ttl: float = 3600.0, near_duplicate_queries: bool = True,
+                 encode_batch_size: int = 32, encode_batch_wait_ms: float = 2.0,
+                 ranking: RankingConfig = RankingConfig(), retrieval_backend: str = "chroma",
+                 retrieval_options: Optional[Dict[str, Any]] = None, prefilter_max_rows: int = 20000,
+                 prefilter_selectivity: float = 0.05, lexical_search: bool = True, rrf_k: int = 60,
+                 encoder_options: Optional[Dict[str, Any]] = None, snippet_length: int = 160,
+                 encoder_service: Optional[Dict[str, Any]] = None,
+                 neighbors_dir: str = DEFAULT_NEIGHBORS_DIR):
+        """Configure the engine; the Chroma client, retrieval index and model load lazily on first use."""
+        self.collection_name = collection_name
+        self.model_name = MODEL_NAME
+        self.encoder_options = encoder_options or {}
+        # RemoteEncoder options; when set, encoding is delegated to a shared encoder process.
+        self.encoder_service = encoder_service or {}
+        # Quantized encoders produce different vectors, so they get their own cache and content hashes.
+        self.encoder_name = encoder_name(self.model_name, self.encoder_options.get("backend", "torch"))
+        self.retrieval_backend = retrieval_backend
+        self.retrieval_options = retrieval_options or {}
+        self.encode_batch_size = encode_batch_size
+        self.encode_batch_wait_ms = encode_batch_wait_ms
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=query_cache_size,
+            ttl_seconds=query_cache_ttl,
+            near_duplicates=near_duplicate_queries
+        )
+        self.ranking = ranking
+        # Filters matching at most this many products (or this fraction of the
+        # catalog) are scored exactly over their matches instead of post-filtered.
+        self.prefilter_max_rows = prefilter_max_rows
+        self.prefilter_selectivity = prefilter_selectivity
+        # Keyword queries are answered from the BM25 index; the rest fuse it with dense hits.
+        self.lexical_search = lexical_search
+        self.rrf_k = rrf_k
+        self.snippet_length = snippet_length
+        # Precomputed "similar products" table (neighbors.py), loaded on first use.
+        self.neighbors_dir = neighbors_dir
+        self._velocity_signal = None
+        self.sales_counters: Optional[DecayedSalesCounters] = None
+        self._reindex_listeners: List[Callable[[], None]] = []
+        # Bumped after every re-index; results derived from the index are tagged with it.
+        self.index_generation = 0
+        self._collection = None
+        self._retriever = None
+        self._model = None
+        self._query_encoder = None
+        self._filter_index = None
+        self._lexical_index = None
+        self._fragments = None
+        self._neighbors = None
+        # One lock per component so a slow model load does not block opening the index.
+        self._init_locks = {attr: threading.Lock()
+                            for attr in ("_collection", "_retriever", "_model", "_query_encoder", "_filter_index",
+                                         "_lexical_index", "_fragments", "_neighbors")}
+        self.load_timings: Dict[str, float] = {}
+
+    def _lazy(self, attr: str, factory: Callable[[], Any]) -> Any:
+        value = getattr(self, attr)
+        if value is None:
+            name = attr.lstrip("_")
+            loaded = False
+            with self._init_locks[attr]:
+                value = getattr(self, attr)
+                if value is None:
+                    # A request that triggers the load sees it as a "load.<name>" stage in its trace.
+                    with span(f"load.{name}"):
+                        started = time.perf_counter()
+                        value = factory()
+                        setattr(self, attr, value)
+                        self.load_timings[name] = time.perf_counter() - started
+                    loaded = True
+            if loaded:
+                logger.info(f"Loaded {name} in {self.load_timings[name]:.2f}s")
+        return value
+
+    @property
+    def client(self):
+        return get_chroma_client(CHROMA_DB_DIR)
+
+    @property
+    def collection(self) -> Collection:
+        return self._lazy("_collection", lambda: self._get_or_create_collection(self.collection_name))
+
+    @property
+    def retriever(self):
+        # Only the Chroma backend needs a client open to serve; mmap opens one for re-indexing.
+        return self._lazy("_retriever", lambda: create_backend(
+            self.retrieval_backend, self.collection if self.retrieval_backend == "chroma" else None,
+            **self.retrieval_options))
+
+    @property
+    def model(self) -> Union[TextEncoder, RemoteEncoder]:
+        if self.encoder_service:
+            return self._lazy("_model", lambda: RemoteEncoder(**self.encoder_service))
+        return self._lazy("_model", lambda: load_encoder(self.model_name, **self.encoder_options))
+
+    @property
+    def query_encoder(self) -> MicroBatchEncoder:
+        return self._lazy("_query_encoder", lambda: MicroBatchEncoder(
+            self.model,
+            max_batch_size=self.encode_batch_size,
+            max_wait_ms=self.encode_batch_wait_ms
+        ))
+
+    @property
+    def filter_index(self) -> FilterIndex:
+        return self._lazy("_filter_index", lambda: FilterIndex(self.retriever.all_metadata()))
+
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        return self._lazy("_lexical_index", lambda: LexicalIndex(self.retriever.all_metadata()))
+
+    @property
+    def fragments(self) -> ProductFragments:
+        return self._lazy("_fragments", lambda: ProductFragments(
+            self.retriever.all_metadata(), self._parse_metadata, self.snippet_length))
+
+    @property
+    def neighbors(self) -> NeighborTable:
+        """The neighbour table aligned to the current catalog; FileNotFoundError until it is built."""
+        return self._lazy("_neighbors", lambda: NeighborTable.load(self.neighbors_dir).align(
+            self.retriever.all_metadata()))
+
+    @property
+    def lexical_ready(self) -> bool:
+        """True once keyword queries can be served, even before the model has loaded."""
+        return self.lexical_search and self._lexical_index is not None
+
+    @property
+    def model_ready(self) -> bool:
+        """True once the query encoder is loaded, i.e. encoding will not block on model loading."""
+        return self._query_encoder is not None
+
+    def warm_up(self) -> Dict[str, float]:
+        """Open the collection and retrieval index, load the model and run a dummy encode."""
+        self.retriever
+        self.query_encoder
+        started = time.perf_counter()
+        self.query_encoder.encode(["warm up"])
+        self.load_timings["warmup_encode"] = time.perf_counter() - started
+        return dict(self.load_timings)
 
     def _get_or_create_collection(self, name: str) -> Collection:
         """Retrieve or create a ChromaDB collection with cosine similarity metric."""
@@ -26,76 +213,449 @@ class RecommendationEngine:
         return {
             "id": raw_meta.get("id", -1),
             "name": raw_meta.get("name", "Unknown Product"),
-            "effects": raw_meta.get("effects", []),
-            "ingredients": raw_meta.get("ingredients", []),
-            "price": raw_meta.get("price", 0.0),
+            "effects": split_multi_value(raw_meta.get("effects")),
+            "ingredients": split_multi_value(raw_meta.get("ingredients")),
+            "price": _to_float(raw_meta.get("price", 0.0), 1.0),
             "description": raw_meta.get("description", "No description available."),
             "type": raw_meta.get("type", "Unknown Type"),
-            "sales_velocity": raw_meta.get("sales_velocity", 0.0),
+            "sales_velocity": _to_float(raw_meta.get("sales_velocity", 0.0)),
             "similarity_score": 0.0,
             "weighted_score": 0.0
         }
 
-    def _calculate_weighted_score(self, recommendations: List[Dict[str, Any]]) -> None:
-        """Calculate weighted scores combining normalized similarity and sales velocity."""
-        if not recommendations:
-            return
+    def set_sales_store(self, store: SalesStore, window: int = 30) -> None:
+        """Rank with sales velocity computed from the columnar sales store rather than indexed metadata."""
+        self._velocity_signal = (store, store.velocity(window))
+
+    def set_sales_counters(self, counters: Optional[DecayedSalesCounters]) -> None:
+        """Add live decayed sales (units/day since the counters started) to the windowed baseline."""
+        self.sales_counters = counters
+
+    def _sales_velocity(self, metadatas: List[Dict[str, Any]]) -> np.ndarray:
+        """Per-candidate sales velocity: a baseline plus the live decayed rate.
+
+        The baseline is the sales store's velocity over its window, or the
+        indexed metadata for products the store does not know. Live counters
+        only hold sales events received since, so they add to the baseline.
+        """
+        velocity = np.fromiter((_to_float(m.get("sales_velocity")) for m in metadatas), np.float64, len(metadatas))
+        product_ids = [m.get("id") for m in metadatas]
+        signal = self._velocity_signal
+        if signal is not None:
+            store, store_velocity = signal
+            historical = store.lookup(store_velocity, product_ids)
+            velocity = np.where(np.isnan(historical), velocity, historical)
+        counters = self.sales_counters
+        if counters is not None:
+            live = counters.rates(product_ids)
+            velocity = velocity + np.nan_to_num(live)
+        return velocity
+
+    def on_reindex(self, listener: Callable[[], None]) -> None:
+        """Register a callback invoked after the collection has been re-indexed."""
+        self._reindex_listeners.append(listener)
+
+    def _notify_reindex(self) -> None:
+        for listener in self._reindex_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Reindex listener failed: {e}")
+
+    def _reindexed(self) -> None:
+        """Drop every index derived from the catalog, bump the generation and tell listeners."""
+        self._filter_index = None
+        self._lexical_index = None
+        self._fragments = None
+        self._neighbors = None
+        self.index_generation += 1
+        self._notify_reindex()
+
+    def reload_index(self) -> None:
+        """Pick up a re-index done by another process: reopen the retrieval index and drop derived ones."""
+        self.retriever.reload()
+        self._reindexed()
+
+    def get_catalog_metadata(self) -> List[Dict[str, Any]]:
+        """Return the raw metadata of every indexed product, without documents or embeddings."""
+        try:
+            return self.retriever.all_metadata()
+        except Exception as e:
+            print(f"Catalog metadata error: {e}")
+            return []
+
+    def _encode_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """Encode many queries at once: cache hits are reused and all misses go to the model together."""
+        embeddings: List[Optional[np.ndarray]] = []
+        misses: Dict[str, List[int]] = {}
+        with span("cache_lookup"):
+            for position, query in enumerate(queries):
+                embedding = self.query_cache.get(query)
+                embeddings.append(embedding)
+                if embedding is None:
+                    misses.setdefault(query, []).append(position)
+        hits = len(queries) - sum(len(positions) for positions in misses.values())
+        if hits:
+            count("query_cache_requests_total", hits, help_text="Query embedding cache lookups.", result="hit")
+        if misses:
+            count("query_cache_requests_total", len(queries) - hits,
+                  help_text="Query embedding cache lookups.", result="miss")
+            texts = list(misses)
+            with span("encode"):
+                encoded = self.query_encoder.encode(texts)
+            for text, embedding in zip(texts, encoded):
+                self.query_cache.put(text, embedding)
+                for position in misses[text]:
+                    embeddings[position] = embedding
+        return np.stack(embeddings).astype(np.float32, copy=False)
+
+    def _filtered_search(self, query_embeddings: np.ndarray, k: int, filters: ProductFilters) -> List[Hits]:
+        """Top-k hits per query among products matching `filters`, choosing the strategy by selectivity.
+
+        Selective filters are resolved to their matching rows first and only
+        those are scored (pushed down to Chroma as an id `where` clause).
+        Broad filters run the normal vector search, oversampled by the inverse
+        selectivity and with type/price pushed down where supported, and keep
+        the hits that pass the bitmap; queries left with too few survivors
+        fall back to the prefiltered path.
+        """
+        index = self.filter_index
+        n_queries = len(query_embeddings)
+        with span("filter"):
+            bitmap = index.match(filters)
+            matches = index.count(bitmap)
+        if matches == 0:
+            count("filter_strategy_total", n_queries, help_text="Filtered searches by strategy.", strategy="empty")
+            return [(np.empty(0, dtype=np.float32), []) for _ in range(n_queries)]
+
+        results: List[Optional[Hits]] = [None] * n_queries
+        selectivity = matches / index.size
+        if matches > self.prefilter_max_rows and selectivity > self.prefilter_selectivity:
+            oversampled = min(index.size, math.ceil(1.5 * k / selectivity))
+            where = replace(filters, types=index.stored_types(filters.types)).scalar_where()
+            with span("search"):
+                found = self.retriever.search(query_embeddings, oversampled, where=where)
+            for position, (similarity, metadatas) in enumerate(found):
+                keep = [i for i, meta in enumerate(metadatas) if index.contains(bitmap, meta.get("id"))][:k]
+                if len(keep) >= min(k, matches):
+                    results[position] = similarity[keep], [metadatas[i] for i in keep]
+            postfiltered = sum(result is not None for result in results)
+            if postfiltered:
+                count("filter_strategy_total", postfiltered,
+                      help_text="Filtered searches by strategy.", strategy="postfilter")
+
+        pending = [position for position, result in enumerate(results) if result is None]
+        if pending:
+            count("filter_strategy_total", len(pending), help_text="Filtered searches by strategy.", strategy="prefilter")
+            rows = index.rows(bitmap)
+            with span("search"):
+                found = self.retriever.search_subset(query_embeddings[pending], k, rows,
+                                                     [index.ids[row] for row in rows.tolist()])
+            for position, hits in zip(pending, found):
+                results[position] = hits
+        return results
+
+    def _search_batch(self, query_embeddings: np.ndarray, n_candidates: List[int],
+                      filters: List[Optional[ProductFilters]]) -> List[Hits]:
+        """Candidates per query: one search for all unfiltered queries, one per distinct filter set."""
+        groups: Dict[Optional[ProductFilters], List[int]] = {}
+        for position, query_filters in enumerate(filters):
+            key = None if query_filters is None or query_filters.empty else query_filters
+            groups.setdefault(key, []).append(position)
+
+        results: List[Optional[Hits]] = [None] * len(n_candidates)
+        for group_filters, positions in groups.items():
+            k = max(n_candidates[position] for position in positions)
+            if group_filters is None:
+                with span("search"):
+                    found = self.retriever.search(query_embeddings[positions], k)
+            else:
+                found = self._filtered_search(query_embeddings[positions], k, group_filters)
+            # Hits come back best-first, so trimming to each query's own depth
+            # gives the same candidates as a search of that depth.
+            for position, (similarity, metadatas) in zip(positions, found):
+                depth = n_candidates[position]
+                results[position] = similarity[:depth], metadatas[:depth]
+        return results
+
+    def _route(self, query: str, n_candidates: int) -> str:
+        """Pick 'lexical', 'hybrid' or 'dense' retrieval for a query.
+
+        Exact vocabulary (a type, effect or ingredient) and short queries whose
+        every term matches at least `n_candidates` products take their
+        candidates from BM25 alone, skipping the vector search; while the model
+        is still loading everything does.
+        """
+        if not self.lexical_search:
+            return "dense"
+        if not self.model_ready:
+            return "lexical" if self._lexical_index is not None else "dense"
+        index = self.lexical_index
+        if index.is_keyword_query(query, n_candidates):
+            return "lexical"
+        return "hybrid"
+
+    def _lexical_search(self, query: str, k: int, filters: Optional[ProductFilters]) -> Hits:
+        """BM25 hits with scores scaled to [0, 1], restricted to products matching `filters`."""
+        index = self.lexical_index
+        allowed = None
+        if filters is not None and not filters.empty:
+            filter_index = self.filter_index
+            allowed = np.unpackbits(filter_index.match(filters), count=filter_index.size).astype(bool)
+        scores, positions = index.search(query, k, allowed)
+        if len(scores):
+            scores = scores / scores[0]
+        return scores, [index.metadatas[position] for position in positions.tolist()]
+
+    def _fuse(self, dense: Hits, lexical: Hits, k: int) -> Hits:
+        """Hybrid candidates: reciprocal rank fusion of dense and lexical hits, as (fused scores, metadata).
+
+        The fused score only picks the candidates; they are ranked on their
+        dense cosine (see `_cosine`) like every other route.
+        """
+        by_id: Dict[str, Dict[str, Any]] = {}
+        rankings = []
+        for _, metadatas in (dense, lexical):
+            keys = []
+            for meta in metadatas:
+                key = str(meta.get("id"))
+                by_id.setdefault(key, meta)
+                keys.append(key)
+            rankings.append(keys)
+        fused = reciprocal_rank_fusion(rankings, self.rrf_k)[:k]
+        return (np.array([score for _, score in fused], dtype=np.float32),
+                [by_id[key] for key, _ in fused])
+
+    def _cosine(self, query_embedding: np.ndarray, metadatas: List[Dict[str, Any]],
+                dense: Optional[Hits] = None) -> Hits:
+        """Cosine similarity of the query to each candidate, in candidate order.
+
+        Scores already in the `dense` hits are reused; the remaining candidates
+        are scored with one exact search restricted to them.
+        """
+        known = {} if dense is None else {str(meta.get("id")): score
+                                           for score, meta in zip(dense[0].tolist(), dense[1])}
+        index = self.filter_index
+        rows = [index.positions[key] for key in dict.fromkeys(str(meta.get("id")) for meta in metadatas)
+                if key not in known and key in index.positions]
+        if rows:
+            rows = np.asarray(rows, dtype=np.int64)
+            with span("search"):
+                (scores, found), = self.retriever.search_subset(query_embedding[np.newaxis], len(rows), rows,
+                                                                [index.ids[row] for row in rows.tolist()])
+            known.update(zip((str(meta.get("id")) for meta in found), scores.tolist()))
+        return (np.array([known.get(str(meta.get("id")), 0.0) for meta in metadatas], dtype=np.float32),
+                list(metadatas))
+
+    def get_recommendations(self, query: str, top_n: int = 10,
+                            filters: Optional[ProductFilters] = None) -> List[Dict[str, Any]]:
+        """Retrieve top-N recommendations based on query, ranked by similarity and sales.
+
+        With `filters`, only products matching every constraint are returned.
+        """
+        return self.get_recommendations_batch([query], [top_n], [filters])[0]
+
+    def get_recommendations_batch(self, queries: Sequence[str], top_n: Union[int, Sequence[int]] = 10,
+                                  filters: Optional[Sequence[Optional[ProductFilters]]] = None
+                                  ) -> List[List[Dict[str, Any]]]:
+        """Recommendations for many queries with one encode, one search per filter set and one ranking pass.
 
-        max_similarity = max(p["similarity_score"] for p in recommendations) or 1
-        max_sales = max(p["sales_velocity"] for p in recommendations) or 1
+        `top_n` and `filters` are either shared or given per query. The result
+        for each query matches what `get_recommendations` returns for it alone.
+        Keyword queries take their candidates from the lexical index instead of
+        the vector search (see `_route`); every route ranks on cosine.
+        """
+        ranked = self.rank_products_batch(queries, top_n, filters)
+        # Only the final top-k are turned into dicts.
+        with span("parse_metadata"):
+            return [[self.product_dict(product) for product in products] for products in ranked]
 
-        for product in recommendations:
-            similarity_norm = product["similarity_score"] / max_similarity
-            sales_norm = product["sales_velocity"] / max_sales
-            product["weighted_score"] = (0.7 * similarity_norm) + (0.3 * sales_norm)
+    def product_dict(self, product: ScoredProduct) -> Dict[str, Any]:
+        """The API representation of a ranked product."""
+        result = self._parse_metadata(product.metadata)
+        result["sales_velocity"] = product.sales_velocity
+        result["similarity_score"] = product.similarity_score
+        result["weighted_score"] = product.weighted_score
+        result["fused_score"] = product.fused_score
+        return result
+
+    def rank_products_batch(self, queries: Sequence[str], top_n: Union[int, Sequence[int]] = 10,
+                            filters: Optional[Sequence[Optional[ProductFilters]]] = None
+                            ) -> List[List[ScoredProduct]]:
+        """Ranked products per query, as raw metadata plus scores; see `get_recommendations_batch`."""
+        n_queries = len(queries)
+        top_ns = [top_n] * n_queries if isinstance(top_n, int) else [int(n) for n in top_n]
+        filters = [None] * n_queries if filters is None else list(filters)
+        if len(top_ns) != n_queries or len(filters) != n_queries:
+            raise ValueError("top_n and filters must have one entry per query")
+        if n_queries == 0:
+            return []
 
-    def get_recommendations(self, query: str, top_n: int = 10) -> List[Dict[str, Any]]:
-        """Retrieve top-N recommendations based on query, ranked by similarity and sales."""
         try:
-            query_embedding = self.model.encode([query], normalize_embeddings=True).tolist()
-            
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=top_n,
-                include=["metadatas", "distances"]
-            )
-
-            recommendations = []
-            for meta, distance in zip(results["metadatas"][0], results["distances"][0]):
-                product = self._parse_metadata(meta)
-                product["similarity_score"] = 1 - distance  # Cosine similarity (-1 to 1)
-                recommendations.append(product)
-
-            self._calculate_weighted_score(recommendations)
-            return sorted(recommendations, key=lambda x: x["weighted_score"], reverse=True)
+            results = self.rerank_batch(self.retrieve_batch(queries, top_ns, filters), top_ns)
+            for products in results:
+                RESULT_COUNTS.observe(len(products))
+            return results
 
         except Exception as e:
+            count("recommendation_errors_total", help_text="Failed recommendation queries.", error=type(e).__name__)
             print(f"Recommendation error: {e}")
+            return [[] for _ in range(n_queries)]
+
+    def retrieve_batch(self, queries: Sequence[str], top_ns: Sequence[int],
+                       filters: Sequence[Optional[ProductFilters]]) -> List[Candidates]:
+        """Candidates per query, before ranking: routed retrieval, fusion and cosine scoring."""
+        n_queries = len(queries)
+        n_candidates = [max(n, n * self.ranking.candidate_multiplier) for n in top_ns]
+        routes = [self._route(query, k) for query, k in zip(queries, n_candidates)]
+        hits: List[Optional[Hits]] = [None] * n_queries
+        lexical_hits: Dict[int, Hits] = {}
+
+        lexical = [position for position, route in enumerate(routes) if route != "dense"]
+        if lexical:
+            with span("lexical"):
+                for position in lexical:
+                    lexical_hits[position] = self._lexical_search(
+                        queries[position], n_candidates[position], filters[position])
+                    # Filters can leave a keyword query short; let dense retrieval fill it.
+                    if (routes[position] == "lexical" and self.model_ready
+                            and len(lexical_hits[position][1]) < top_ns[position]):
+                        routes[position] = "hybrid"
+        for route in routes:
+            count("query_route_total", help_text="Queries by retrieval route.", route=route)
+
+        # Keyword queries still get the query encoded (usually a cache hit)
+        # so their BM25 candidates are ranked on cosine; only while the model
+        # loads does the scaled BM25 score stand in for similarity.
+        dense = [position for position, route in enumerate(routes) if route != "lexical"]
+        keyword = [position for position, route in enumerate(routes) if route == "lexical" and self.model_ready]
+        embedded: Dict[int, np.ndarray] = {}
+        if dense or keyword:
+            query_embeddings = self._encode_queries([queries[position] for position in dense + keyword])
+            embedded = dict(zip(dense + keyword, query_embeddings))
+        if dense:
+            found = self._search_batch(query_embeddings[:len(dense)],
+                                       [n_candidates[position] for position in dense],
+                                       [filters[position] for position in dense])
+            for position, dense_hits in zip(dense, found):
+                hits[position] = dense_hits
+        fused: Dict[int, np.ndarray] = {}
+        for position, keyword_hits in lexical_hits.items():
+            if position not in embedded:
+                hits[position] = keyword_hits
+            elif routes[position] == "lexical":
+                hits[position] = self._cosine(embedded[position], keyword_hits[1])
+            else:
+                fused[position], candidates = self._fuse(hits[position], keyword_hits, n_candidates[position])
+                hits[position] = self._cosine(embedded[position], candidates, hits[position])
+        return [Candidates(hits[position][0], hits[position][1], fused.get(position), position in embedded)
+                for position in range(n_queries)]
+
+    def rerank_batch(self, candidates: Sequence[Candidates], top_ns: Sequence[int]) -> List[List[ScoredProduct]]:
+        """Rank each query's candidates on similarity and the current sales and price signals."""
+        n_queries = len(candidates)
+        results: List[List[ScoredProduct]] = [[] for _ in range(n_queries)]
+        with span("rerank"):
+            # Flatten every candidate once, then scatter into a padded
+            # (queries x candidates) matrix. Padding repeats each row's
+            # first candidate so normalization is unaffected.
+            lengths = np.array([len(query.metadatas) for query in candidates], dtype=np.intp)
+            width = int(lengths.max()) if n_queries else 0
+            if width == 0:
+                return results
+            flat = [meta for query in candidates for meta in query.metadatas]
+            price = np.fromiter((_to_float(m.get("price"), 1.0) for m in flat), np.float32, len(flat))
+            velocity = self._sales_velocity(flat)
+            similarity = np.concatenate([np.asarray(query.similarity, dtype=np.float32) for query in candidates])
+
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            columns = np.arange(width)
+            valid = columns[np.newaxis, :] < lengths[:, np.newaxis]
+            source = offsets[:, np.newaxis] + np.where(valid, columns[np.newaxis, :], 0)
+            source = np.where(lengths[:, np.newaxis] > 0, source, 0)
+            indices, scores = rank_batch(similarity[source], velocity[source], price[source],
+                                         valid, max(top_ns), self.ranking)
+
+            for position, query in enumerate(candidates):
+                limit = min(top_ns[position], int(lengths[position]))
+                columns = indices[position, :limit]
+                items = (int(offsets[position]) + columns).tolist()
+                cosine = similarity[items].tolist() if query.cosine else [None] * limit
+                fused_scores = query.fused[columns].tolist() if query.fused is not None else [None] * limit
+                results[position] = [
+                    ScoredProduct(flat[item], float(velocity[item]), item_cosine, weighted_score, fused_score)
+                    for item, item_cosine, weighted_score, fused_score
+                    in zip(items, cosine, scores[position, :limit].tolist(), fused_scores)
+                ]
+        return results
+
+    def similar_products(self, product_id: Any, top_n: int = 10,
+                         sales_weight: float = 0.0) -> Optional[List[ScoredProduct]]:
+        """Products most similar to `product_id`, from the neighbour table; None if the product is unknown.
+
+        No model or index search is involved. With `sales_weight` > 0 the
+        neighbours are re-ranked by a blend of similarity and sales velocity.
+        """
+        table = self.neighbors
+        with span("neighbors"):
+            found = table.lookup(product_id)
+        if found is None:
+            return None
+        positions, similarity = found
+        metadatas = [table.catalog[position] for position in positions.tolist()]
+        if not metadatas:
+            RESULT_COUNTS.observe(0)
             return []
+        with span("rerank"):
+            velocity = self._sales_velocity(metadatas)
+            config = replace(self.ranking, similarity_weight=1.0 - sales_weight, sales_weight=sales_weight,
+                             price_weight=0.0)
+            indices, scores = rank(similarity, velocity, np.zeros(len(metadatas), dtype=np.float32), top_n, config)
+        RESULT_COUNTS.observe(len(indices))
+        return [ScoredProduct(metadatas[index], float(velocity[index]), float(similarity[index]), weighted_score)
+                for index, weighted_score in zip(indices.tolist(), scores.tolist())]
+
+    def _content_hash(self, doc_text: str) -> str:
+        """Hash of everything that determines a product's embedding."""
+        return hashlib.sha256(f"{self.encoder_name}\n{doc_text}".encode("utf-8")).hexdigest()
+
+    def _indexed_metadata(self, page_size: int) -> Dict[str, Dict[str, Any]]:
+        """Current metadata by id, fetched in pages without documents or embeddings."""
+        indexed = {}
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            for product_id, meta in zip(page["ids"], page["metadatas"]):
+                indexed[product_id] = meta or {}
+            if len(page["ids"]) < page_size:
+                return indexed
+            offset += page_size
+
+    def initialize_data(self, json_path: str = "products.json", days_period: int = 30,
+                        dry_run: bool = False, batch_size: int = 64) -> Dict[str, Any]:
+        """Sync ChromaDB with product data from JSON (or JSONL chunks), re-embedding only new or changed products.
 
-    def initialize_data(self, json_path: str = "products.json", days_period: int = 30):
-        """Initialize or update ChromaDB with product data from JSON."""
+        Products whose embedded text (or the model) changed are re-encoded and
+        upserted, metadata-only changes such as price or sales are updated in
+        place, and products missing from the JSON are deleted. With `dry_run`
+        the planned changes are reported without touching the collection.
+        """
         if not os.path.exists(json_path):
             print(f"Error: File {json_path} not found!")
-            return
+            return {}
         
-        with open(json_path) as f:
-            products = json.load(f)
+        products = list(iter_products(json_path))
 
-        # Identify current IDs to remove outdated products
+        page_size = self.client.get_max_batch_size()
         try:
-            current_ids = set(self.collection.get()["ids"])
+            indexed = self._indexed_metadata(page_size)
         except Exception:
-            current_ids = set()
-        new_ids = set(str(product.get("id", -1)) for product in products)
-        ids_to_delete = list(current_ids - new_ids)
-        if ids_to_delete:
-            self.collection.delete(ids=ids_to_delete)
+            indexed = {}
 
-        # Prepare data for upsert
-        documents = []
-        metadatas = []
-        ids = []
+        to_embed = {"ids": [], "documents": [], "metadatas": []}
+        to_update = {"ids": [], "metadatas": []}
+        new_ids = set()
+        added = unchanged = 0
 
         for product in products:
             sales_data = product.get("sales_data", {})
@@ -105,11 +665,14 @@ class RecommendationEngine:
                 units_sold = 0
             sales_velocity = units_sold / days_period if units_sold else 0
 
+            effects = product.get("effects", [])
+            ingredients = product.get("ingredients", [])
+            # List fields use the same joined encoding as chroma_db_stp.py so they can be filtered on.
             metadata = {
                 "id": product.get("id", -1),
                 "name": product.get("name", "Unknown Product"),
-                "effects": product.get("effects", []),
-                "ingredients": product.get("ingredients", []),
+                "effects": MULTI_VALUE_SEPARATOR.join(effects),
+                "ingredients": MULTI_VALUE_SEPARATOR.join(ingredients),
                 "price": product.get("price", 0.0),
                 "description": product.get("description", ""),
                 "type": product.get("type", "Unknown Type"),
@@ -118,24 +681,65 @@ class RecommendationEngine:
 
             doc_text = " ".join([
                 metadata["description"],
-                " ".join(metadata["effects"]),
-                " ".join(metadata["ingredients"]),
+                " ".join(effects),
+                " ".join(ingredients),
                 metadata["type"]
             ])
+            metadata["content_hash"] = self._content_hash(doc_text)
 
-            documents.append(doc_text)
-            metadatas.append(metadata)
-            ids.append(str(product.get("id", -1)))
+            product_id = str(product.get("id", -1))
+            new_ids.add(product_id)
+            current = indexed.get(product_id)
+            if current is None or current.get("content_hash") != metadata["content_hash"]:
+                added += current is None
+                to_embed["ids"].append(product_id)
+                to_embed["documents"].append(doc_text)
+                to_embed["metadatas"].append(metadata)
+            elif current != metadata:
+                to_update["ids"].append(product_id)
+                to_update["metadatas"].append(metadata)
+            else:
+                unchanged += 1
+
+        ids_to_delete = [product_id for product_id in indexed if product_id not in new_ids]
+        report = {
+            "added": added,
+            "changed": len(to_embed["ids"]) - added,
+            "metadata_only": len(to_update["ids"]),
+            "deleted": len(ids_to_delete),
+            "unchanged": unchanged,
+            "dry_run": dry_run
+        }
+        print(f"Index sync plan: {report}")
+        if dry_run or not (to_embed["ids"] or to_update["ids"] or ids_to_delete):
+            return report
 
-        # Generate embeddings and upsert
         try:
-            embeddings = self.model.encode(documents, normalize_embeddings=True).tolist()
-            self.collection.upsert(
-                ids=ids,
-                embeddings=embeddings,
-                metadatas=metadatas,
-                documents=documents
-            )
-            print(f"✅ Successfully indexed {len(products)} products")
+            store = EmbeddingStore(self.encoder_name, normalize=True)
+            for start in range(0, len(ids_to_delete), page_size):
+                self.collection.delete(ids=ids_to_delete[start:start + page_size])
+
+            for start in range(0, len(to_update["ids"]), page_size):
+                end = start + page_size
+                self.collection.update(
+                    ids=to_update["ids"][start:end],
+                    metadatas=to_update["metadatas"][start:end]
+                )
+
+            for start in range(0, len(to_embed["ids"]), page_size):
+                end = start + page_size
+                documents = to_embed["documents"][start:end]
+                embeddings = store.encode(self.model, documents, batch_size=batch_size)
+                self.collection.upsert(
+                    ids=to_embed["ids"][start:end],
+                    embeddings=embeddings.tolist(),
+                    metadatas=to_embed["metadatas"][start:end],
+                    documents=documents
+                )
+            print(f"✅ Successfully indexed {len(products)} products "
+                  f"({len(to_embed['ids'])} embedded, {len(to_update['ids'])} updated, {len(ids_to_delete)} deleted)")
+            self.retriever.rebuild(self.collection)
+            self._reindexed()
         except Exception as e:
-            print(f"Data initialization failed: {e}")
\ No newline at end of file
+            print(f"Data initialization failed: {e}")
+        return report
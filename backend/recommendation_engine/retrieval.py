@@ -0,0 +1,327 @@
+# retrieval.py
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import glob
+import os
+
+import numpy as np
+
+from backend.recommendation_engine.compression import BLOCK_ROWS, EmbeddingCodec, compact_top_k, rescore
+from utils.row_store import RowStore, write_rows
+
+DEFAULT_INDEX_DIR = "rag/knowledge_base/vector_index"
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_ROWS = "metadata"  # RowStore of the row-aligned metadata
+ANN_INDEX_FILE = "ann-{}.faiss"
+CODES_FILE = "compressed-{}.npy"
+CODEC_FILE = "codec-{}.npz"
+
+# One query's hits: cosine similarities (descending) and the matching product metadata.
+Hits = Tuple[np.ndarray, List[Dict[str, Any]]]
+
+
+class RetrievalBackend:
+    """Interface for nearest-neighbour search over normalized product embeddings."""
+
+    name = "base"
+
+    def search(self, query_embeddings: np.ndarray, k: int, where: Optional[Dict[str, Any]] = None) -> List[Hits]:
+        """Return the top-k hits for each row of `query_embeddings`.
+
+        Backends that can evaluate a Chroma-style `where` clause apply it;
+        others ignore it and the caller filters the hits.
+        """
+        raise NotImplementedError
+
+    def search_subset(self, query_embeddings: np.ndarray, k: int, rows: np.ndarray,
+                      product_ids: List[Any]) -> List[Hits]:
+        """Exact top-k restricted to catalog positions `rows` (positions in `all_metadata()` order)."""
+        raise NotImplementedError
+
+    def all_metadata(self) -> List[Dict[str, Any]]:
+        """Return the metadata of every indexed product."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def rebuild(self, collection) -> None:
+        """Bring the backend up to date after the Chroma collection was re-indexed."""
+
+    def reload(self) -> None:
+        """Reopen index files another process has rewritten."""
+
+
+class ChromaBackend(RetrievalBackend):
+    """Searches the Chroma collection directly."""
+
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def search(self, query_embeddings: np.ndarray, k: int, where: Optional[Dict[str, Any]] = None) -> List[Hits]:
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        options = {"where": where} if where else {}
+        results = self.collection.query(
+            query_embeddings=query_embeddings.tolist(),
+            n_results=k,
+            include=["metadatas", "distances"],
+            **options
+        )
+        return [
+            (1.0 - np.asarray(distances, dtype=np.float32), list(metadatas))  # Cosine similarity
+            for metadatas, distances in zip(results["metadatas"], results["distances"])
+        ]
+
+    def search_subset(self, query_embeddings: np.ndarray, k: int, rows: np.ndarray,
+                      product_ids: List[Any]) -> List[Hits]:
+        # Pushed down as a where clause on the indexed product id.
+        return self.search(query_embeddings, min(k, len(product_ids)), where={"id": {"$in": list(product_ids)}})
+
+    def all_metadata(self) -> List[Dict[str, Any]]:
+        return self.collection.get(include=["metadatas"])["metadatas"] or []
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def write_mmap_index(index_dir: str, embeddings: np.ndarray, metadatas: List[Dict[str, Any]]) -> None:
+    """Atomically write an embedding matrix and its row-aligned metadata row store."""
+    if len(embeddings) != len(metadatas):
+        raise ValueError(f"{len(embeddings)} embeddings but {len(metadatas)} metadata rows")
+    os.makedirs(index_dir, exist_ok=True)
+    matrix = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    embeddings_path = os.path.join(index_dir, EMBEDDINGS_FILE)
+    with open(embeddings_path + ".tmp", "wb") as f:
+        np.save(f, np.ascontiguousarray(matrix))
+    os.replace(embeddings_path + ".tmp", embeddings_path)
+    write_rows(os.path.join(index_dir, METADATA_ROWS), metadatas)
+    # Derived files are rebuilt from the new matrix on the next load.
+    for pattern in (ANN_INDEX_FILE, CODES_FILE, CODEC_FILE):
+        for derived_path in glob.glob(os.path.join(index_dir, pattern.format("*"))):
+            os.remove(derived_path)
+
+
+def export_collection(collection, index_dir: str = DEFAULT_INDEX_DIR, page_size: int = 5000) -> int:
+    """Copy embeddings and metadata out of a Chroma collection into an mmap index."""
+    total = collection.count()
+    embeddings, metadatas = [], []
+    for offset in range(0, total, page_size):
+        page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+        embeddings.append(np.asarray(page["embeddings"], dtype=np.float32))
+        metadatas.extend(page["metadatas"])
+    matrix = np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+    write_mmap_index(index_dir, matrix, metadatas)
+    return len(metadatas)
+
+
+class MmapBackend(RetrievalBackend):
+    """In-process search over a memory-mapped embedding matrix.
+
+    Small catalogs are searched exactly with one BLAS matmul. Catalogs larger
+    than `exact_max` use a FAISS IVF or HNSW index persisted next to the matrix.
+    Every worker maps the same files, the metadata included (a RowStore decoded
+    per hit), so the OS page cache holds a single copy.
+
+    With `compressed_dtype` other than float32, or `compressed_dims` set, the
+    first pass runs over compact float16/int8 (optionally truncated or PCA
+    reduced) vectors and only `rescore_multiplier * k` candidates per query are
+    rescored against the full-precision matrix, which then stays on disk.
+    """
+
+    name = "mmap"
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR, ann: str = "auto", exact_max: int = 50000,
+                 n_probe: int = 16, ef_search: int = 64, compressed_dtype: str = "float32",
+                 compressed_dims: int = 0, projection: str = "prefix", rescore_multiplier: int = 4):
+        if ann not in ("auto", "flat", "ivf", "hnsw"):
+            raise ValueError(f"Unknown ANN index type '{ann}'")
+        self.index_dir = index_dir
+        self.ann = ann
+        self.exact_max = exact_max
+        self.n_probe = n_probe
+        self.ef_search = ef_search
+        self.compressed_dtype = compressed_dtype
+        self.compressed_dims = compressed_dims
+        self.projection = projection
+        self.rescore_multiplier = max(1, rescore_multiplier)
+        self._state: Tuple[np.ndarray, Sequence[Dict[str, Any]], Any, Optional[Tuple[EmbeddingCodec, np.ndarray]]] = \
+            (np.zeros((0, 0), np.float32), [], None, None)
+        self.reload()
+
+    @property
+    def compressed(self) -> bool:
+        return self.compressed_dtype != "float32" or self.compressed_dims > 0
+
+    @property
+    def codec_key(self) -> str:
+        return f"{self.compressed_dtype}-{self.projection}{self.compressed_dims or 'full'}"
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._state[0]
+
+    @property
+    def metadatas(self) -> Sequence[Dict[str, Any]]:
+        return self._state[1]
+
+    def reload(self) -> None:
+        """(Re)open the index files; the swap is atomic for concurrent readers."""
+        embeddings = np.load(os.path.join(self.index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        metadatas = RowStore.open(os.path.join(self.index_dir, METADATA_ROWS))
+        compact = self._load_compact(embeddings) if self.compressed and len(embeddings) else None
+        self._state = (embeddings, metadatas, self._load_ann(embeddings, compact), compact)
+
+    def _load_compact(self, embeddings: np.ndarray) -> Tuple[EmbeddingCodec, np.ndarray]:
+        """Open the compact vectors for the configured codec, encoding them on first use."""
+        codes_path = os.path.join(self.index_dir, CODES_FILE.format(self.codec_key))
+        codec_path = os.path.join(self.index_dir, CODEC_FILE.format(self.codec_key))
+        if not (os.path.exists(codes_path) and os.path.exists(codec_path)):
+            codec = EmbeddingCodec.fit(embeddings, self.compressed_dtype, self.compressed_dims, self.projection)
+            with open(codes_path + ".tmp", "wb") as f:
+                np.save(f, codec.encode_all(embeddings))
+            os.replace(codes_path + ".tmp", codes_path)
+            codec.save(codec_path)
+        return EmbeddingCodec.load(codec_path), np.load(codes_path, mmap_mode="r")
+
+    def _ann_kind(self, n: int) -> str:
+        if self.ann == "auto":
+            return "flat" if n <= self.exact_max else "hnsw"
+        return self.ann
+
+    def _load_ann(self, embeddings: np.ndarray, compact: Optional[Tuple[EmbeddingCodec, np.ndarray]] = None):
+        kind = self._ann_kind(len(embeddings))
+        if kind == "flat":
+            return None
+        try:
+            import faiss
+        except ImportError:
+            print("faiss is not installed; falling back to exact search")
+            return None
+
+        name = kind if compact is None else f"{kind}-{self.codec_key}"
+        path = os.path.join(self.index_dir, ANN_INDEX_FILE.format(name))
+        if os.path.exists(path):
+            # IVF inverted lists can be mapped and shared; HNSW graphs are read into memory.
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP if kind == "ivf" else 0)
+        elif compact is None:
+            matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+            dim = matrix.shape[1]
+            if kind == "ivf":
+                n_list = max(1, int(4 * np.sqrt(len(matrix))))
+                index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, n_list, faiss.METRIC_INNER_PRODUCT)
+                index.train(matrix)
+            else:
+                index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            index.add(matrix)
+            faiss.write_index(index, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        else:
+            # Scalar-quantized FAISS storage over the reduced vectors, added block by block.
+            codec = compact[0]
+            quantizer = {"int8": faiss.ScalarQuantizer.QT_8bit, "float16": faiss.ScalarQuantizer.QT_fp16,
+                         "float32": faiss.ScalarQuantizer.QT_fp32}[codec.dtype]
+            n_list = max(1, int(4 * np.sqrt(len(embeddings))))
+            if kind == "ivf":
+                index = faiss.IndexIVFScalarQuantizer(faiss.IndexFlatIP(codec.dims), codec.dims, n_list,
+                                                      quantizer, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexHNSWSQ(codec.dims, quantizer, 32, faiss.METRIC_INNER_PRODUCT)
+            sample = np.random.default_rng(0).choice(len(embeddings), min(len(embeddings), 256 * n_list),
+                                                     replace=False)
+            index.train(np.ascontiguousarray(codec.project(embeddings[np.sort(sample)])))
+            for start in range(0, len(embeddings), BLOCK_ROWS):
+                index.add(np.ascontiguousarray(codec.project(embeddings[start:start + BLOCK_ROWS])))
+            faiss.write_index(index, path + ".tmp")
+            os.replace(path + ".tmp", path)
+        if kind == "ivf":
+            index.nprobe = self.n_probe
+        else:
+            index.hnsw.efSearch = self.ef_search
+        return index
+
+    def search(self, query_embeddings: np.ndarray, k: int, where: Optional[Dict[str, Any]] = None) -> List[Hits]:
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        embeddings, metadatas, ann_index, compact = self._state
+        n = len(metadatas)
+        k = min(k, n)
+        if k <= 0:
+            return [(np.empty(0, dtype=np.float32), []) for _ in queries]
+
+        if compact is not None:
+            codec, codes = compact
+            candidates = min(n, k * self.rescore_multiplier)
+            if ann_index is not None:
+                _, rows = ann_index.search(codec.project_queries(queries), candidates)
+            else:
+                _, rows = compact_top_k(codes, codec.query_weights(queries), candidates)
+            scores, rows = rescore(embeddings, queries, rows, k)
+            return [(query_scores.astype(np.float32), [metadatas[row] for row in query_rows.tolist()])
+                    for query_scores, query_rows in zip(scores, rows)]
+
+        if ann_index is not None:
+            scores, rows = ann_index.search(np.ascontiguousarray(queries), k)
+        else:
+            similarity = queries @ embeddings.T
+            rows = np.argpartition(-similarity, k - 1, axis=1)[:, :k] if k < n else \
+                np.tile(np.arange(n), (len(queries), 1))
+            scores = np.take_along_axis(similarity, rows, axis=1)
+
+        hits = []
+        for query_scores, query_rows in zip(scores, rows):
+            keep = query_rows >= 0
+            query_scores, query_rows = query_scores[keep], query_rows[keep]
+            order = np.argsort(-query_scores, kind="stable")
+            hits.append((
+                query_scores[order].astype(np.float32),
+                [metadatas[row] for row in query_rows[order].tolist()]
+            ))
+        return hits
+
+    def search_subset(self, query_embeddings: np.ndarray, k: int, rows: np.ndarray,
+                      product_ids: List[Any]) -> List[Hits]:
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        embeddings, metadatas = self._state[0], self._state[1]
+        rows = np.asarray(rows, dtype=np.int64)
+        k = min(k, len(rows))
+        if k <= 0:
+            return [(np.empty(0, dtype=np.float32), []) for _ in queries]
+        similarity = queries @ np.asarray(embeddings[rows], dtype=np.float32).T
+        hits = []
+        for query_similarity in similarity:
+            top = np.argpartition(-query_similarity, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-query_similarity[top], kind="stable")]
+            hits.append((query_similarity[top], [metadatas[row] for row in rows[top].tolist()]))
+        return hits
+
+    def all_metadata(self) -> Sequence[Dict[str, Any]]:
+        return self.metadatas
+
+    def count(self) -> int:
+        return len(self.metadatas)
+
+    def rebuild(self, collection) -> None:
+        export_collection(collection, self.index_dir)
+        self.reload()
+
+
+def create_backend(kind: str, collection=None, **options: Any) -> RetrievalBackend:
+    """Instantiate a retrieval backend by name ('chroma' or 'mmap')."""
+    if kind == "chroma":
+        return ChromaBackend(collection)
+    if kind == "mmap":
+        return MmapBackend(**options)
+    raise ValueError(f"Unknown retrieval backend '{kind}'")
+
+
+if __name__ == '__main__':
+    import chromadb
+
+    client = chromadb.PersistentClient(path="rag/knowledge_base/chroma_db")
+    exported = export_collection(client.get_collection("products"))
+    print(f"Exported {exported} products to {DEFAULT_INDEX_DIR}")
@@ -0,0 +1,293 @@
+# sales_signals.py
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import fcntl
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400.0
+SLOTS_SUFFIX = ".slots.npy"
+HEADER_SUFFIX = ".header.npy"
+EMPTY_ID = np.iinfo(np.int64).min
+# Shared counters refuse new products beyond this fraction of their slots, keeping probe chains short.
+MAX_LOAD = 0.7
+
+
+class DecayedSalesCounters:
+    """Per-product exponentially decayed unit counters fed by live sales events.
+
+    Each product keeps a decayed sum of units and the time it was last updated;
+    reads decay the sum to "now". With half-life H days, a product selling r
+    units/day settles at a sum of r * H / ln 2, which `rates` converts back to
+    units per day so it is comparable with windowed sales velocity.
+    """
+
+    def __init__(self, half_life_days: float = 7.0):
+        self.half_life = half_life_days * SECONDS_PER_DAY
+        self._index: Dict[int, int] = {}
+        self._values = np.zeros(64, dtype=np.float64)
+        self._updated = np.zeros(64, dtype=np.float64)
+        self._lock = threading.Lock()
+        self.events = 0
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _slot(self, product_id: int) -> int:
+        slot = self._index.get(product_id)
+        if slot is None:
+            slot = len(self._index)
+            if slot >= len(self._values):
+                self._values = np.resize(self._values, 2 * len(self._values))
+                self._updated = np.resize(self._updated, 2 * len(self._updated))
+            self._values[slot] = 0.0
+            self._updated[slot] = 0.0
+            self._index[product_id] = slot
+        return slot
+
+    def _find(self, product_id: int) -> int:
+        """Slot of a product, or -1 if it has no counter."""
+        return self._index.get(product_id, -1)
+
+    def _decay(self, elapsed: np.ndarray) -> np.ndarray:
+        return np.power(0.5, np.maximum(elapsed, 0.0) / self.half_life)
+
+    def record(self, product_id: int, units: float = 1.0, timestamp: Optional[float] = None) -> None:
+        self.record_many([(product_id, units, timestamp)])
+
+    def record_many(self, events: Iterable[Tuple[int, float, Optional[float]]]) -> int:
+        """Apply (product_id, units, unix timestamp or None for now) events; returns how many were applied."""
+        now = time.time()
+        applied = 0
+        with self._lock:
+            try:
+                for product_id, units, timestamp in events:
+                    # A future timestamp would push the reference time ahead and decay every real event.
+                    timestamp = now if timestamp is None else min(float(timestamp), now)
+                    slot = self._slot(int(product_id))
+                    last = self._updated[slot]
+                    if timestamp >= last:
+                        self._values[slot] = self._values[slot] * self._decay(timestamp - last) + units
+                        self._updated[slot] = timestamp
+                    else:
+                        # Late event: decay it to the counter's reference time instead.
+                        self._values[slot] += units * self._decay(last - timestamp)
+                    applied += 1
+            finally:
+                # Events applied before a failure (e.g. full shared counters) still count.
+                self.events += applied
+                self._dirty = self._dirty or applied > 0
+        return applied
+
+    def rates(self, product_ids: Iterable[Any], now: Optional[float] = None) -> np.ndarray:
+        """Decayed units per day for each product id, NaN for products never seen."""
+        now = time.time() if now is None else now
+        to_rate = math.log(2) / (self.half_life / SECONDS_PER_DAY)
+        with self._lock:
+            slots = []
+            for product_id in product_ids:
+                try:
+                    slots.append(self._find(int(product_id)))
+                except (TypeError, ValueError):
+                    slots.append(-1)
+            slots = np.array(slots, dtype=np.int64)
+            out = np.full(len(slots), np.nan)
+            known = slots >= 0
+            rows = slots[known]
+            out[known] = self._values[rows] * self._decay(now - self._updated[rows]) * to_rate
+        return out
+
+    def _export(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(product ids, values, updated) of every counter; called with the lock held."""
+        count = len(self._index)
+        ids = np.fromiter(self._index.keys(), dtype=np.int64, count=count)
+        slots = np.fromiter(self._index.values(), dtype=np.int64, count=count)
+        return ids, self._values[slots].copy(), self._updated[slots].copy()
+
+    def snapshot(self, path: str) -> bool:
+        """Write counters to `path` (.npz) if anything changed since the last snapshot."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            ids, values, updated = self._export()
+            self._dirty = False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Per-process temp name: several server workers may snapshot to the same path.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, product_ids=ids, values=values, updated=updated,
+                     half_life=np.array(self.half_life), events=np.array(self.events))
+        os.replace(tmp_path, path)
+        return True
+
+    def restore(self, path: str) -> None:
+        """Replace counters with the ones in a snapshot written by `snapshot`."""
+        with np.load(path) as data:
+            with self._lock:
+                for product_id, value, updated in zip(data["product_ids"].tolist(), data["values"].tolist(),
+                                                       data["updated"].tolist()):
+                    slot = self._slot(product_id)
+                    self._values[slot] = value
+                    self._updated[slot] = updated
+                self.events = int(data["events"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"products": len(self), "events": self.events,
+                "half_life_days": self.half_life / SECONDS_PER_DAY}
+
+
+class _ProcessLock:
+    """A thread lock plus an exclusive flock on a lock file, serializing threads and processes alike."""
+
+    def __init__(self, path: str):
+        self._thread_lock = threading.Lock()
+        self._file = open(path, "a")
+
+    def __enter__(self) -> None:
+        self._thread_lock.acquire()
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info) -> None:
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+
+class SharedSalesCounters(DecayedSalesCounters):
+    """DecayedSalesCounters kept in memory-mapped files that every server worker maps.
+
+    A sales event posted to any worker changes ranking in all of them. The
+    slots form an open-addressing hash table over product ids (linear
+    probing) with a fixed capacity; slots never move, so each process caches
+    the slots it has found. A small header holds the product count, the
+    event total and the half-life. Reads and writes take an flock on
+    `<path>.lock`, and the files on disk are the durable state across restarts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._slots = np.load(path + SLOTS_SUFFIX, mmap_mode="r+")
+        self._header_map = np.load(path + HEADER_SUFFIX, mmap_mode="r+")  # [products, events, half-life seconds]
+        self.half_life = float(self._header_map[2])
+        # Plain ndarray views of the mapping: same memory, without np.memmap's per-operation overhead.
+        self._ids = np.asarray(self._slots["id"])
+        self._values = np.asarray(self._slots["value"])
+        self._updated = np.asarray(self._slots["updated"])
+        self._header = np.asarray(self._header_map)
+        self._shift = 64 - (len(self._slots).bit_length() - 1)
+        self._index: Dict[int, int] = {}
+        self._lock = _ProcessLock(path + ".lock")
+        self._dirty = False
+
+    @classmethod
+    def open(cls, path: str, half_life_days: float = 7.0, capacity: int = 1 << 21,
+             initialize: Optional[Callable[["SharedSalesCounters"], None]] = None) -> "SharedSalesCounters":
+        """Map the counters at `path`, creating them (and calling `initialize` on them) if they do not exist yet.
+
+        Creation is guarded by a lock file, so when several workers start at
+        once exactly one of them creates and initializes the counters. An
+        existing file keeps its own capacity and half-life.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + ".init.lock", "a") as guard:
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            if not os.path.exists(path + SLOTS_SUFFIX):
+                capacity = 1 << max(int(capacity) - 1, 1).bit_length()  # next power of two
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                slots = np.lib.format.open_memmap(
+                    tmp_path + SLOTS_SUFFIX, mode="w+", shape=(capacity,),
+                    dtype=[("id", np.int64), ("value", np.float64), ("updated", np.float64)])
+                slots["id"] = EMPTY_ID
+                slots.flush()
+                del slots
+                np.save(tmp_path + HEADER_SUFFIX, np.array([0.0, 0.0, half_life_days * SECONDS_PER_DAY]))
+                if initialize is not None:
+                    counters = cls(tmp_path)
+                    initialize(counters)
+                    counters.flush()
+                    del counters
+                    os.remove(tmp_path + ".lock")
+                # The slots file marks the counters as present, so it is moved into place last.
+                os.replace(tmp_path + HEADER_SUFFIX, path + HEADER_SUFFIX)
+                os.replace(tmp_path + SLOTS_SUFFIX, path + SLOTS_SUFFIX)
+        return cls(path)
+
+    def __len__(self) -> int:
+        return int(self._header[0])
+
+    @property
+    def events(self) -> int:
+        return int(self._header[1])
+
+    @events.setter
+    def events(self, value: int) -> None:
+        self._header[1] = value
+
+    def _probe(self, product_id: int) -> int:
+        """Slot holding `product_id` or the empty slot that ends its probe chain."""
+        mask = len(self._ids) - 1
+        slot = ((product_id * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> self._shift
+        while True:
+            current = int(self._ids[slot])
+            if current == product_id or current == EMPTY_ID:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _find(self, product_id: int) -> int:
+        slot = self._index.get(product_id)
+        if slot is None:
+            slot = self._probe(product_id)
+            if int(self._ids[slot]) != product_id:
+                return -1  # not cached: another worker may add it later
+            self._index[product_id] = slot
+        return slot
+
+    def _slot(self, product_id: int) -> int:
+        slot = self._find(product_id)
+        if slot < 0:
+            if len(self) + 1 > MAX_LOAD * len(self._ids):
+                raise RuntimeError(f"Shared sales counters at {self.path} are full ({len(self)} products)")
+            slot = self._probe(product_id)
+            self._values[slot] = 0.0
+            self._updated[slot] = 0.0
+            self._ids[slot] = product_id
+            self._header[0] += 1
+            self._index[product_id] = slot
+        return slot
+
+    def _export(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        used = np.flatnonzero(self._ids != EMPTY_ID)
+        return self._ids[used].copy(), self._values[used].copy(), self._updated[used].copy()
+
+    def flush(self) -> None:
+        self._slots.flush()
+        self._header_map.flush()
+
+
+class SnapshotThread(threading.Thread):
+    """Periodically snapshots counters to disk until stopped."""
+
+    def __init__(self, counters: DecayedSalesCounters, path: str, interval: float = 60.0):
+        super().__init__(name="sales-counter-snapshots", daemon=True)
+        self.counters = counters
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.counters.snapshot(self.path)
+            except Exception as e:
+                print(f"Sales counter snapshot failed: {e}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.counters.snapshot(self.path)
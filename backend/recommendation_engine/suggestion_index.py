@@ -0,0 +1,130 @@
+# suggestion_index.py
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from backend.recommendation_engine.metadata import split_multi_value
+
+# Entry kinds, in tie-break order when popularity is equal.
+KIND_KEYWORD = 0
+KIND_EFFECT = 1
+KIND_PRODUCT = 2
+KIND_INGREDIENT = 3
+
+MAX_PREFIX_LENGTH = 32
+MAX_RESULTS_PER_PREFIX = 16
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SuggestionIndex:
+    """Popularity-ranked prefix and trigram index over product names, effects and ingredients.
+
+    Entries are numbered by rank (most popular first), so every posting list is
+    already in ranking order and lookups never need to sort.
+    """
+
+    def __init__(self, entries: Sequence[Tuple[str, float, int]], keywords: Sequence[str] = ()):
+        ranked = sorted(entries, key=lambda e: (-e[1], e[2], e[0].lower()))
+        self.texts: List[str] = [text for text, _, _ in ranked]
+        self._lowered: List[str] = [text.lower() for text in self.texts]
+        self.keywords: List[str] = list(keywords)
+        self._prefixes: Dict[str, Tuple[int, ...]] = {}
+        self._trigrams: Dict[str, List[int]] = {}
+
+        prefixes: Dict[str, List[int]] = {}
+        for entry_id, lowered in enumerate(self._lowered):
+            seen = set()
+            starts = [0] + [i + 1 for i, ch in enumerate(lowered) if ch == " "]
+            for start in starts:
+                suffix = lowered[start:start + MAX_PREFIX_LENGTH]
+                for end in range(1, len(suffix) + 1):
+                    prefix = suffix[:end]
+                    if prefix in seen:
+                        continue
+                    seen.add(prefix)
+                    postings = prefixes.setdefault(prefix, [])
+                    if len(postings) < MAX_RESULTS_PER_PREFIX:
+                        postings.append(entry_id)
+            for gram in _trigrams(lowered):
+                self._trigrams.setdefault(gram, []).append(entry_id)
+        self._prefixes = {prefix: tuple(ids) for prefix, ids in prefixes.items()}
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def from_metadatas(cls, metadatas: Iterable[Dict[str, Any]],
+                       keywords: Sequence[str] = ()) -> "SuggestionIndex":
+        """Build an index from product metadata, scoring terms by summed sales velocity."""
+        scores: Dict[str, List[Any]] = {}
+
+        def add(text: Any, popularity: float, kind: int) -> None:
+            text = str(text).strip()
+            if not text:
+                return
+            key = text.lower()
+            entry = scores.get(key)
+            if entry is None:
+                scores[key] = [text, popularity, kind]
+            else:
+                entry[1] += popularity
+                if kind < entry[2]:
+                    entry[0], entry[2] = text, kind
+
+        for meta in metadatas:
+            if not meta:
+                continue
+            try:
+                popularity = max(float(meta.get("sales_velocity", 0.0) or 0.0), 0.0)
+            except (TypeError, ValueError):
+                popularity = 0.0
+            if "name" in meta:
+                add(meta["name"], popularity, KIND_PRODUCT)
+            for effect in split_multi_value(meta.get("effects")):
+                add(effect, popularity, KIND_EFFECT)
+            for ingredient in split_multi_value(meta.get("ingredients")):
+                add(ingredient, popularity, KIND_INGREDIENT)
+
+        # Curated keywords always outrank catalog terms that share the prefix.
+        boost = max((entry[1] for entry in scores.values()), default=0.0) + 1.0
+        for rank, keyword in enumerate(keywords):
+            add(keyword, boost * (len(keywords) - rank), KIND_KEYWORD)
+
+        return cls([tuple(entry) for entry in scores.values()], keywords)
+
+    def _substring_matches(self, query: str, limit: int, exclude: set) -> List[int]:
+        grams = _trigrams(query)
+        if not grams:
+            return []
+        postings = [self._trigrams.get(gram) for gram in grams]
+        if any(p is None for p in postings):
+            return []
+        # Scan the rarest trigram's postings in rank order and verify directly.
+        matches = []
+        for entry_id in min(postings, key=len):
+            if entry_id not in exclude and query in self._lowered[entry_id]:
+                matches.append(entry_id)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def suggest(self, query: str, limit: int = 5) -> List[str]:
+        """Return up to `limit` suggestions, prefix matches first, then substring matches.
+
+        An empty query gets the curated keywords; otherwise results may be fewer than `limit`.
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            return self.keywords[:limit]
+
+        matches = list(self._prefixes.get(query[:MAX_PREFIX_LENGTH], ()))
+        if len(query) > MAX_PREFIX_LENGTH:
+            matches = [i for i in matches if query in self._lowered[i]]
+        matches = matches[:limit]
+        if len(matches) < limit:
+            matches += self._substring_matches(query, limit - len(matches), set(matches))
+
+        # Curated keywords are indexed entries, so they appear here only when they match.
+        return [self.texts[i] for i in matches]
+
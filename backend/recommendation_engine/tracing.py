@@ -0,0 +1,46 @@
+# tracing.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+import time
+
+from backend.recommendation_engine.metrics import REGISTRY, Histogram
+
+STAGE_METRIC = "stage_duration_seconds"
+
+# Per-request stage timings, set only when a caller asked for them (e.g. the X-Timing header).
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+_stage_histograms: Dict[str, Histogram] = {}
+
+
+def _stage_histogram(name: str) -> Histogram:
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        histogram = _stage_histograms[name] = REGISTRY.histogram(
+            STAGE_METRIC, "Time spent in each hot-path stage.", stage=name)
+    return histogram
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a stage into its histogram and, when a request trace is active, into that trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _stage_histogram(name).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def start_request_trace() -> Dict[str, float]:
+    """Collect span timings for the current context (propagates to copied contexts)."""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def count(name: str, amount: float = 1.0, help_text: str = "", **labels: str) -> None:
+    REGISTRY.counter(name, help_text, **labels).inc(amount)
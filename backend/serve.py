@@ -0,0 +1,89 @@
+"""Multi-worker serving: N HTTP workers sharing one encoder process pool and memory-mapped data.
+
+    python backend/serve.py --workers 8 --encoders 1
+
+The model is loaded once per encoder process instead of once per worker, and
+workers reach it over Unix sockets. Product vectors and metadata come from
+the mmap retrieval index and the JSON datasets from row stores, so every
+worker shares them through the OS page cache. Live sales counters are a
+shared memory-mapped table, so a sales event posted to any worker affects
+ranking in all of them. Each process exports its
+metrics for a merged /metrics.
+"""
+import argparse
+import logging
+import os
+import secrets
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def prepare_shared_data(config) -> None:
+    """Build the shared on-disk data once, before any worker starts, so workers only map it."""
+    from utils.data_loader import DataLoader
+    from utils.sales_store import SalesStore
+
+    loader = DataLoader(config.SHARED_DATA_DIR)
+    loader.products, loader.ingredients, loader.sales  # converted once; workers only map them
+    if not os.path.exists(os.path.join(config.SALES_STORE_DIR, "meta.json")):
+        SalesStore.from_records(loader.get_sales()).save(config.SALES_STORE_DIR)
+    if config.RETRIEVAL_BACKEND == "mmap":
+        from backend.recommendation_engine.recommender import get_chroma_client
+        from backend.recommendation_engine.retrieval import EMBEDDINGS_FILE, export_collection
+
+        if not os.path.exists(os.path.join(config.VECTOR_INDEX_DIR, EMBEDDINGS_FILE)):
+            exported = export_collection(get_chroma_client().get_collection("products"), config.VECTOR_INDEX_DIR)
+            logger.info(f"Exported {exported} products to {config.VECTOR_INDEX_DIR}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the API from several workers with a shared encoder.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="HTTP worker processes")
+    parser.add_argument("--encoders", type=int, default=int(os.getenv("ENCODER_PROCESSES", 1)),
+                        help="encoder processes (ignored when ENCODER_SERVICE points at running ones)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--run-dir", help="directory for sockets and metric snapshots (default: a new temp dir)")
+    args = parser.parse_args()
+
+    run_dir = args.run_dir or tempfile.mkdtemp(prefix="recommendation-service-")
+    os.makedirs(run_dir, exist_ok=True)
+    start_encoders = not os.getenv("ENCODER_SERVICE")
+    if start_encoders:
+        os.environ["ENCODER_SERVICE"] = ",".join(
+            os.path.join(run_dir, f"encoder-{index}.sock") for index in range(max(1, args.encoders)))
+        # Only processes started from here (which inherit the environment) can talk to the encoders.
+        os.environ.setdefault("ENCODER_SERVICE_AUTHKEY", secrets.token_hex(32))
+    # Settings are read from the environment on import, and the workers inherit it.
+    os.environ.setdefault("METRICS_DIR", os.path.join(run_dir, "metrics"))
+    os.environ.setdefault("SHARED_DATA_DIR", os.path.join(BASE_DIR, "data", "shared"))
+    os.environ.setdefault("RETRIEVAL_BACKEND", "mmap")
+
+    import uvicorn
+    from backend import config
+    from backend.recommendation_engine.encoder_service import start_servers
+    from backend.recommendation_engine.recommender import MODEL_NAME
+
+    prepare_shared_data(config)
+    processes = []
+    if start_encoders:
+        service = config.encoder_service_options()
+        logger.info(f"Starting {len(service['addresses'])} encoder process(es)")
+        processes = start_servers(service["addresses"], MODEL_NAME, config.encoder_options(), service["authkey"],
+                                  config.ENCODE_BATCH_SIZE, config.ENCODE_BATCH_WAIT_MS, config.METRICS_DIR)
+    try:
+        uvicorn.run("backend.main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """Records per-component warm-up timings and whether the service is ready to serve."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        yield
+        self.timings[name] = time.perf_counter() - started
+        logger.info(f"Startup: {name} took {self.timings[name]:.2f}s")
+
+    def mark_ready(self) -> None:
+        self.timings["total"] = time.perf_counter() - self.started
+        self._ready.set()
+        breakdown = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.timings.items())
+        logger.info(f"Startup complete: {breakdown}")
+
+    def mark_failed(self, error: Exception) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+        logger.exception("Startup failed")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "uptime_seconds": time.perf_counter() - self.started,
+            "timings": dict(self.timings),
+        }
@@ -0,0 +1,424 @@
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import shutil
+import argparse
+import platform
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.recommendation_engine.batching import MicroBatchEncoder
+from backend.recommendation_engine.metadata import MULTI_VALUE_SEPARATOR
+from backend.recommendation_engine.lexical_index import LexicalIndex
+from backend.recommendation_engine.ranking import RankingConfig, rank
+from backend.recommendation_engine.retrieval import EMBEDDINGS_FILE, METADATA_ROWS, MmapBackend
+from backend.recommendation_engine.suggestion_index import SuggestionIndex
+from rag.ingest import iter_chunks, run_pipeline
+from utils.row_store import write_rows
+from utils.sales_store import SalesStore
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_CONCURRENCY = [1, 4, 16]
+DEFAULT_DIM = 1024
+DEFAULT_OPS = 400
+DEFAULT_THRESHOLD = 0.15
+BATCH_QUERIES = 50
+
+TYPES = ["Tincture", "Capsules", "Powder", "Gummies", "Tea", "Oil", "Tablets", "Spray"]
+EFFECTS = ["relaxation", "stress relief", "energy boost", "sleep support", "focus", "hydration", "detox",
+           "immunity", "digestive health", "mood enhancement", "skin health", "weight management",
+           "anti-inflammatory", "joint support", "heart health", "memory", "recovery", "endurance"]
+INGREDIENTS = ["Ashwagandha Extract", "Chamomile", "Green Tea Extract", "Turmeric", "Ginger Root", "Melatonin",
+               "Magnesium", "Lavender Oil", "Peppermint Extract", "Echinacea Extract", "Ginseng", "Valerian Root",
+               "Rhodiola", "Caffeine Extract", "Aloe Vera Extract", "Collagen", "Zinc", "Vitamin C",
+               "Vitamin D3", "Omega-3", "Probiotics", "Spirulina", "Maca Root", "Holy Basil", "Lemon Balm",
+               "Elderberry", "Milk Thistle", "Ginkgo Biloba", "L-Theanine", "Passionflower"]
+ADJECTIVES = ["Natural", "Pure", "Organic", "Daily", "Calm", "Vital", "Herbal", "Premium", "Essential", "Active"]
+
+
+class StubEncoder:
+    """Deterministic stand-in for SentenceTransformer: a sum of hashed per-token random vectors.
+
+    Texts that share words get similar embeddings, so search results are
+    meaningful without downloading or running a model.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM, seed: int = 0):
+        self.dim = dim
+        self.seed = seed
+        self._tokens: Dict[str, np.ndarray] = {}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def token_vector(self, token: str) -> np.ndarray:
+        vector = self._tokens.get(token)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode("utf-8")) ^ self.seed)
+            vector = self._tokens[token] = rng.standard_normal(self.dim).astype(np.float32)
+        return vector
+
+    def text_vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            vector += self.token_vector(token)
+        return vector
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.stack([self.text_vector(text) for text in texts]) if texts else \
+            np.zeros((0, self.dim), dtype=np.float32)
+        if normalize_embeddings and len(embeddings):
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms > 0, norms, 1.0)
+        return embeddings[0] if single else embeddings
+
+
+class SyntheticCatalog:
+    """Reproducible catalog of `size` products built from a small vocabulary.
+
+    Each product is a type, two effects and four ingredients; its embedding is
+    the stub encoding of those phrases, computed in vectorized chunks so that
+    million-product catalogs build in seconds.
+    """
+
+    def __init__(self, size: int, encoder: StubEncoder, seed: int = 0):
+        rng = np.random.default_rng(seed + size)
+        self.size = size
+        self.encoder = encoder
+        self.types = rng.integers(0, len(TYPES), size)
+        self.effects = np.stack([rng.choice(len(EFFECTS), 2, replace=False) for _ in range(min(size, 4096))])
+        self.effects = self.effects[rng.integers(0, len(self.effects), size)]
+        self.ingredients = np.stack([rng.choice(len(INGREDIENTS), 4, replace=False) for _ in range(min(size, 4096))])
+        self.ingredients = self.ingredients[rng.integers(0, len(self.ingredients), size)]
+        self.adjectives = rng.integers(0, len(ADJECTIVES), size)
+        self.prices = np.round(rng.uniform(5, 120, size), 2)
+        self.units_sold = rng.poisson(rng.gamma(1.5, 20, size))
+
+    def product(self, i: int) -> Dict[str, Any]:
+        effects = [EFFECTS[e] for e in self.effects[i]]
+        ingredients = [INGREDIENTS[g] for g in self.ingredients[i]]
+        product_type = TYPES[self.types[i]]
+        return {
+            "id": i,
+            "name": f"{ADJECTIVES[self.adjectives[i]]} {product_type} {i}",
+            "type": product_type,
+            "effects": effects,
+            "ingredients": ingredients,
+            "price": float(self.prices[i]),
+            "description": f"A {product_type.lower()} for {' and '.join(effects)} with {', '.join(ingredients)}.",
+            "sales_data": {"units_sold": int(self.units_sold[i])},
+        }
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        product = self.product(i)
+        return {
+            "id": product["id"],
+            "name": product["name"],
+            "type": product["type"],
+            "effects": MULTI_VALUE_SEPARATOR.join(product["effects"]),
+            "ingredients": MULTI_VALUE_SEPARATOR.join(product["ingredients"]),
+            "price": product["price"],
+            "description": product["description"],
+            "sales_velocity": product["sales_data"]["units_sold"] / 30,
+        }
+
+    def embeddings(self, start: int, stop: int) -> np.ndarray:
+        phrase = self.encoder.text_vector
+        type_vectors = np.stack([phrase(text) for text in TYPES])
+        effect_vectors = np.stack([phrase(text) for text in EFFECTS])
+        ingredient_vectors = np.stack([phrase(text) for text in INGREDIENTS])
+        matrix = (type_vectors[self.types[start:stop]]
+                  + effect_vectors[self.effects[start:stop]].sum(axis=1)
+                  + ingredient_vectors[self.ingredients[start:stop]].sum(axis=1))
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def write_index(self, index_dir: str, chunk_size: int = 16384) -> None:
+        """Write an mmap retrieval index chunk by chunk, so the full matrix is never held in memory."""
+        os.makedirs(index_dir, exist_ok=True)
+        matrix = np.lib.format.open_memmap(os.path.join(index_dir, EMBEDDINGS_FILE), mode="w+",
+                                           dtype=np.float32, shape=(self.size, self.encoder.dim))
+        for start in range(0, self.size, chunk_size):
+            stop = min(start + chunk_size, self.size)
+            matrix[start:stop] = self.embeddings(start, stop)
+        matrix.flush()
+        del matrix
+        write_rows(os.path.join(index_dir, METADATA_ROWS), (self.metadata(i) for i in range(self.size)))
+
+    def sales_store(self, days: int = 90) -> SalesStore:
+        rng = np.random.default_rng(self.size)
+        units = rng.poisson(np.maximum(self.units_sold, 1)[:, None] / 30.0, (self.size, days)).astype(np.int32)
+        return SalesStore(np.arange(self.size), "2025-01-01", units)
+
+
+def make_queries(count: int, seed: int = 0) -> List[str]:
+    """Distinct user-style queries, so the query cache does not hide encode cost."""
+    rng = np.random.default_rng(seed)
+    vocabulary = EFFECTS + [name.lower() for name in INGREDIENTS] + [name.lower() for name in TYPES]
+    queries, seen = [], set()
+    while len(queries) < count:
+        words = rng.choice(vocabulary, rng.integers(1, 4), replace=False)
+        query = " ".join(words) + ("" if len(seen) < len(vocabulary) ** 2 else f" {len(queries)}")
+        if query not in seen:
+            seen.add(query)
+            queries.append(query)
+    return queries
+
+
+def measure(name: str, operation: Callable[[Any], Any], inputs: List[Any], concurrency: int,
+            catalog_size: int, is_error: Callable[[Any], bool] = lambda result: False) -> Dict[str, Any]:
+    """Run `operation` over `inputs` with `concurrency` threads and summarize latencies."""
+    latencies = np.zeros(len(inputs))
+    failed = np.zeros(len(inputs), dtype=bool)
+
+    def timed(i: int) -> None:
+        started = time.perf_counter()
+        try:
+            failed[i] = is_error(operation(inputs[i]))
+        except Exception:
+            failed[i] = True
+        latencies[i] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        for i in range(len(inputs)):
+            timed(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed, range(len(inputs))))
+    elapsed = time.perf_counter() - started
+    errors = int(failed.sum())
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    result = {
+        "benchmark": name,
+        "catalog_size": catalog_size,
+        "concurrency": concurrency,
+        "ops": len(inputs),
+        "errors": errors,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(latencies.mean() * 1000),
+        "qps": len(inputs) / elapsed if elapsed > 0 else 0.0,
+    }
+    print(f"{name:<26} n={catalog_size:<8} c={concurrency:<3} p50={p50:8.2f}ms p95={p95:8.2f}ms "
+          f"p99={p99:8.2f}ms qps={result['qps']:9.1f}" + (f" errors={errors}" if errors else ""))
+    return result
+
+
+def bench_ingest(catalog: SyntheticCatalog, chunk_size: int = 1000) -> Dict[str, Any]:
+    """Bulk ingestion throughput through the chunked encode/write pipeline."""
+    encoder = catalog.encoder
+    written = []
+
+    def encode(chunk: List[Dict[str, Any]]) -> np.ndarray:
+        texts = [" ".join([p["description"], " ".join(p["effects"]), " ".join(p["ingredients"]), p["type"]])
+                 for p in chunk]
+        return encoder.encode(texts, normalize_embeddings=True)
+
+    def write(chunk: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        written.append(len(chunk))
+
+    chunks = iter_chunks((catalog.product(i) for i in range(catalog.size)), chunk_size)
+    stats = run_pipeline(chunks, encode, write, total=catalog.size, desc=f"Ingest {catalog.size}")
+    return {
+        "benchmark": "ingest",
+        "catalog_size": catalog.size,
+        "concurrency": 1,
+        "ops": stats["documents"],
+        "errors": stats["documents"] - sum(written),
+        "seconds": stats["seconds"],
+        "qps": stats["docs_per_second"],
+    }
+
+
+class HttpHarness:
+    """The FastAPI app wired to a synthetic mmap index and the stub encoder, driven in-process."""
+
+    def __init__(self, work_dir: str, encoder: StubEncoder):
+        self.index_dir = os.path.join(work_dir, "vector_index")
+        os.environ["RETRIEVAL_BACKEND"] = "mmap"
+        os.environ["VECTOR_INDEX_DIR"] = self.index_dir
+        os.environ["SALES_STORE_DIR"] = os.path.join(work_dir, "sales_store")
+        os.environ["SALES_COUNTERS_SNAPSHOT"] = os.path.join(work_dir, "sales_counters.npz")
+        self.encoder = encoder
+        self.main = None
+        self.client = None
+
+    def load(self, catalog: SyntheticCatalog) -> None:
+        if os.path.isdir(self.index_dir):
+            shutil.rmtree(self.index_dir)
+        catalog.write_index(self.index_dir)
+        store = catalog.sales_store()
+        if self.main is None:
+            store.save(os.environ["SALES_STORE_DIR"])
+            from fastapi.testclient import TestClient
+            from backend import main
+            self.main = main
+            main.recommendation_engine._model = self.encoder
+            self.client = TestClient(main.app)
+            self.client.__enter__()
+            deadline = time.time() + 600
+            while not main.startup.ready and main.startup.error is None and time.time() < deadline:
+                time.sleep(0.05)
+            if not main.startup.ready:
+                raise RuntimeError(f"Service did not become ready: {main.startup.error}")
+        else:
+            self.main.recommendation_engine.set_sales_store(store)
+            self.main.recommendation_engine.set_sales_counters(None)
+            self.main.recommendation_engine.query_cache.clear()
+            self.main.recommendation_engine.reload_index()
+
+    def get(self, path: str, **params) -> int:
+        return self.client.get(path, params=params).status_code
+
+    def post(self, path: str, body: Any) -> int:
+        return self.client.post(path, json=body).status_code
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.__exit__(None, None, None)
+
+
+def run_benchmarks(sizes: Iterable[int], concurrency: Iterable[int], dim: int = DEFAULT_DIM,
+                   ops: int = DEFAULT_OPS, http: bool = True, ingest_max: int = 100000) -> Dict[str, Any]:
+    encoder = StubEncoder(dim)
+    concurrency = list(concurrency)
+    queries = make_queries(ops * max(concurrency))
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="benchmark-")
+    harness = HttpHarness(work_dir, encoder) if http else None
+    try:
+        for size in sizes:
+            started = time.perf_counter()
+            catalog = SyntheticCatalog(size, encoder)
+            index_dir = os.path.join(work_dir, f"index-{size}")
+            catalog.write_index(index_dir)
+            backend = MmapBackend(index_dir)
+            print(f"\nCatalog of {size} products x {dim} dims built in {time.perf_counter() - started:.1f}s")
+
+            query_vectors = encoder.encode(queries[:ops], normalize_embeddings=True)
+            metadatas = [catalog.metadata(i) for i in range(min(size, 1000))]
+            suggestions = SuggestionIndex.from_metadatas(metadatas)
+            lexical = LexicalIndex([catalog.metadata(i) for i in range(size)])
+            velocity = catalog.units_sold.astype(np.float64) / 30
+            ranking = RankingConfig()
+            candidates = 10 * ranking.candidate_multiplier
+
+            for c in concurrency:
+                batcher = MicroBatchEncoder(encoder)
+                results.append(measure("encode", lambda q: batcher.encode([q]), queries[:ops], c, size))
+                batcher.close()
+                results.append(measure("vector_search", lambda v: backend.search(v[np.newaxis, :], candidates),
+                                       list(query_vectors), c, size))
+                hits = backend.search(query_vectors[:ops], candidates)
+                rank_inputs = [(s, np.array([velocity[m["id"]] for m in hit]),
+                                np.array([m["price"] for m in hit])) for s, hit in hits]
+                results.append(measure("rerank", lambda x: rank(x[0], x[1], x[2], 10, ranking),
+                                       rank_inputs, c, size))
+                results.append(measure("lexical_search", lambda q: lexical.search(q, candidates),
+                                       [q.split()[0] for q in queries[:ops]], c, size))
+                results.append(measure("suggestions_index", lambda q: suggestions.suggest(q[:3], 5),
+                                       queries[:ops], c, size))
+
+            if size <= ingest_max:
+                results.append(bench_ingest(catalog))
+
+            if harness is not None:
+                harness.load(catalog)
+                harness.main.recommendation_engine.query_cache.clear()
+                offset = 0
+                for c in concurrency:
+                    batch = queries[offset:offset + ops]
+                    offset += ops
+                    results.append(measure("http_recommendations",
+                                           lambda q: harness.get("/recommendations", query=q),
+                                           batch, c, size, is_error=lambda status: status != 200))
+                    chunks = [{"queries": [{"query": q} for q in batch[i:i + BATCH_QUERIES]]}
+                              for i in range(0, len(batch), BATCH_QUERIES)]
+                    results.append(measure("http_recommendations_batch",
+                                           lambda body: harness.post("/recommendations/batch", body),
+                                           chunks, c, size, is_error=lambda status: status != 200))
+                    results.append(measure("http_suggestions", lambda q: harness.get("/suggestions", query=q[:4]),
+                                           batch, c, size, is_error=lambda status: status != 200))
+            del backend
+            shutil.rmtree(index_dir, ignore_errors=True)
+    finally:
+        if harness is not None:
+            harness.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "dim": dim,
+            "ops": ops,
+            "sizes": list(sizes),
+            "concurrency": concurrency,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    return f"{result['benchmark']}/n={result['catalog_size']}/c={result['concurrency']}"
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """Describe every benchmark whose p95 latency rose or throughput fell by more than `threshold`."""
+    previous = {result_key(result): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(result_key(result))
+        if before is None:
+            continue
+        if "p95_ms" in result and "p95_ms" in before and result["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{result_key(result)}: p95 {before['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms")
+        if result["qps"] < before["qps"] * (1 - threshold):
+            regressions.append(f"{result_key(result)}: qps {before['qps']:.1f} -> {result['qps']:.1f}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmarks with a stub encoder.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Catalog sizes to benchmark (1000000 needs ~4 GB of disk at 1024 dims).")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--ops", type=int, default=DEFAULT_OPS, help="Operations per benchmark and concurrency.")
+    parser.add_argument("--no-http", action="store_true", help="Skip the in-process HTTP benchmarks.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Compare against a saved results file and exit 1 on regression.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative p95/QPS change before a result counts as a regression.")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results to --baseline.")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.concurrency, args.dim, args.ops, http=not args.no_http)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        if args.save_baseline or not os.path.exists(args.baseline):
+            shutil.copyfile(args.output, args.baseline)
+            print(f"Baseline saved to {args.baseline}")
+        else:
+            with open(args.baseline, encoding="utf-8") as f:
+                regressions = compare(report, json.load(f), args.threshold)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            print(f"{len(regressions)} regressions beyond {args.threshold:.0%} against {args.baseline}")
+            sys.exit(1 if regressions else 0)
@@ -1,25 +1,54 @@
 import os
+import sys
 import json
-import numpy as np
-from tqdm import tqdm
+import argparse
 import chromadb
-from sentence_transformers import SentenceTransformer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import config
+from backend.recommendation_engine.encoders import load_encoder
+from backend.recommendation_engine.metadata import MULTI_VALUE_SEPARATOR
+from rag.embedding_store import EmbeddingStore
+from rag.ingest import DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, iter_chunks, iter_products, run_pipeline
 
 EMBEDDINGS_FILE = "data/product_embeddings.npy"
 PRODUCTS_FILE = "data/products.json"
 CHROMA_DB_DIR = "rag/knowledge_base/chroma_db"
+MODEL_NAME = "BAAI/bge-large-en-v1.5"
+
+REQUIRED_FIELDS = ["id", "name", "effects", "ingredients", "description"]
 
-def load_products():
+def load_products(path=PRODUCTS_FILE):
     print("Loading product data...")
-    with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
+    with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 def setup_chroma_db():
     print("Initializing ChromaDB...")
     return chromadb.PersistentClient(path=CHROMA_DB_DIR)
 
-def populate_chroma_db(products, collection_name="products"):
-    model = SentenceTransformer('BAAI/bge-large-en-v1.5')
+def validate_product(product):
+    for field in REQUIRED_FIELDS:
+        if field not in product:
+            raise ValueError(f"Missing required field {field} in product {product.get('id','unknown')}")
+
+def format_metadata(product):
+    return {
+        "id": str(product["id"]),
+        "name": product["name"],
+        "effects": MULTI_VALUE_SEPARATOR.join(product["effects"]),
+        "ingredients": MULTI_VALUE_SEPARATOR.join(product["ingredients"]),
+        "price": float(product["price"]),
+        "description": product["description"],
+        "type": product["type"],
+        "sales_velocity": float(product.get("sales_data", {}).get("units_sold", 0.0)) / 30
+    }
+
+def populate_chroma_db(products, collection_name="products", chunk_size=DEFAULT_CHUNK_SIZE,
+                       batch_size=DEFAULT_BATCH_SIZE, total=None):
+    """Rebuild the collection, encoding `chunk_size` products at a time and writing each chunk in bulk."""
+    model = load_encoder(MODEL_NAME, **config.encoder_options())
+    store = EmbeddingStore(model.name, normalize=True)
     client = setup_chroma_db()
     
     try:
@@ -31,40 +60,34 @@ def populate_chroma_db(products, collection_name="products"):
         name=collection_name,
         metadata={"hnsw:space": "cosine"}
     )
+    chunk_size = min(chunk_size, client.get_max_batch_size())
+    if total is None and hasattr(products, "__len__"):
+        total = len(products)
 
-    print("Storing product data in ChromaDB...")
-    for product in tqdm(products):
-        # Data validation
-        required_fields = ["id", "name", "effects", "ingredients", "description"]
-        for field in required_fields:
-            if field not in product:
-                raise ValueError(f"Missing required field {field} in product {product.get('id','unknown')}")
-
-        # Generate embedding
-        text_to_embed = f"{product['name']}: {product['description']}"
-        embedding = model.encode(text_to_embed, normalize_embeddings=True).tolist()
-        
-        # Format metadata
-        formatted_meta = {
-            "id": str(product["id"]),
-            "name": product["name"],
-            "effects": "|||".join(product["effects"]),
-            "ingredients": "|||".join(product["ingredients"]),
-            "price": float(product["price"]),
-            "description": product["description"],
-            "type": product["type"],
-            "sales_velocity": float(product.get("sales_data", {}).get("last_month_revenue", 0.0))
-        }
+    def encode(chunk):
+        for product in chunk:
+            validate_product(product)
+        texts = [f"{product['name']}: {product['description']}" for product in chunk]
+        return store.encode(model, texts, batch_size=batch_size)
 
-        # Add to collection
+    def write(chunk, embeddings):
+        metadatas = [format_metadata(product) for product in chunk]
         collection.add(
-            ids=[formatted_meta["id"]],
-            embeddings=[embedding],
-            metadatas=[formatted_meta]
+            ids=[meta["id"] for meta in metadatas],
+            embeddings=embeddings.tolist(),
+            metadatas=metadatas
         )
 
-    print(f"ChromaDB updated with {len(products)} products")
+    print("Storing product data in ChromaDB...")
+    stats = run_pipeline(iter_chunks(products, chunk_size), encode, write, total=total, desc="ChromaDB ingest")
+    print(f"ChromaDB updated with {stats['documents']} products")
+    return stats
 
 if __name__ == '__main__':
-    products = load_products()
-    populate_chroma_db(products)
+    parser = argparse.ArgumentParser(description="Rebuild the ChromaDB product collection.")
+    parser.add_argument("--products", default=PRODUCTS_FILE,
+                        help="products JSON array, JSONL file or directory of JSONL chunks")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    populate_chroma_db(iter_products(args.products), chunk_size=args.chunk_size, batch_size=args.batch_size)
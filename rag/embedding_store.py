@@ -0,0 +1,245 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STORE_DIR = os.path.join(BASE_DIR, 'rag', 'knowledge_base', 'embedding_store')
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.bin"
+META_FILE = "meta.json"
+LOCK_FILE = ".lock"
+KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    """Truncated SHA-256 of the embedded text."""
+    return hashlib.sha256(text.encode("utf-8")).digest()[:KEY_BYTES]
+
+
+class EmbeddingStore:
+    """Persistent embedding cache keyed by (model name, normalization flag, text hash).
+
+    Each (model, normalize) pair gets its own directory holding an append-only
+    float32 matrix and an append-only file of 16-byte text keys, where record i
+    of the index names row i of the matrix. Lookups go through a memory map, so
+    any number of indexing processes can share one store.
+    """
+
+    def __init__(self, model_name: str, normalize: bool, root: str = DEFAULT_STORE_DIR):
+        self.model_name = model_name
+        self.normalize = bool(normalize)
+        self.namespace = hashlib.sha1(f"{model_name}|{self.normalize}".encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(root, self.namespace)
+        os.makedirs(self.path, exist_ok=True)
+        self.dim: Optional[int] = None
+        self._keys: Dict[bytes, int] = {}
+        self._rows = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._index_inode: Optional[int] = None  # compaction replaces the files, changing it
+        self._lock = threading.Lock()
+        with self._file_lock():
+            self._load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self._file(LOCK_FILE), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self) -> None:
+        """Read the key index and map the matrix, trimming any torn trailing append."""
+        meta_path = self._file(META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                self.dim = json.load(f).get("dim")
+        if not self.dim:
+            self._keys, self._rows, self._vectors, self._index_inode = {}, 0, None, None
+            return
+
+        index_path, vectors_path = self._file(INDEX_FILE), self._file(VECTORS_FILE)
+        self._index_inode = os.stat(index_path).st_ino if os.path.exists(index_path) else None
+        index_rows = os.path.getsize(index_path) // KEY_BYTES if os.path.exists(index_path) else 0
+        vector_rows = os.path.getsize(vectors_path) // (4 * self.dim) if os.path.exists(vectors_path) else 0
+        rows = min(index_rows, vector_rows)
+        for path, row_bytes in ((index_path, KEY_BYTES), (vectors_path, 4 * self.dim)):
+            if os.path.exists(path) and os.path.getsize(path) != rows * row_bytes:
+                os.truncate(path, rows * row_bytes)
+
+        keys = np.fromfile(index_path, dtype=f"S{KEY_BYTES}", count=rows) if rows else []
+        # Later rows supersede earlier ones with the same key.
+        self._keys = {bytes(key).ljust(KEY_BYTES, b"\0"): row for row, key in enumerate(keys)}
+        self._rows = rows
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def _catch_up(self) -> None:
+        """Index rows appended by other processes since the last load; call with the file lock held.
+
+        Reloads from scratch when the files were rewritten (another process
+        compacted them) or shrank, since the old row offsets no longer apply.
+        """
+        if not self.dim:
+            return self._load()
+        index_path, vectors_path = self._file(INDEX_FILE), self._file(VECTORS_FILE)
+        index_stat = os.stat(index_path) if os.path.exists(index_path) else None
+        index_rows = index_stat.st_size // KEY_BYTES if index_stat else 0
+        vector_rows = os.path.getsize(vectors_path) // (4 * self.dim) if os.path.exists(vectors_path) else 0
+        inode = index_stat.st_ino if index_stat else None
+        if index_rows != vector_rows or index_rows < self._rows or inode != self._index_inode:
+            return self._load()
+        if index_rows == self._rows:
+            return
+        with open(index_path, "rb") as f:
+            f.seek(self._rows * KEY_BYTES)
+            tail = f.read((index_rows - self._rows) * KEY_BYTES)
+        for offset in range(0, len(tail), KEY_BYTES):
+            self._keys[tail[offset:offset + KEY_BYTES]] = self._rows + offset // KEY_BYTES
+        self._rows = index_rows
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(index_rows, self.dim))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get_many(self, texts: Sequence[str]) -> Tuple[Optional[np.ndarray], List[int]]:
+        """Return (embeddings with found rows filled in, positions of texts that were not found)."""
+        with self._lock:
+            # Rows other processes appended (or a compaction they ran) since we last looked.
+            with self._file_lock():
+                self._catch_up()
+            rows = [self._keys.get(text_key(text), -1) for text in texts]
+            if self.dim is None:
+                return None, list(range(len(texts)))
+            embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+            found = [i for i, row in enumerate(rows) if row >= 0]
+            if found:
+                embeddings[found] = self._vectors[[rows[i] for i in found]]
+        return embeddings, [i for i, row in enumerate(rows) if row < 0]
+
+    def put_many(self, texts: Sequence[str], embeddings: np.ndarray) -> int:
+        """Append embeddings for texts not already stored; returns the number of rows written."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(texts) != len(embeddings):
+            raise ValueError(f"{len(texts)} texts but {len(embeddings)} embeddings")
+        with self._lock, self._file_lock():
+            # Pick up rows other processes appended since we last looked.
+            self._catch_up()
+            if self.dim is None:
+                self.dim = int(embeddings.shape[1])
+                with open(self._file(META_FILE), "w", encoding="utf-8") as f:
+                    json.dump({"model_name": self.model_name, "normalize": self.normalize, "dim": self.dim}, f)
+            elif embeddings.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dim embeddings, got {embeddings.shape[1]}")
+
+            new_keys, new_rows = [], []
+            seen = set()
+            for i, text in enumerate(texts):
+                key = text_key(text)
+                if key not in self._keys and key not in seen:
+                    seen.add(key)
+                    new_keys.append(key)
+                    new_rows.append(i)
+            if not new_keys:
+                return 0
+            # Vectors first: a crash between the two writes leaves an orphan row that _load trims.
+            with open(self._file(VECTORS_FILE), "ab") as f:
+                f.write(np.ascontiguousarray(embeddings[new_rows]).tobytes())
+            with open(self._file(INDEX_FILE), "ab") as f:
+                f.write(b"".join(new_keys))
+            self._catch_up()
+            return len(new_keys)
+
+    def encode(self, model: Any, texts: Sequence[str], batch_size: int = 64) -> np.ndarray:
+        """Embed texts, calling `model.encode` only for texts missing from the store."""
+        texts = list(texts)
+        embeddings, missing = self.get_many(texts)
+        if missing:
+            encoded = np.asarray(model.encode([texts[i] for i in missing], batch_size=batch_size,
+                                              normalize_embeddings=self.normalize), dtype=np.float32)
+            self.put_many([texts[i] for i in missing], encoded)
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), encoded.shape[1]), dtype=np.float32)
+            embeddings[missing] = encoded
+        elif embeddings is None:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        return embeddings
+
+    def compact(self, keep_texts: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Rewrite the store without superseded rows, and optionally without texts outside `keep_texts`."""
+        keep = None if keep_texts is None else {text_key(text) for text in keep_texts}
+        with self._lock, self._file_lock():
+            self._load()
+            before = self._rows
+            if not self.dim:
+                return {"rows_before": 0, "rows_after": 0}
+            live = sorted((row, key) for key, row in self._keys.items() if keep is None or key in keep)
+            rows = [row for row, _ in live]
+            index_path, vectors_path = self._file(INDEX_FILE), self._file(VECTORS_FILE)
+            with open(vectors_path + ".tmp", "wb") as f:
+                if rows:
+                    f.write(np.ascontiguousarray(self._vectors[rows]).tobytes())
+            with open(index_path + ".tmp", "wb") as f:
+                f.write(b"".join(key for _, key in live))
+            self._vectors = None
+            os.replace(vectors_path + ".tmp", vectors_path)
+            os.replace(index_path + ".tmp", index_path)
+            self._load()
+            return {"rows_before": before, "rows_after": self._rows}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            vectors_path = self._file(VECTORS_FILE)
+            return {
+                "namespace": self.namespace,
+                "model_name": self.model_name,
+                "normalize": self.normalize,
+                "dim": self.dim,
+                "entries": len(self._keys),
+                "rows": self._rows,
+                "dead_rows": self._rows - len(self._keys),
+                "bytes": os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0,
+            }
+
+
+def open_stores(root: str = DEFAULT_STORE_DIR) -> List[EmbeddingStore]:
+    """Open every namespace found under `root`."""
+    stores = []
+    if not os.path.isdir(root):
+        return stores
+    for namespace in sorted(os.listdir(root)):
+        meta_path = os.path.join(root, namespace, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            stores.append(EmbeddingStore(meta["model_name"], meta["normalize"], root))
+    return stores
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or compact the persistent embedding store.")
+    parser.add_argument("command", choices=["stats", "compact"])
+    parser.add_argument("--root", default=DEFAULT_STORE_DIR)
+    args = parser.parse_args()
+
+    for store in open_stores(args.root):
+        if args.command == "compact":
+            print(store.namespace, store.compact())
+        print(json.dumps(store.stats()))
@@ -1,8 +1,7 @@
 import os
+import sys
 import json
-from tqdm import tqdm
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 # Define file paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -10,37 +9,54 @@ PRODUCTS_FILE = os.path.join(BASE_DIR, 'data', 'products.json')
 EMBEDDINGS_FILE = os.path.join(BASE_DIR, 'rag', 'knowledge_base', 'product_embeddings.npy')
 METADATA_FILE = os.path.join(BASE_DIR, 'rag', 'knowledge_base', 'product_metadata.json')
 
+sys.path.append(BASE_DIR)
+from backend import config
+from backend.recommendation_engine.encoders import load_encoder
+from rag.embedding_store import EmbeddingStore
+from rag.ingest import DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, iter_chunks, run_pipeline
+
 # Load product data
 def load_product_data(file_path: str):
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 # Generate embeddings for product descriptions
-def generate_embeddings(model_name: str = 'BAAI/bge-large-en-v1.5'):
+def generate_embeddings(model_name: str = 'BAAI/bge-large-en-v1.5', chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        batch_size: int = DEFAULT_BATCH_SIZE):
     print("Loading product data...")
     products = load_product_data(PRODUCTS_FILE)
 
     descriptions = [product['description'] for product in products]
-    product_ids = [product['id'] for product in products]
     metadata = [{'id': product['id'], 'name': product['name']} for product in products]
 
     # Load the embedding model
     print(f"Loading model '{model_name}'...")
-    model = SentenceTransformer(model_name)
+    model = load_encoder(model_name, **config.encoder_options())
+    dim = model.get_sentence_embedding_dimension()
+    store = EmbeddingStore(model.name, normalize=False)
 
-    # Generate embeddings with progress indicator
-    print("Generating embeddings...")
-    embeddings = []
-    for desc in tqdm(descriptions, desc="Embedding Descriptions", unit="desc"):
-        embedding = model.encode(desc)
-        embeddings.append(embedding)
+    # Stream chunks straight into the output file instead of stacking a list of arrays
+    os.makedirs(os.path.dirname(EMBEDDINGS_FILE), exist_ok=True)
+    embeddings = np.lib.format.open_memmap(EMBEDDINGS_FILE, mode='w+', dtype=np.float32,
+                                           shape=(len(descriptions), dim))
+    offset = 0
 
-    # Convert to numpy array for efficient storage
-    embeddings = np.array(embeddings)
+    def write(chunk, chunk_embeddings):
+        nonlocal offset
+        embeddings[offset:offset + len(chunk)] = chunk_embeddings
+        offset += len(chunk)
+
+    print("Generating embeddings...")
+    run_pipeline(
+        iter_chunks(descriptions, chunk_size),
+        lambda chunk: store.encode(model, chunk, batch_size=batch_size),
+        write,
+        total=len(descriptions),
+        desc="Embedding Descriptions"
+    )
+    embeddings.flush()
+    del embeddings
 
-    # Save embeddings and metadata
-    os.makedirs(os.path.dirname(EMBEDDINGS_FILE), exist_ok=True)
-    np.save(EMBEDDINGS_FILE, embeddings)
     with open(METADATA_FILE, 'w', encoding='utf-8') as f:
         json.dump(metadata, f, indent=2)
 
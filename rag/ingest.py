@@ -0,0 +1,79 @@
+import glob
+import json
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from tqdm import tqdm
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_BATCH_SIZE = 64
+
+
+def iter_products(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield products from a JSON array, a JSONL file or a directory of JSONL chunks."""
+    if os.path.isdir(path):
+        for chunk_path in sorted(glob.glob(os.path.join(path, "*.jsonl"))):
+            yield from iter_products(chunk_path)
+    elif path.endswith(".jsonl"):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+
+
+def iter_chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most `size` items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_pipeline(chunks: Iterable[List[Any]],
+                 encode: Callable[[List[Any]], np.ndarray],
+                 write: Callable[[List[Any], np.ndarray], None],
+                 total: Optional[int] = None,
+                 desc: str = "Indexing") -> Dict[str, float]:
+    """Encode chunks on the calling thread while the previous chunk is written in the background.
+
+    At most one write is in flight, so memory stays bounded by two chunks and
+    writes land in input order.
+    """
+    started = time.perf_counter()
+    encode_seconds = 0.0
+    count = 0
+    pending: Optional[Future] = None
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer") as writer, \
+            tqdm(total=total, desc=desc, unit="doc") as progress:
+        for chunk in chunks:
+            encode_started = time.perf_counter()
+            embeddings = encode(chunk)
+            encode_seconds += time.perf_counter() - encode_started
+            if pending is not None:
+                pending.result()
+            pending = writer.submit(write, chunk, embeddings)
+            count += len(chunk)
+            progress.update(len(chunk))
+        if pending is not None:
+            pending.result()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "documents": count,
+        "seconds": elapsed,
+        "encode_seconds": encode_seconds,
+        "docs_per_second": count / elapsed if elapsed > 0 else 0.0,
+    }
+    print(f"{desc}: {count} documents in {elapsed:.1f}s ({stats['docs_per_second']:.1f} docs/sec, "
+          f"{encode_seconds:.1f}s encoding)")
+    return stats
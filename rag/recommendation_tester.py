@@ -1,9 +1,11 @@
 import pandas as pd
 import json
 import os
-from tqdm import tqdm
+import sys
 from tabulate import tabulate
-from rag.recommendation_engine import RecommendationEngine
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.recommendation_engine.recommender import RecommendationEngine
 
 RESULTS_FILE = "recommendation_test_results_advanced.csv"
 
@@ -18,23 +20,23 @@ test_queries = [
 
 WEIGHTS = {
     "similarity_score": 0.5,
-    "units_sold": 0.2,
-    "revenue": 0.2,
+    "sales_velocity": 0.2,
+    "revenue_velocity": 0.2,
     "price": 0.1
 }
 
 def calculate_weighted_score(row, weights):
     return (
         row["similarity_score"] * weights["similarity_score"] +
-        row["units_sold"] * weights["units_sold"] +
-        row["revenue"] * weights["revenue"] +
-        (1 / row["price"]) * weights["price"]
+        row["sales_velocity"] * weights["sales_velocity"] +
+        row["revenue_velocity"] * weights["revenue_velocity"] +
+        (1 / row["price"] if row["price"] else 0) * weights["price"]
     )
 
 results = []
 print("Testing recommendation engine with various queries...")
-for query in tqdm(test_queries, desc="Testing Queries"):
-    recommendations = recommendation_engine.get_recommendations(query)
+batch = recommendation_engine.get_recommendations_batch(test_queries)
+for query, recommendations in zip(test_queries, batch):
     for rec in recommendations:
         results.append({
             "query": query,
@@ -42,9 +44,10 @@ for query in tqdm(test_queries, desc="Testing Queries"):
             "product_name": rec["name"],
             "description": rec["description"],
             "price": rec["price"],
-            "units_sold": rec["sales_data"]["units_sold"],
-            "revenue": rec["sales_data"]["last_month_revenue"],
-            "similarity_score": rec.get("similarity_score", 1.0)
+            "sales_velocity": rec["sales_velocity"],
+            "revenue_velocity": rec["sales_velocity"] * rec["price"],
+            "similarity_score": rec.get("similarity_score", 1.0),
+            "engine_score": rec["weighted_score"]
         })
 
 df = pd.DataFrame(results)
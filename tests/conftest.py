@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+
+class StaticEncoder:
+    """Query encoder double returning a fixed vector per query text."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def encode(self, texts):
+        return np.stack([self.vectors[text] for text in texts]).astype(np.float32)
+
+
+def unit_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """RecommendationEngine over an mmap index of the given vectors, with a static query encoder."""
+    pytest.importorskip("chromadb")
+    from backend.recommendation_engine.recommender import RecommendationEngine
+    from backend.recommendation_engine.retrieval import write_mmap_index
+
+    def make(embeddings, metadatas, queries=None, **options):
+        index_dir = str(tmp_path / "index")
+        write_mmap_index(index_dir, embeddings, metadatas)
+        options.setdefault("query_cache_size", 0)
+        engine = RecommendationEngine(retrieval_backend="mmap", retrieval_options={"index_dir": index_dir}, **options)
+        if queries is not None:
+            engine._query_encoder = StaticEncoder(queries)
+        return engine
+
+    return make
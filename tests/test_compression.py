@@ -0,0 +1,54 @@
+import numpy as np
+
+from backend.recommendation_engine.compression import EmbeddingCodec, evaluate, exact_top_k, recall_at_k
+from backend.recommendation_engine.retrieval import MmapBackend, write_mmap_index
+
+
+def _unit(rng, rows, dims):
+    matrix = rng.normal(size=(rows, dims)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _clustered(rng, rows=2000, dims=64, clusters=20):
+    """Catalog-like vectors: noisy points around a few topic centers."""
+    centers = rng.normal(size=(clusters, dims))
+    matrix = centers[rng.integers(0, clusters, rows)] + 0.5 * rng.normal(size=(rows, dims))
+    return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_pca_on_small_catalog_keeps_available_components():
+    embeddings = _unit(np.random.default_rng(0), 20, 64)
+    codec = EmbeddingCodec.fit(embeddings, "int8", 32, "pca")
+    assert codec.dims == 20
+    codes = codec.encode_all(embeddings)
+    assert codes.shape == (20, 20)
+    assert codec.query_weights(embeddings[:2]).shape == (2, 20)
+
+
+def test_compressed_search_recall():
+    embeddings = _clustered(np.random.default_rng(0))
+    configs = [{"dtype": "float16"}, {"dtype": "int8"},
+               {"dtype": "int8", "dims": 32, "projection": "pca"}, {"dtype": "int8", "dims": 32, "projection": "prefix"}]
+    report = {row["codec"]: row for row in evaluate(embeddings, configs, num_queries=100)}
+    for codec in ("float16-prefix64", "int8-prefix64"):
+        assert report[codec]["recall@10"] >= 0.95
+        assert report[codec]["recall@10_rescored"] >= 0.99
+    assert report["int8-pca32"]["bytes_per_vector"] == 32
+    assert report["int8-pca32"]["recall@10_rescored"] >= 0.9
+    assert report["int8-pca32"]["recall@10_rescored"] > report["int8-prefix32"]["recall@10_rescored"]
+
+
+def test_compressed_mmap_backend_matches_exact_search(tmp_path):
+    rng = np.random.default_rng(1)
+    embeddings = _clustered(rng)
+    write_mmap_index(str(tmp_path), embeddings, [{"id": i} for i in range(len(embeddings))])
+    backend = MmapBackend(str(tmp_path), compressed_dtype="int8")
+    queries = _unit(rng, 50, embeddings.shape[1])
+    truth = exact_top_k(embeddings, queries, 10)
+    truth = [row[np.argsort(-(embeddings[row] @ query))] for query, row in zip(queries, truth)]
+    hits = backend.search(queries, 10)
+    found = [np.array([meta["id"] for meta in metadatas]) for _, metadatas in hits]
+    assert recall_at_k(truth, found, 10) >= 0.99
+    # Rescoring reports full-precision cosines.
+    for (similarity, _), rows, query in zip(hits, found, queries):
+        assert np.allclose(similarity, embeddings[rows] @ query, atol=1e-5)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnxscript")
+
+from backend.recommendation_engine.encoders import BACKENDS, TextEncoder, build_tiny_model
+
+SENTENCES = ["calm sleep tea", "energy focus ginseng", "lavender oil for deep sleep", "chamomile"]
+
+
+@pytest.fixture(scope="module")
+def tiny_model(tmp_path_factory):
+    return build_tiny_model(str(tmp_path_factory.mktemp("tiny")), SENTENCES, hidden_size=64, layers=2)
+
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("onnx"))
+
+
+def test_backends_agree_with_torch(tiny_model, onnx_dir):
+    expected = TextEncoder(tiny_model, "torch").encode(SENTENCES)
+    for backend in BACKENDS:
+        embeddings = TextEncoder(tiny_model, backend, onnx_dir=onnx_dir).encode(SENTENCES)
+        assert embeddings.shape == expected.shape
+        cosine = np.sum(embeddings * expected, axis=1)
+        assert cosine.min() > 0.99, backend
+
+
+def test_onnx_export_handles_unseen_batch_and_sequence_sizes(tiny_model, onnx_dir):
+    encoder = TextEncoder(tiny_model, "onnx", onnx_dir=onnx_dir)
+    texts = SENTENCES * 3 + [" ".join(SENTENCES * 4)]
+    embeddings = encoder.encode(texts, batch_size=5)
+    assert embeddings.shape == (len(texts), encoder.dim)
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-5)
@@ -0,0 +1,104 @@
+import numpy as np
+
+from backend.recommendation_engine.filter_index import FilterIndex, ProductFilters
+from backend.recommendation_engine.metadata import MULTI_VALUE_SEPARATOR
+from conftest import unit_rows
+
+N = 200
+
+
+def catalog():
+    metadatas = []
+    for i in range(N):
+        effects = ["sleep"] + (["focus"] if i % 3 == 0 else [])
+        metadatas.append({"id": i, "name": f"Product {i}", "type": "Balm" if i < 3 else ("Tea" if i % 2 else "Oil"),
+                          "effects": MULTI_VALUE_SEPARATOR.join(effects), "ingredients": "mint", "price": float(i)})
+    return metadatas
+
+
+def expected_rows(filters):
+    return [i for i, meta in enumerate(catalog())
+            if (not filters.types or meta["type"].lower() in {t.lower() for t in filters.types})
+            and all(effect in meta["effects"].split(MULTI_VALUE_SEPARATOR) for effect in filters.effects)
+            and (filters.min_price is None or meta["price"] >= filters.min_price)
+            and (filters.max_price is None or meta["price"] <= filters.max_price)]
+
+
+def test_match_combines_constraints():
+    index = FilterIndex(catalog())
+    for filters in (ProductFilters(types=("tea", "BALM")), ProductFilters(effects=("sleep", "focus")),
+                    ProductFilters(types=("Oil",), effects=("focus",), min_price=10, max_price=60),
+                    ProductFilters(max_price=4.5)):
+        assert index.rows(index.match(filters)).tolist() == expected_rows(filters)
+    assert index.count(index.match(ProductFilters(effects=("sleep", "calm")))) == 0
+    assert index.stored_types(("tea", "unknown")) == ("Tea",)
+    assert 5 in index and "5" in index and 999 not in index
+
+
+class Spy:
+    """Records which retrieval calls the engine makes."""
+
+    def __init__(self, retriever):
+        self.retriever = retriever
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.retriever, name)
+        if name not in ("search", "search_subset"):
+            return method
+
+        def call(*args, **kwargs):
+            self.calls.append(name)
+            return method(*args, **kwargs)
+
+        return call
+
+
+def filtered_engine(make_engine, embeddings):
+    engine = make_engine(embeddings, catalog(), prefilter_max_rows=10, prefilter_selectivity=0.05)
+    engine._retriever = Spy(engine.retriever)
+    return engine
+
+
+def random_embeddings():
+    return unit_rows(np.random.default_rng(0).normal(size=(N, 8)))
+
+
+def exact_ids(embeddings, query, rows, k):
+    scores = embeddings[rows] @ query[0]
+    return [rows[i] for i in np.argsort(-scores, kind="stable")[:k]]
+
+
+def test_selective_filter_scores_only_matching_rows(make_engine):
+    embeddings = random_embeddings()
+    engine = filtered_engine(make_engine, embeddings)
+    query = unit_rows(np.ones((1, 8)))
+    filters = ProductFilters(types=("balm",))
+    (similarity, metadatas), = engine._filtered_search(query, 5, filters)
+    assert engine.retriever.calls == ["search_subset"]
+    assert [meta["id"] for meta in metadatas] == exact_ids(embeddings, query, expected_rows(filters), 5)
+
+
+def test_broad_filter_post_filters_an_oversampled_search(make_engine):
+    embeddings = random_embeddings()
+    engine = filtered_engine(make_engine, embeddings)
+    query = unit_rows(np.random.default_rng(1).normal(size=(1, 8)))
+    filters = ProductFilters(effects=("sleep",), max_price=150)
+    (similarity, metadatas), = engine._filtered_search(query, 5, filters)
+    assert engine.retriever.calls == ["search"]
+    assert [meta["id"] for meta in metadatas] == exact_ids(embeddings, query, expected_rows(filters), 5)
+    assert np.all(np.diff(similarity) <= 0)
+
+
+def test_broad_filter_falls_back_to_prefilter_when_too_few_survive(make_engine):
+    # Oil products cluster on one axis and Tea products on another; a query on the Oil
+    # axis filtered to Tea finds no survivors among its oversampled hits.
+    rng = np.random.default_rng(2)
+    embeddings = unit_rows(np.where(np.arange(N)[:, np.newaxis] % 2 == 0, np.eye(8)[0], np.eye(8)[1])
+                           + 0.1 * rng.normal(size=(N, 8)))
+    engine = filtered_engine(make_engine, embeddings)
+    query = unit_rows(np.eye(8)[:1])
+    filters = ProductFilters(types=("tea",), effects=("focus",))
+    (similarity, metadatas), = engine._filtered_search(query, 5, filters)
+    assert engine.retriever.calls == ["search", "search_subset"]
+    assert [meta["id"] for meta in metadatas] == exact_ids(embeddings, query, expected_rows(filters), 5)
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from backend.recommendation_engine.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from backend.recommendation_engine.metadata import MULTI_VALUE_SEPARATOR
+from conftest import unit_rows
+
+METADATAS = [
+    {"id": 0, "name": "Night Tea", "type": "Tea", "effects": "sleep", "ingredients": "chamomile",
+     "description": "A calming blend."},
+    {"id": 1, "name": "Sleep Well Oil", "type": "Oil", "effects": "relaxation", "ingredients": "lavender",
+     "description": "Mentions sleep in the name only."},
+    {"id": 2, "name": "Morning Capsules", "type": "Capsules", "effects": MULTI_VALUE_SEPARATOR.join(["focus", "energy"]),
+     "ingredients": "ginseng", "description": "Energy for the day."},
+    {"id": 3, "name": "Calm Drops", "type": "Oil", "effects": MULTI_VALUE_SEPARATOR.join(["sleep", "relaxation"]),
+     "ingredients": MULTI_VALUE_SEPARATOR.join(["lavender", "chamomile"]), "description": "Drops for sleep."},
+]
+
+
+def test_vocabulary_phrase_ranks_attribute_carriers_first():
+    index = LexicalIndex(METADATAS)
+    scores, positions = index.search("Sleep", 10)
+    assert set(positions[:2].tolist()) == {0, 3}
+    assert positions[2] == 1
+    assert np.all(np.diff(scores) <= 0)
+    assert index.is_vocabulary("sleep") and not index.is_vocabulary("sleep well")
+
+
+def test_multi_term_search_and_allowed_mask():
+    index = LexicalIndex(METADATAS)
+    scores, positions = index.search("lavender chamomile", 10)
+    assert positions[0] == 3 and set(positions.tolist()) == {0, 1, 3}
+    allowed = np.array([True, True, False, False])
+    assert set(index.search("lavender chamomile", 10, allowed)[1].tolist()) == {0, 1}
+    assert len(index.search("unknown words", 10)[0]) == 0
+
+
+def test_keyword_queries_need_known_terms_with_enough_matches():
+    index = LexicalIndex(METADATAS)
+    assert index.is_keyword_query("lavender", 50)  # vocabulary, whatever the match count
+    assert index.match_count("energy day") == 1
+    assert index.is_keyword_query("energy day", 1)
+    assert not index.is_keyword_query("energy day", 2)
+    assert not index.is_keyword_query("lavender mystery", 1)
+    assert index.match_count("energy focus ginseng", max_terms=2) == 0
+
+
+def test_reciprocal_rank_fusion():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60))
+    assert fused["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused["c"] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused["b"] == pytest.approx(1 / 62)
+    assert list(fused) == ["a", "c", "b"]
+
+
+@pytest.fixture
+def routed_engine(make_engine):
+    from backend.recommendation_engine.ranking import RankingConfig
+
+    rng = np.random.default_rng(0)
+    embeddings = unit_rows(rng.normal(size=(len(METADATAS), 8)))
+    queries = {"sleep": unit_rows(embeddings[1] + embeddings[2]),
+               "something calming for the evening": unit_rows(embeddings[2] + 0.5 * embeddings[0])}
+    engine = make_engine(embeddings, METADATAS, queries,
+                         ranking=RankingConfig(similarity_weight=1.0, sales_weight=0.0, candidate_multiplier=1))
+    engine.lexical_index
+    return engine, embeddings, queries
+
+
+def test_router_sends_vocabulary_to_bm25_and_prose_to_hybrid(routed_engine):
+    engine, _, _ = routed_engine
+    assert engine._route("sleep", 4) == "lexical"
+    assert engine._route("something calming for the evening", 4) == "hybrid"
+    engine._query_encoder = None
+    assert engine._route("something calming for the evening", 4) == "lexical"
+
+
+def test_every_route_ranks_on_cosine(routed_engine):
+    engine, embeddings, queries = routed_engine
+    for query in queries:
+        products = engine.rank_products_batch([query], 3)[0]
+        assert products
+        for product in products:
+            expected = float(embeddings[product.metadata["id"]] @ queries[query])
+            assert product.similarity_score == pytest.approx(expected, abs=1e-5)
+        similarity = [product.similarity_score for product in products]
+        assert similarity == sorted(similarity, reverse=True)
+
+    keyword = engine.rank_products_batch(["sleep"], 3)[0]
+    assert {product.metadata["id"] for product in keyword} <= {0, 1, 3}
+    assert all(product.fused_score is None for product in keyword)
+    hybrid = engine.rank_products_batch(["something calming for the evening"], 3)[0]
+    assert all(product.fused_score > 0 for product in hybrid)
+
+
+def test_keyword_hits_without_a_model_report_no_similarity(routed_engine):
+    engine, _, _ = routed_engine
+    engine._query_encoder = None
+    products = engine.rank_products_batch(["sleep"], 3)[0]
+    assert [product.metadata["id"] for product in products][:2] in ([0, 3], [3, 0])
+    assert all(product.similarity_score is None for product in products)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from backend.recommendation_engine import query_cache
+from backend.recommendation_engine.query_cache import QueryEmbeddingCache, near_duplicate_key, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_normalization_and_near_duplicate_keys():
+    assert normalize_query("  Sleep\tAID ") == "sleep aid"
+    assert normalize_query("ｓｌｅｅｐ") == "sleep"
+    assert near_duplicate_key("Sleep aids!") == near_duplicate_key("sleep aid") == "sleep aid"
+    assert near_duplicate_key("berries") == "berry"
+    assert near_duplicate_key("stress") == "stress"
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryEmbeddingCache(ttl_seconds=60)
+    cache.put("sleep", np.ones(3))
+    clock.now += 59
+    assert cache.get(" SLEEP ") is not None
+    clock.now += 1
+    assert cache.get("sleep") is None
+    assert len(cache) == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_near_duplicates_share_an_entry_until_it_goes(clock):
+    cache = QueryEmbeddingCache(ttl_seconds=60)
+    cache.put("sleep aid", np.arange(3))
+    assert np.array_equal(cache.get("Sleep aids?"), np.arange(3))
+    assert cache.stats()["near_hits"] == 1
+    # The alias points at the first spelling; a second one does not replace it.
+    cache.put("sleep-aid", np.zeros(3))
+    assert np.array_equal(cache.get("sleep aids"), np.arange(3))
+    clock.now += 60
+    assert cache.get("sleep aids") is None
+    cache.put("sleep aid", np.full(3, 2.0))
+    assert np.array_equal(cache.get("sleep aids"), np.full(3, 2.0))
+
+
+def test_alias_is_dropped_with_its_evicted_entry(clock):
+    cache = QueryEmbeddingCache(max_entries=2, near_duplicates=True)
+    cache.put("calm teas", np.ones(3))
+    cache.put("focus", np.ones(3))
+    cache.put("energy", np.ones(3))
+    assert cache.get("calm tea") is None
+    assert cache.stats()["evictions"] == 1
+    cache.put("calm tea", np.zeros(3))
+    assert np.array_equal(cache.get("calm teas!"), np.zeros(3))
+
+
+def test_lru_order_and_read_only_embeddings():
+    cache = QueryEmbeddingCache(max_entries=2, near_duplicates=False)
+    cache.put("a", np.ones(3))
+    cache.put("b", np.ones(3))
+    cache.get("a")
+    cache.put("c", np.ones(3))
+    assert cache.get("b") is None and cache.get("a") is not None
+    with pytest.raises(ValueError):
+        cache.get("a")[0] = 5
+    assert QueryEmbeddingCache(max_entries=0).get("a") is None
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from backend.recommendation_engine.ranking import RankingConfig, normalize, rank, rank_batch, score, top_k
+
+
+def test_score_blends_max_normalized_signals():
+    similarity = np.array([0.8, 0.4, 0.2])
+    velocity = np.array([0.0, 10.0, 5.0])
+    price = np.array([10.0, 20.0, 5.0])
+    config = RankingConfig(similarity_weight=0.6, sales_weight=0.3, price_weight=0.1)
+    expected = 0.6 * similarity / 0.8 + 0.3 * velocity / 10.0 + 0.1 * (1 / price) / 0.2
+    assert np.allclose(score(similarity, velocity, price, config), expected)
+
+
+def test_minmax_normalization_and_degenerate_rows():
+    assert np.allclose(normalize(np.array([2.0, 4.0, 3.0]), "minmax"), [0.0, 1.0, 0.5])
+    assert np.allclose(normalize(np.array([3.0, 3.0]), "minmax"), [0.0, 0.0])
+    assert np.allclose(normalize(np.zeros(3), "max"), np.zeros(3))
+    with pytest.raises(ValueError):
+        RankingConfig(normalization="zscore")
+
+
+def test_sales_can_overtake_similarity():
+    similarity = np.array([0.9, 0.85])
+    velocity = np.array([0.0, 100.0])
+    indices, scores = rank(similarity, velocity, np.ones(2), 2)
+    assert indices.tolist() == [1, 0]
+    assert scores[0] == pytest.approx(0.7 * 0.85 / 0.9 + 0.3)
+
+
+def test_top_k_breaks_ties_by_position():
+    scores = np.array([1.0, 3.0, 2.0, 3.0, 2.0])
+    assert top_k(scores, 3).tolist() == [1, 3, 2]
+    assert top_k(scores, 10).tolist() == [1, 3, 2, 4, 0]
+    assert top_k(scores, 0).tolist() == []
+
+
+def test_rank_batch_matches_per_row_rank_with_padding():
+    rng = np.random.default_rng(0)
+    config = RankingConfig(price_weight=0.1)
+    lengths = [6, 3, 0, 6]
+    rows = [(rng.random(n).round(1), rng.integers(0, 4, n).astype(float), rng.uniform(1, 9, n)) for n in lengths]
+    width = max(lengths)
+    valid = np.arange(width)[np.newaxis, :] < np.array(lengths)[:, np.newaxis]
+
+    def padded(column):
+        # Padding repeats each row's first candidate, as the engine does.
+        return np.array([np.concatenate([row[column], np.repeat(row[column][:1], width - len(row[column]))])
+                         if len(row[column]) else np.zeros(width) for row in rows])
+
+    indices, scores = rank_batch(padded(0), padded(1), padded(2), valid, 4, config)
+    for position, (similarity, velocity, price) in enumerate(rows):
+        expected_indices, expected_scores = rank(similarity, velocity, price, 4, config)
+        limit = len(expected_indices)
+        assert indices[position, :limit].tolist() == expected_indices.tolist()
+        assert np.allclose(scores[position, :limit], expected_scores)
+        assert np.all(np.isneginf(scores[position, limit:]))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from backend.recommendation_engine.sales_signals import DecayedSalesCounters, SharedSalesCounters
+
+NOW = 1_700_000_000.0
+
+
+def test_rates_decay_with_half_life():
+    counters = DecayedSalesCounters(half_life_days=7)
+    counters.record_many([(1, 10.0, NOW)])
+    fresh, later = counters.rates([1], now=NOW)[0], counters.rates([1], now=NOW + 7 * 86400)[0]
+    assert np.isclose(later, fresh / 2)
+    assert np.isnan(counters.rates([2], now=NOW)[0])
+
+
+def test_future_timestamp_does_not_decay_later_events():
+    poisoned, clean = DecayedSalesCounters(), DecayedSalesCounters()
+    poisoned.record(1, 1.0, timestamp=1e12)
+    poisoned.record_many([(1, 10_000.0, None)])
+    clean.record_many([(1, 1.0, None), (1, 10_000.0, None)])
+    assert np.isclose(poisoned.rates([1])[0], clean.rates([1])[0], rtol=1e-3)
+
+
+def test_full_shared_counters_keep_applied_events(tmp_path):
+    counters = SharedSalesCounters.open(str(tmp_path / "counters"), capacity=8)
+    with pytest.raises(RuntimeError):
+        counters.record_many((product_id, 1.0, None) for product_id in range(10))
+    assert len(counters) == 5 and counters.events == 5
+    assert np.isclose(SharedSalesCounters.open(str(tmp_path / "counters")).rates([4])[0], counters.rates([4])[0])
+
+
+def test_snapshot_round_trip(tmp_path):
+    counters = DecayedSalesCounters()
+    counters.record_many([(1, 3.0, NOW), (2, 5.0, NOW - 3600)])
+    path = str(tmp_path / "counters.npz")
+    assert counters.snapshot(path) and not counters.snapshot(path)
+    restored = DecayedSalesCounters()
+    restored.restore(path)
+    assert np.allclose(restored.rates([1, 2], now=NOW), counters.rates([1, 2], now=NOW))
+    assert restored.events == 2
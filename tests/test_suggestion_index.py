@@ -0,0 +1,20 @@
+from backend.recommendation_engine.suggestion_index import SuggestionIndex
+
+KEYWORDS = ["relaxation", "stress relief", "energy boost"]
+METADATAS = [
+    {"name": "Calm Tea", "effects": ["relaxation", "sleep"], "ingredients": ["chamomile"], "sales_velocity": 3.0},
+    {"name": "Focus Capsules", "effects": ["focus"], "ingredients": ["ginseng"], "sales_velocity": 5.0},
+]
+
+
+def test_short_results_are_not_padded_with_unrelated_keywords():
+    index = SuggestionIndex.from_metadatas(METADATAS, KEYWORDS)
+    assert index.suggest("rel") == ["relaxation", "stress relief"]
+    assert index.suggest("zzz") == []
+
+
+def test_matching_ranks_prefixes_then_substrings():
+    index = SuggestionIndex.from_metadatas(METADATAS, KEYWORDS)
+    assert index.suggest("foc") == ["focus", "Focus Capsules"]
+    assert index.suggest("omi") == ["chamomile"]
+    assert index.suggest("  ", limit=2) == KEYWORDS[:2]
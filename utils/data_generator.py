@@ -1,9 +1,9 @@
 import json
 import os
+import sys
 import random
 from faker import Faker
 from datetime import datetime, timedelta
-from ollama import Client
 from dotenv import load_dotenv
 from tqdm import tqdm
 
@@ -37,6 +37,8 @@ PRODUCT_SUFFIXES = ['Tea', 'Capsules', 'Oil', 'Drink', 'Powder']
 # Function to generate product descriptions using Ollama
 def generate_description(prompt: str) -> str:
     try:
+        from ollama import Client
+
         # Initialize Ollama client
         client = Client(host='http://localhost:11434')
         response = client.generate(model="llama3.2:latest", prompt=prompt)
@@ -141,4 +143,10 @@ def generate_mock_data():
     save_data_to_json(SALES_FILE, sales_data)
 
 if __name__ == '__main__':
-    generate_mock_data()
+    if "--offline" in sys.argv:
+        # Fast path for scale testing: no LLM, multiprocess, chunked JSONL + columnar sales.
+        sys.path.append(BASE_DIR)
+        from utils.synthetic_generator import main
+        main([arg for arg in sys.argv[1:] if arg != "--offline"])
+    else:
+        generate_mock_data()
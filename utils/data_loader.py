@@ -1,5 +1,10 @@
 import json
 import os
+import threading
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from utils.row_store import RowStore, is_current, write_rows
 
 # Define the paths to the data files
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -8,10 +13,57 @@ INGREDIENTS_FILE = os.path.join(BASE_DIR, 'data', 'ingredients.json')
 SALES_FILE = os.path.join(BASE_DIR, 'data', 'sales.json')
 
 class DataLoader:
-    def __init__(self):
-        self.products = self.load_json(PRODUCTS_FILE)
-        self.ingredients = self.load_json(INGREDIENTS_FILE)
-        self.sales = self.load_json(SALES_FILE)
+    """Serves the JSON datasets, loading each file on first use.
+
+    With `shared_dir`, each dataset is converted once into a memory-mapped
+    RowStore there and rows are decoded on access, so several server
+    processes share one copy of the data instead of parsing it each.
+    """
+
+    def __init__(self, shared_dir: Optional[str] = None):
+        self.shared_dir = shared_dir
+        self._lock = threading.Lock()
+        self._data: Dict[str, Any] = {}
+
+    def _load(self, name: str, filepath: str, id_field: Optional[str] = None):
+        data = self._data.get(name)
+        if data is None:
+            with self._lock:
+                data = self._data.get(name)
+                if data is None:
+                    if self.shared_dir:
+                        data = self._data[name] = self._load_shared(name, filepath, id_field)
+                    else:
+                        rows = self._load_sorted(filepath, id_field)
+                        ids = [row.get(id_field, -1) for row in rows] if id_field is not None else None
+                        data = self._data[name] = (rows, ids)
+        return data
+
+    def _load_sorted(self, filepath: str, id_field: Optional[str]) -> list:
+        rows = self.load_json(filepath)
+        if id_field is not None:
+            # Rows ordered by product id so a cursor (last id seen) resumes with a bisect.
+            rows.sort(key=lambda row: row.get(id_field, -1))
+        return rows
+
+    def _load_shared(self, name: str, filepath: str, id_field: Optional[str]):
+        path = os.path.join(self.shared_dir, name)
+        if not is_current(path, filepath):
+            write_rows(path, self._load_sorted(filepath, id_field), key=id_field)
+        rows = RowStore.open(path)
+        return rows, rows.keys
+
+    @property
+    def products(self):
+        return self._load('products', PRODUCTS_FILE, 'id')[0]
+
+    @property
+    def ingredients(self):
+        return self._load('ingredients', INGREDIENTS_FILE)[0]
+
+    @property
+    def sales(self):
+        return self._load('sales', SALES_FILE, 'product_id')[0]
 
     @staticmethod
     def load_json(filepath: str):
@@ -35,6 +87,38 @@ class DataLoader:
     def get_sales(self):
         return self.sales
 
+    @staticmethod
+    def _iter_after(rows: list, ids: list, after_id: Optional[int],
+                    product_ids: Optional[Iterable[int]]) -> Iterator[Dict[str, Any]]:
+        start = 0 if after_id is None else bisect_right(ids, after_id)
+        wanted = None if product_ids is None else set(product_ids)
+        for index in range(start, len(rows)):
+            if wanted is None or ids[index] in wanted:
+                yield rows[index]
+
+    def iter_products(self, after_id: Optional[int] = None,
+                      product_ids: Optional[Iterable[int]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield products in id order, starting after `after_id`, optionally restricted to `product_ids`."""
+        rows, ids = self._load('products', PRODUCTS_FILE, 'id')
+        return self._iter_after(rows, ids, after_id, product_ids)
+
+    def iter_sales(self, after_id: Optional[int] = None, product_ids: Optional[Iterable[int]] = None,
+                   start_date: Optional[str] = None, end_date: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield per-product sales in product id order, keeping daily entries within [start_date, end_date]."""
+        rows, ids = self._load('sales', SALES_FILE, 'product_id')
+        for row in self._iter_after(rows, ids, after_id, product_ids):
+            if start_date is None and end_date is None:
+                yield row
+                continue
+            yield {
+                **row,
+                'daily_sales': [
+                    day for day in row.get('daily_sales', [])
+                    if (start_date is None or day.get('date', '') >= start_date)
+                    and (end_date is None or day.get('date', '') <= end_date)
+                ]
+            }
+
 # Test the DataLoader
 if __name__ == '__main__':
     loader = DataLoader()
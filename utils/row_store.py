@@ -0,0 +1,96 @@
+import json
+import os
+from collections.abc import Sequence
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+DATA_SUFFIX = ".rows"
+OFFSETS_SUFFIX = ".offsets.npy"
+KEYS_SUFFIX = ".keys.npy"
+
+
+class RowStore(Sequence):
+    """Read-only JSON rows over memory-mapped files: the concatenated rows and their byte offsets.
+
+    Row i is decoded from `data[offsets[i]:offsets[i + 1]]` when it is read, so
+    a process keeps no parsed copy of the dataset and every process mapping the
+    same files shares a single copy in the OS page cache. Recently read rows
+    are kept decoded, up to `cache_size`. An optional int64 `keys` column
+    (e.g. product ids) is mapped alongside.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, keys: Optional[np.ndarray] = None,
+                 cache_size: int = 4096):
+        self.data = data
+        self.offsets = offsets
+        self.keys = keys
+        self._row = lru_cache(maxsize=cache_size)(self._decode) if cache_size else self._decode
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _decode(self, index: int) -> Dict[str, Any]:
+        return json.loads(self.data[self.offsets[index]:self.offsets[index + 1]].tobytes())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._row(i) for i in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        return self._row(index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Full scans (index builds) bypass the cache.
+        bounds = self.offsets.tolist()
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            yield json.loads(self.data[start:stop].tobytes())
+
+    @classmethod
+    def open(cls, path: str, cache_size: int = 4096) -> "RowStore":
+        offsets = np.load(path + OFFSETS_SUFFIX, mmap_mode="r")
+        # np.memmap cannot map an empty file.
+        data = np.memmap(path + DATA_SUFFIX, dtype=np.uint8, mode="r") if offsets[-1] else np.zeros(0, np.uint8)
+        keys = np.load(path + KEYS_SUFFIX, mmap_mode="r") if os.path.exists(path + KEYS_SUFFIX) else None
+        return cls(data, offsets, keys, cache_size)
+
+
+def write_rows(path: str, rows: Iterable[Dict[str, Any]], key: Optional[str] = None) -> int:
+    """Atomically write rows (streamed, one at a time) as a RowStore at `path`; returns the row count.
+
+    With `key`, each row's integer `key` field is stored as the keys column (-1 where missing).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    offsets, keys, position = [0], [], 0
+    with open(path + DATA_SUFFIX + ".tmp", "wb") as f:
+        for row in rows:
+            encoded = json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            f.write(encoded)
+            position += len(encoded)
+            offsets.append(position)
+            if key is not None:
+                keys.append(row.get(key, -1))
+    columns = [(OFFSETS_SUFFIX, np.asarray(offsets, dtype=np.int64))]
+    if key is not None:
+        columns.append((KEYS_SUFFIX, np.asarray(keys, dtype=np.int64)))
+    for suffix, column in columns:
+        with open(path + suffix + ".tmp", "wb") as f:
+            np.save(f, column)
+    os.replace(path + DATA_SUFFIX + ".tmp", path + DATA_SUFFIX)
+    for suffix, _ in columns:
+        os.replace(path + suffix + ".tmp", path + suffix)
+    return len(offsets) - 1
+
+
+def is_current(path: str, source: Optional[str] = None) -> bool:
+    """Whether a RowStore exists at `path` and is at least as new as `source`."""
+    offsets_path = path + OFFSETS_SUFFIX
+    if not (os.path.exists(offsets_path) and os.path.exists(path + DATA_SUFFIX)):
+        return False
+    return source is None or not os.path.exists(source) or os.path.getmtime(offsets_path) >= os.path.getmtime(source)
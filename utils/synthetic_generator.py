@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from multiprocessing import Pool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+from utils.sales_store import META_FILE, PRODUCT_IDS_FILE, UNITS_FILE
+
+PRODUCTS_FILE = os.path.join(BASE_DIR, 'data', 'products.json')
+DEFAULT_OUT_DIR = os.path.join(BASE_DIR, 'data', 'synthetic')
+
+PRODUCT_TYPES = ['beverage', 'supplement', 'snack', 'vitamin', 'oil']
+EFFECTS = [
+    'relaxation', 'energy', 'focus', 'immunity', 'stress relief',
+    'sleep support', 'anti-inflammatory', 'detox', 'digestive health',
+    'skin health', 'weight management', 'mood enhancement'
+]
+BASE_INGREDIENTS = [
+    'Chamomile', 'Ginseng', 'Lavender', 'Turmeric', 'Ashwagandha',
+    'Peppermint', 'Lemon Balm', 'Valerian Root', 'Green Tea', 'Caffeine',
+    'Echinacea', 'Elderberry', 'Ginger', 'Aloe Vera', 'Coconut Oil',
+    'Rhodiola', 'Holy Basil', 'Maca Root', 'Spirulina', 'Milk Thistle',
+    'Ginkgo Biloba', 'Passionflower', 'Hibiscus', 'Rosehip', 'Moringa'
+]
+INGREDIENT_FORMS = ['Extract', 'Powder', 'Oil', 'Leaf', 'Concentrate']
+PRODUCT_PREFIXES = ['Organic', 'Natural', 'Herbal', 'Advanced', 'Premium', 'Pure', 'Daily', 'Vital', 'Calm', 'Essential']
+PRODUCT_SUFFIXES = ['Tea', 'Capsules', 'Oil', 'Drink', 'Powder', 'Gummies', 'Tincture', 'Bar', 'Tablets', 'Elixir']
+
+HEADLINES = [
+    "Introducing {name}: {effect_title} the Natural Way",
+    "{name} - Your Daily Ally for {effect_title}",
+    "Discover {name}, Crafted for {effect_title}",
+]
+SENTENCES = [
+    "{name} is a {type} made with {ingredients} to support {effects}.",
+    "Each serving of {name} combines {ingredients} in a carefully balanced formula.",
+    "Our {type} is designed for people who want {effects} without compromise.",
+    "{ingredient} has long been valued for {effect}, and {name} puts it to work every day.",
+    "Enjoy {name} in the morning or evening as part of a balanced routine focused on {effect}.",
+    "Made in small batches, {name} is tested for purity and potency.",
+    "Customers choose {name} for {effects} and a clean ingredient list.",
+    "Pair {name} with rest and hydration to get the most out of {ingredient}.",
+]
+
+SALES_DIR = "sales_store"
+PRODUCTS_DIR = "products"
+MANIFEST_FILE = "manifest.json"
+
+# Per-worker state set up by _init_worker.
+_worker: Dict[str, Any] = {}
+
+
+def build_ingredients(seed: int) -> List[Dict[str, Any]]:
+    """Every base ingredient in every form, with reproducible common effects."""
+    rng = random.Random(seed)
+    return [{
+        "name": f"{base} {form}",
+        "properties": f"{form} of {base.lower()} used in wellness products.",
+        "common_effects": rng.sample(EFFECTS, rng.randint(1, 3)),
+    } for base in BASE_INGREDIENTS for form in INGREDIENT_FORMS]
+
+
+class MarkovText:
+    """Order-2 word-level Markov chain trained on existing product descriptions."""
+
+    def __init__(self, corpus: Sequence[str]):
+        self.transitions: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        self.starts: List[Tuple[str, str]] = []
+        for text in corpus:
+            words = re.sub(r"[*#\[\]]", "", text).split()
+            if len(words) < 3:
+                continue
+            self.starts.append((words[0], words[1]))
+            for a, b, c in zip(words, words[1:], words[2:]):
+                self.transitions[(a, b)].append(c)
+        self.transitions = dict(self.transitions)
+
+    def generate(self, rng: random.Random, max_words: int) -> str:
+        if not self.starts:
+            return ""
+        a, b = rng.choice(self.starts)
+        words = [a, b]
+        while len(words) < max_words:
+            choices = self.transitions.get((a, b))
+            if not choices:
+                a, b = rng.choice(self.starts)
+                words.extend((a, b))
+                continue
+            a, b = b, rng.choice(choices)
+            words.append(b)
+        return " ".join(words)
+
+
+def load_markov_corpus(path: str = PRODUCTS_FILE) -> List[str]:
+    """Descriptions from an existing products.json, or template sentences when there is none."""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            descriptions = [p.get("description", "") for p in json.load(f)]
+        if any(descriptions):
+            return descriptions
+    rng = random.Random(0)
+    return [" ".join(sentence.format(**_slots(rng, "Product", rng.choice(PRODUCT_TYPES), rng.sample(EFFECTS, 2),
+                                              rng.sample(BASE_INGREDIENTS, 3)))
+                     for sentence in SENTENCES) for _ in range(200)]
+
+
+def _slots(rng: random.Random, name: str, product_type: str, effects: List[str],
+           ingredients: List[str]) -> Dict[str, str]:
+    return {
+        "name": name,
+        "type": product_type,
+        "effects": " and ".join(effects),
+        "effect": rng.choice(effects),
+        "effect_title": " & ".join(effect.title() for effect in effects),
+        "ingredients": ", ".join(ingredients[:-1]) + f" and {ingredients[-1]}" if len(ingredients) > 1
+        else ingredients[0],
+        "ingredient": rng.choice(ingredients),
+    }
+
+
+def describe(rng: random.Random, name: str, product_type: str, effects: List[str],
+             ingredients: List[str], markov: Optional[MarkovText], words: int) -> str:
+    """A templated headline and body, padded with Markov text to roughly `words` words."""
+    slots = _slots(rng, name, product_type, effects, ingredients)
+    parts = [rng.choice(HEADLINES).format(**slots)]
+    parts.extend(sentence.format(**slots) for sentence in rng.sample(SENTENCES, rng.randint(3, 5)))
+    text = " ".join(parts)
+    remaining = words - len(text.split())
+    if markov is not None and remaining > 0:
+        text += "\n\n" + markov.generate(rng, remaining)
+    return text
+
+
+def _init_worker(out_dir: str, ingredient_names: List[str], markov: Optional[MarkovText],
+                 num_days: int, description_words: int) -> None:
+    _worker.update(out_dir=out_dir, ingredient_names=ingredient_names, markov=markov,
+                   description_words=description_words, num_days=num_days)
+    _worker["units"] = np.lib.format.open_memmap(os.path.join(out_dir, SALES_DIR, UNITS_FILE), mode="r+")
+
+
+def _daily_units(rng: np.random.Generator, count: int, num_days: int) -> np.ndarray:
+    """Poisson daily units around a heavy-tailed base rate with weekly seasonality and a linear trend."""
+    base = rng.lognormal(mean=1.0, sigma=1.0, size=count)
+    trend = 1.0 + rng.normal(0.0, 0.4, count)[:, None] * np.linspace(-0.5, 0.5, num_days)[None, :]
+    weekly = 1.0 + 0.2 * np.sin(2 * np.pi * (np.arange(num_days) + rng.integers(0, 7, count)[:, None]) / 7)
+    return rng.poisson(base[:, None] * np.clip(trend, 0.05, None) * weekly).astype(np.int32)
+
+
+def generate_chunk(task: Tuple[int, int, int, int]) -> int:
+    """Write one JSONL chunk of products and fill their rows of the sales matrix."""
+    chunk_index, start_id, count, seed = task
+    rng = random.Random(f"{seed}-{chunk_index}")
+    np_rng = np.random.default_rng([seed, chunk_index])
+    ingredient_names = _worker["ingredient_names"]
+    num_days = _worker["num_days"]
+
+    units = _daily_units(np_rng, count, num_days)
+    _worker["units"][start_id - 1:start_id - 1 + count] = units
+    _worker["units"].flush()
+    last_month = units[:, -30:].sum(axis=1)
+
+    path = os.path.join(_worker["out_dir"], PRODUCTS_DIR, f"products-{chunk_index:05d}.jsonl")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for offset in range(count):
+            product_id = start_id + offset
+            name = f"{rng.choice(PRODUCT_PREFIXES)} {rng.choice(PRODUCT_SUFFIXES)} {product_id}"
+            product_type = rng.choice(PRODUCT_TYPES)
+            effects = rng.sample(EFFECTS, rng.randint(1, 3))
+            ingredients = rng.sample(ingredient_names, rng.randint(2, 5))
+            price = round(rng.uniform(5.0, 50.0), 2)
+            units_sold = int(last_month[offset])
+            f.write(json.dumps({
+                "id": product_id,
+                "name": name,
+                "type": product_type,
+                "description": describe(rng, name, product_type, effects, ingredients, _worker["markov"],
+                                        _worker["description_words"]),
+                "effects": effects,
+                "ingredients": ingredients,
+                "price": price,
+                "sales_data": {
+                    "units_sold": units_sold,
+                    "last_month_revenue": round(units_sold * price, 2)
+                }
+            }) + "\n")
+    os.replace(path + ".tmp", path)
+    return count
+
+
+def generate(num_products: int, num_days: int = 90, out_dir: str = DEFAULT_OUT_DIR, chunk_size: int = 10000,
+             workers: Optional[int] = None, seed: int = 42, descriptions: str = "markov",
+             description_words: int = 150, end_date: Optional[str] = None) -> Dict[str, Any]:
+    """Generate products as chunked JSONL and daily sales as a columnar sales store.
+
+    Output depends only on the arguments (not on the worker count), and sales
+    rows are written straight into a memory-mapped matrix, so memory use stays
+    flat however many products are generated.
+    """
+    started = time.perf_counter()
+    products_dir = os.path.join(out_dir, PRODUCTS_DIR)
+    sales_dir = os.path.join(out_dir, SALES_DIR)
+    os.makedirs(products_dir, exist_ok=True)
+    os.makedirs(sales_dir, exist_ok=True)
+    for stale in os.listdir(products_dir):
+        if stale.endswith(".jsonl"):
+            os.remove(os.path.join(products_dir, stale))
+
+    ingredients = build_ingredients(seed)
+    with open(os.path.join(out_dir, "ingredients.json"), "w", encoding="utf-8") as f:
+        json.dump(ingredients, f, indent=2)
+    markov = MarkovText(load_markov_corpus()) if descriptions == "markov" else None
+
+    # Row i of the sales matrix belongs to product id i + 1.
+    end = np.datetime64(end_date or time.strftime("%Y-%m-%d"), 'D')
+    start_date = end - np.timedelta64(num_days - 1, 'D')
+    units = np.lib.format.open_memmap(os.path.join(sales_dir, UNITS_FILE), mode="w+", dtype=np.int32,
+                                      shape=(num_products, num_days))
+    del units
+    np.save(os.path.join(sales_dir, PRODUCT_IDS_FILE), np.arange(1, num_products + 1, dtype=np.int64))
+
+    tasks = [(index, start + 1, min(chunk_size, num_products - start), seed)
+             for index, start in enumerate(range(0, num_products, chunk_size))]
+    init_args = (out_dir, [ingredient["name"] for ingredient in ingredients], markov,
+                 num_days, description_words)
+    with Pool(processes=workers or os.cpu_count(), initializer=_init_worker, initargs=init_args) as pool, \
+            tqdm(total=num_products, desc="Products", unit="product") as progress:
+        for count in pool.imap_unordered(generate_chunk, tasks):
+            progress.update(count)
+
+    with open(os.path.join(sales_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"start_date": str(start_date), "num_days": num_days, "num_products": num_products}, f)
+    manifest = {
+        "products": num_products,
+        "chunks": len(tasks),
+        "chunk_size": chunk_size,
+        "sales_days": num_days,
+        "sales_rows": num_products * num_days,
+        "start_date": str(start_date),
+        "end_date": str(end),
+        "seed": seed,
+        "descriptions": descriptions,
+        "seconds": time.perf_counter() - started,
+    }
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Generated {num_products} products and {manifest['sales_rows']} daily sales rows "
+          f"in {manifest['seconds']:.1f}s -> {out_dir}")
+    return manifest
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a large synthetic catalog offline (no LLM).")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--descriptions", choices=["markov", "template"], default="markov")
+    parser.add_argument("--description-words", type=int, default=150)
+    parser.add_argument("--end-date", default=None, help="Last sales day (YYYY-MM-DD); defaults to today.")
+    args = parser.parse_args(argv)
+    generate(args.products, args.days, args.out, args.chunk_size, args.workers, args.seed,
+             args.descriptions, args.description_words, args.end_date)
+
+
+if __name__ == '__main__':
+    main()